@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.0/ref/settings/
 """
 
+import os
+import tempfile
 from pathlib import Path
 import environ
 
@@ -43,6 +45,7 @@ DJANGO_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 ]
 
 THIRD_PARTY_APPS = [
@@ -58,6 +61,7 @@ LOCAL_APPS = [
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
 MIDDLEWARE = [
+    'core_apps._config.metrics_config.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -88,21 +92,157 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'autocompany.wsgi.application'
+ASGI_APPLICATION = 'autocompany.asgi.application'
+
+# Serve the product and cart endpoints with async views, for deployments running autocompany.asgi
+ASYNC_VIEWS = env.bool('ASYNC_VIEWS', default=False)
 
 # Database
 # https://docs.djangoproject.com/en/4.0/ref/settings/#databases
 
+DB_POOL = env.bool('DB_POOL', default=False)  # in-process connection pool, PostgreSQL only
+
 DATABASES = {
     'default': {
-        'ENGINE': env('DB_ENGINE'),
+        'ENGINE': 'core_apps._config.db_config.pooled_postgresql' if DB_POOL else env('DB_ENGINE'),
         'NAME': env('DB_NAME'),
         'USER': env('DB_USER'),
         'PASSWORD': env('DB_PASSWORD'),
         'HOST': env('DB_HOST'),
         'PORT': env('DB_PORT'),
+        # the pool keeps connections open itself, so Django hands them back after every request
+        'CONN_MAX_AGE': 0 if DB_POOL else env.int('DB_CONN_MAX_AGE', default=60),
+        'CONN_HEALTH_CHECKS': env.bool('DB_CONN_HEALTH_CHECKS', default=True),
+        'OPTIONS': {
+            'POOL_MIN_SIZE': env.int('DB_POOL_MIN_SIZE', default=2),
+            'POOL_MAX_SIZE': env.int('DB_POOL_MAX_SIZE', default=20),
+        } if DB_POOL else {},
     }
 }
 
+# read replicas, used by views that opt in with replica_reads
+DATABASE_REPLICAS = []
+for index, replica_host in enumerate(env.list('DB_REPLICA_HOSTS', default=[])):
+    DATABASE_REPLICAS.append(f'replica_{index}')
+    DATABASES[f'replica_{index}'] = {
+        **DATABASES['default'],
+        'HOST': replica_host,
+        'TEST': {'MIRROR': 'default'},  # tests read the rows they write
+    }
+
+DATABASE_ROUTERS = ['core_apps._config.db_config.routers.ReplicaRouter']
+
+# Django REST framework
+# https://www.django-rest-framework.org/api-guide/settings/
+
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'core_apps._config.renderer_config.orjson_renderer.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'core_apps._config.throttle_config.throttles.ScopedTokenBucketThrottle',
+        'core_apps._config.throttle_config.throttles.IPTokenBucketThrottle',
+    ],
+    # reverse proxies in front of the app; X-Forwarded-For is only trusted that many hops deep, never by default
+    'NUM_PROXIES': env.int('NUM_PROXIES', default=0),
+}
+
+TEST_RUNNER = 'core_apps._config.test_config.runner.TestRunner'  # runs the tests without throttling
+
+THROTTLE = {
+    'ENABLED': env.bool('THROTTLE_ENABLED', default=True),
+    'STORE': env('THROTTLE_STORE', default='shared_memory'),  # or 'cache' when workers span several hosts
+    'SHARED_MEMORY_PATH': env('THROTTLE_SHARED_MEMORY_PATH', default=os.path.join(
+        '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(), 'autocompany-throttle')),  # tmpfs
+    'SHARED_MEMORY_SLOTS': env.int('THROTTLE_SHARED_MEMORY_SLOTS', default=65536),  # clients tracked at once
+    'CACHE_ALIAS': env('THROTTLE_CACHE_ALIAS', default='default'),
+    'RATES': {
+        'ip': '100/s',  # every throttled endpoint together
+        'product.read': '20/s',
+        'product.write': '5/s',
+        'export.read': '6/m',
+        'import.write': '6/m',
+        'cart.read': '10/s',
+        'cart.write': '5/s',
+        'order.read': '10/s',
+        'order.write': '10/m',
+        'report.read': '60/m',
+        **env.dict('THROTTLE_RATES', default={}),  # e.g. THROTTLE_RATES=product.read=50/s,cart.write=10/s
+    },
+}
+
+# Caches
+# https://docs.djangoproject.com/en/4.0/topics/cache/
+
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+
+
+def is_shared_cache(alias):
+    return not CACHES[alias]['BACKEND'].endswith('.LocMemCache')  # LocMem lives in one worker process
+
+
+# Product payload cache: "memory" (per process LRU), "django" (CACHES alias, shared between processes) or "none".
+# Writes only invalidate the worker they run on, so with several workers only a shared cache is safe: "django" is
+# the default when the alias is shared, "none" otherwise. "memory" is for single process deployments.
+PRODUCT_CACHE_ALIAS = env('PRODUCT_CACHE_ALIAS', default='default')
+PRODUCT_CACHE = {
+    'BACKEND': env('PRODUCT_CACHE_BACKEND', default='django' if is_shared_cache(PRODUCT_CACHE_ALIAS) else 'none'),
+    'ALIAS': PRODUCT_CACHE_ALIAS,
+    'TIMEOUT': env.int('PRODUCT_CACHE_TIMEOUT', default=30),
+    'MAX_ENTRIES': env.int('PRODUCT_CACHE_MAX_ENTRIES', default=2048),
+}
+
+# Streaming product export at /product/export/
+PRODUCT_EXPORT = {
+    'CHUNK_SIZE': env.int('PRODUCT_EXPORT_CHUNK_SIZE', default=2000),  # rows fetched and written per round trip
+}
+
+# Bulk product import at /product/import/ and in the import_products command
+PRODUCT_IMPORT = {
+    'BATCH_SIZE': env.int('PRODUCT_IMPORT_BATCH_SIZE', default=1000),  # rows per upsert statement and transaction
+    'MAX_ERRORS': env.int('PRODUCT_IMPORT_MAX_ERRORS', default=1000),  # invalid rows listed in a report
+}
+
+# Cart storage: "database" (Cart and CartItem tables) or "cache" (a CACHES alias, expires with the session)
+CART_STORAGE = {
+    'BACKEND': env('CART_STORAGE_BACKEND', default='database'),
+    'CACHE_ALIAS': env('CART_STORAGE_CACHE_ALIAS', default='default'),
+}
+
+# request timing: every request feeds the duration histogram, SAMPLE_RATE of them are profiled query by query
+INSTRUMENTATION = {
+    'SAMPLE_RATE': env.float('INSTRUMENTATION_SAMPLE_RATE', default=0.01),
+    'SERVER_TIMING': env.bool('INSTRUMENTATION_SERVER_TIMING', default=True),
+    'SLOW_REQUEST_MS': env.int('INSTRUMENTATION_SLOW_REQUEST_MS', default=500),  # profiled requests logged as warnings
+    'METRICS_ALLOWED_IPS': env.list('METRICS_ALLOWED_IPS', default=['127.0.0.1']),  # scrapers, staff can always read
+}
+
+# seconds stock stays reserved for a cart after its last change
+STOCK_RESERVATION_TTL = env.int('STOCK_RESERVATION_TTL', default=15 * 60)
+
+# Outbox worker: order emails, low stock alerts and the sales rollup, see core_apps.order.outbox
+OUTBOX = {
+    'BATCH_SIZE': env.int('OUTBOX_BATCH_SIZE', default=100),
+    'POLL_INTERVAL': env.float('OUTBOX_POLL_INTERVAL', default=1.0),  # seconds the worker sleeps when idle
+    'MAX_ATTEMPTS': env.int('OUTBOX_MAX_ATTEMPTS', default=5),  # failed events are then left for inspection
+    'RETRY_DELAY': env.int('OUTBOX_RETRY_DELAY', default=30),  # doubled on every attempt
+    'RETENTION': env.int('OUTBOX_RETENTION', default=7 * 24 * 60 * 60),  # processed events are purged after this
+    'LOW_STOCK_THRESHOLD': env.int('LOW_STOCK_THRESHOLD', default=5),
+    'ALERT_RECIPIENTS': env.list('LOW_STOCK_ALERT_RECIPIENTS', default=[]),
+}
+
+EMAIL_BACKEND = env('EMAIL_BACKEND', default='django.core.mail.backends.console.EmailBackend')
+DEFAULT_FROM_EMAIL = env('DEFAULT_FROM_EMAIL', default='orders@autocompany.local')
+
+# Idempotency-Key responses, kept in the IdempotencyKey table that every worker shares
+IDEMPOTENCY = {
+    'TTL': env.int('IDEMPOTENCY_TTL', default=24 * 60 * 60),
+    'LOCK_TIMEOUT': env.int('IDEMPOTENCY_LOCK_TIMEOUT', default=30),  # longest a duplicate waits for the original
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
 
@@ -144,3 +284,14 @@ STATIC_ROOT = f'{BASE_DIR}/static'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 SESSION_COOKIE_AGE = 60 * 60  # 1 hour
+
+# Session engine, e.g. django.contrib.sessions.backends.cached_db or django.contrib.sessions.backends.signed_cookies.
+# cached_db is only the default when the session cache is shared by the workers, a per process LocMem cache would
+# serve stale sessions (a logout or a new cart key on one worker unseen by the others).
+SESSION_CACHE_ALIAS = env('SESSION_CACHE_ALIAS', default='default')
+SESSION_CACHE_SHARED = is_shared_cache(SESSION_CACHE_ALIAS)
+SESSION_ENGINE = env('SESSION_ENGINE', default='django.contrib.sessions.backends.cached_db' if SESSION_CACHE_SHARED
+                     else 'django.contrib.sessions.backends.db')
+
+# Product keyword search engine: "postgres", "memory" or "auto" (pick by database vendor)
+PRODUCT_SEARCH_ENGINE = env('PRODUCT_SEARCH_ENGINE', default='auto')
@@ -15,8 +15,12 @@ Including another URLconf
 """
 from django.urls import path, include, re_path
 
+from core_apps._config.metrics_config.metrics_view import MetricsView, PrometheusMetricsView
+
 urlpatterns = [
     path('api/v1/', include('core_apps.car_parts.urls')),
     path('api/v1/', include('core_apps.order.urls')),
+    path('api/v1/metrics/', MetricsView.as_view()),
+    path('metrics', PrometheusMetricsView.as_view()),
 ]
 
@@ -0,0 +1,16 @@
+"""
+Async query helpers for async views.
+
+Django 4.0 has no async ORM yet (QuerySet.aget, acount and async iteration arrive in 4.1), so these helpers run
+the synchronous queries with sync_to_async, which is also how 4.1 implements them. thread_sensitive keeps every
+query of a request on the request's thread, the one whose connection Django closes when the request finishes.
+"""
+from asgiref.sync import sync_to_async
+
+
+def database_sync_to_async(function):
+    return sync_to_async(function, thread_sensitive=True)
+
+
+async def afirst(queryset):
+    return await database_sync_to_async(queryset.first)()
@@ -0,0 +1,29 @@
+from django.http import HttpResponseNotAllowed
+
+
+class AsyncView:
+    """
+    Minimal class based async view.
+
+    Django 4.0 only runs async function views (async handlers on View arrive in 4.1), so as_view() returns an
+    async function that dispatches to the async handler of a new instance.
+    """
+
+    http_method_names = ['get', 'post', 'put', 'patch', 'delete']
+
+    def allowed_methods(self):
+        return [method.upper() for method in self.http_method_names if hasattr(self, method)]
+
+    @classmethod
+    def as_view(cls):
+        async def view(request, *args, **kwargs):
+            self = cls()
+            method = 'get' if request.method == 'HEAD' else request.method.lower()
+            handler = getattr(self, method, None) if method in self.http_method_names else None
+            if handler is None:
+                return HttpResponseNotAllowed(self.allowed_methods())
+            return await handler(request, *args, **kwargs)
+
+        view.csrf_exempt = True  # like APIView, CSRF is left to the wrapped DRF views
+        view.__name__ = cls.__name__
+        return view
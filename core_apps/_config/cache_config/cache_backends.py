@@ -0,0 +1,112 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+
+
+class LRUCacheBackend:
+    """Process local cache that evicts the least recently used entry and expires entries after a timeout."""
+
+    def __init__(self, timeout, max_entries):
+        self.timeout = timeout
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():  # expired
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)  # mark as recently used
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.timeout, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:  # evict least recently used entries
+                self._entries.popitem(last=False)
+
+    def add(self, key, value):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] >= time.monotonic():
+                return entry[1]
+        self.set(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    async def aget(self, key):
+        return self.get(key)  # no I/O, safe to run on the event loop
+
+    async def aset(self, key, value):
+        self.set(key, value)
+
+    async def aadd(self, key, value):
+        return self.add(key, value)
+
+
+class DjangoCacheBackend:
+    """Cache stored in one of the CACHES aliases, shared by every process that uses the same cache server."""
+
+    def __init__(self, timeout, alias):
+        self.timeout = timeout
+        self.cache = caches[alias]
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value):
+        self.cache.set(key, value, self.timeout)
+
+    def add(self, key, value):
+        if self.cache.add(key, value, self.timeout):
+            return value
+        return self.cache.get(key, value)
+
+    def clear(self):
+        self.cache.clear()
+
+    async def aget(self, key):
+        return await self.cache.aget(key)
+
+    async def aset(self, key, value):
+        await self.cache.aset(key, value, self.timeout)
+
+    async def aadd(self, key, value):
+        if await self.cache.aadd(key, value, self.timeout):
+            return value
+        return await self.cache.aget(key, value)
+
+
+class DummyCacheBackend:
+    """Cache that never stores anything, used to switch caching off."""
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def add(self, key, value):
+        return value
+
+    def clear(self):
+        pass
+
+    async def aget(self, key):
+        return None
+
+    async def aset(self, key, value):
+        pass
+
+    async def aadd(self, key, value):
+        return value
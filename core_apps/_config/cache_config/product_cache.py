@@ -0,0 +1,146 @@
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.dispatch import receiver
+
+from core_apps._config.cache_config.cache_backends import DjangoCacheBackend, DummyCacheBackend, LRUCacheBackend
+
+CATALOGUE_VERSION_KEY = "product:catalogue:version"
+
+
+class ProductCache:
+    """
+    Read-through cache for serialized product payloads and list pages.
+
+    Keys embed a version number: every product has its own version and the catalogue has one shared by all
+    list pages. Writes replace versions instead of deleting keys, so stale entries are never read again and
+    simply age out of the backend.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    def version(self, key):
+        return self.backend.add(key, time.time_ns())  # a missing version starts at a fresh, unused number
+
+    async def aversion(self, key):
+        return await self.backend.aadd(key, time.time_ns())
+
+    def list_digest(self, params):
+        return hashlib.md5(repr(sorted(params.items())).encode()).hexdigest()  # one key per query string
+
+    def detail_key(self, product_id):
+        version = self.version(f"product:{product_id}:version")
+        return f"product:{product_id}:{version}"
+
+    def list_key(self, params):
+        version = self.version(CATALOGUE_VERSION_KEY)
+        return f"product:list:{version}:{self.list_digest(params)}"
+
+    def record(self, payload):
+        with self._lock:
+            if payload is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+    def fetch(self, key, loader):
+        payload = self.backend.get(key)
+        self.record(payload)
+        if payload is None:
+            payload = loader()  # exceptions propagate and nothing is cached
+            self.backend.set(key, payload)
+        return payload
+
+    async def afetch(self, key, loader):
+        payload = await self.backend.aget(key)
+        self.record(payload)
+        if payload is None:
+            payload = await loader()  # exceptions propagate and nothing is cached
+            await self.backend.aset(key, payload)
+        return payload
+
+    def get_detail(self, product_id, loader):
+        return self.fetch(self.detail_key(product_id), loader)
+
+    def get_list(self, params, loader):
+        return self.fetch(self.list_key(params), loader)
+
+    def get_catalogue_updated_on(self, loader):
+        version = self.version(CATALOGUE_VERSION_KEY)
+        return self.fetch(f"product:list:{version}:updated_on", loader)  # shared by every list page
+
+    async def aget_detail(self, product_id, loader):
+        version = await self.aversion(f"product:{product_id}:version")
+        return await self.afetch(f"product:{product_id}:{version}", loader)
+
+    async def aget_list(self, params, loader):
+        version = await self.aversion(CATALOGUE_VERSION_KEY)
+        return await self.afetch(f"product:list:{version}:{self.list_digest(params)}", loader)
+
+    async def aget_catalogue_updated_on(self, loader):
+        version = await self.aversion(CATALOGUE_VERSION_KEY)
+        return await self.afetch(f"product:list:{version}:updated_on", loader)
+
+    def bump(self, product_ids):
+        for product_id in product_ids:
+            self.backend.set(f"product:{product_id}:version", time.time_ns())
+        self.backend.set(CATALOGUE_VERSION_KEY, time.time_ns())  # every list page may contain these products
+
+    def invalidate(self, product_ids=()):
+        product_ids = list(product_ids)
+        with self._lock:
+            self.invalidations += 1
+
+        self.bump(product_ids)
+        # bump again once the transaction commits, in case a reader cached the old row in between
+        transaction.on_commit(lambda: self.bump(product_ids))
+
+    def clear(self):
+        self.backend.clear()
+        with self._lock:
+            self.hits = self.misses = self.invalidations = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": type(self.backend).__name__,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def create_backend(config):
+    if config["BACKEND"] == "memory":
+        return LRUCacheBackend(timeout=config["TIMEOUT"], max_entries=config["MAX_ENTRIES"])
+    if config["BACKEND"] == "django":
+        return DjangoCacheBackend(timeout=config["TIMEOUT"], alias=config["ALIAS"])
+    return DummyCacheBackend()
+
+
+_product_cache = None
+
+
+def get_product_cache():
+    global _product_cache
+    if _product_cache is None:
+        _product_cache = ProductCache(create_backend(settings.PRODUCT_CACHE))
+    return _product_cache
+
+
+@receiver(setting_changed)
+def reset_product_cache(setting, **kwargs):
+    global _product_cache
+    if setting == "PRODUCT_CACHE":
+        _product_cache = None
@@ -0,0 +1,27 @@
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def validators(updated_on):
+    """ETag and Last-Modified timestamp of data last changed at updated_on."""
+    etag = "W/" + quote_etag(format(int(updated_on.timestamp() * 1_000_000), "x"))  # microsecond precision
+    return etag, int(updated_on.timestamp())
+
+
+def not_modified_response(request, updated_on):
+    """A 304 response when the client's If-None-Match / If-Modified-Since still match, otherwise None."""
+    if updated_on is None:  # nothing to compare with
+        return None
+
+    etag, last_modified = validators(updated_on)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    return set_validators(response, updated_on) if response is not None else None
+
+
+def set_validators(response, updated_on):
+    if updated_on is not None:
+        etag, last_modified = validators(updated_on)
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified)
+        response["Cache-Control"] = "no-cache"  # clients may keep the payload but must revalidate it
+    return response
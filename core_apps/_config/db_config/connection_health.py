@@ -0,0 +1,34 @@
+"""
+Persistent connection bookkeeping.
+
+Django 4.0 reuses connections when CONN_MAX_AGE is set but has no CONN_HEALTH_CHECKS (added in 4.1): a
+connection that the server or a proxy dropped while the worker was idle fails the first query of the next
+request. check_connections pings reused connections at the start of each request, when CONN_HEALTH_CHECKS is
+set on the alias, and closes broken ones so Django opens a fresh connection on first use.
+"""
+from django.core.signals import request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from core_apps._config.metrics_config.metrics import metrics
+
+
+@receiver(request_started, dispatch_uid="check_connections")
+def check_connections(**kwargs):
+    metrics.increment("http_requests")
+    for connection in connections.all():
+        if connection.connection is None:  # not connected in this thread, nothing to reuse
+            continue
+
+        if connection.settings_dict.get("CONN_HEALTH_CHECKS") and not connection.is_usable():
+            metrics.increment("db_health_check_failures", alias=connection.alias)
+            connection.close()  # reconnects lazily on the next query
+            continue
+
+        metrics.increment("db_connections_reused", alias=connection.alias)
+
+
+@receiver(connection_created, dispatch_uid="count_connections")
+def count_connections(sender, connection, **kwargs):
+    metrics.increment("db_connections_opened", alias=connection.alias)
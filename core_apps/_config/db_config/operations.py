@@ -0,0 +1,51 @@
+from django.db import migrations
+
+
+class PostgresOnlyAddIndex(migrations.AddIndex):
+    """AddIndex for PostgreSQL specific indexes (GIN, trigram) that other databases can not build."""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != "postgresql":  # keep the model state, skip the database
+            return
+        super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != "postgresql":
+            return
+        super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class AddColumn(migrations.AddField):
+    """
+    AddField that adds the column in place on SQLite.
+
+    Django 4.0 rebuilds the whole SQLite table for every new column, and the rebuild tries to create the
+    PostgreSQL-only indexes of the model, which SQLite can not build. Only for columns with a default.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != "sqlite":
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+        model = to_state.apps.get_model(app_label, self.model_name)
+        field = model._meta.get_field(self.name)
+        definition, params = schema_editor.column_sql(model, field, include_default=True)
+        schema_editor.execute("ALTER TABLE %s ADD COLUMN %s %s" % (
+            schema_editor.quote_name(model._meta.db_table),
+            schema_editor.quote_name(field.column),
+            definition % tuple(map(schema_editor.quote_value, params)),  # SQLite needs a literal default
+        ), None)
+        for sql in schema_editor._field_indexes_sql(model, field):  # db_index=True
+            schema_editor.execute(sql)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != "sqlite":
+            return super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+        model = from_state.apps.get_model(app_label, self.model_name)
+        field = model._meta.get_field(self.name)
+        for sql in schema_editor._field_indexes_sql(model, field):  # SQLite can not drop an indexed column
+            schema_editor.execute(schema_editor._delete_index_sql(model, str(sql.parts["name"])))
+        schema_editor.execute("ALTER TABLE %s DROP COLUMN %s" % (
+            schema_editor.quote_name(model._meta.db_table), schema_editor.quote_name(field.column),
+        ), None)
@@ -0,0 +1,75 @@
+"""
+PostgreSQL backend that borrows connections from an in-process psycopg2 pool.
+
+Django closes its connection at the end of every request when CONN_MAX_AGE is 0. With this backend closing
+returns the connection to the pool instead, so a worker keeps POOL_MIN_SIZE warm connections and never opens
+more than POOL_MAX_SIZE. Pool sizes are read from OPTIONS and removed before the psycopg2 connect call.
+"""
+import os
+import threading
+
+from django.db.backends.postgresql import base
+from psycopg2.pool import ThreadedConnectionPool
+
+from core_apps._config.metrics_config.metrics import metrics
+
+POOL_OPTIONS = ("POOL_MIN_SIZE", "POOL_MAX_SIZE")
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class ConnectionPool(ThreadedConnectionPool):
+
+    def __init__(self, alias, connect, min_size, max_size):
+        self.alias = alias
+        self.connect = connect  # set before super().__init__, which opens min_size connections
+        super().__init__(min_size, max_size)
+
+    def _connect(self, key=None):
+        connection = self.connect()
+        metrics.increment("db_pool_connections_opened", alias=self.alias)
+        if key is not None:
+            self._used[key] = connection
+            self._rused[id(connection)] = key
+        else:
+            self._pool.append(connection)
+        return connection
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_connection_params(self):
+        conn_params = super().get_connection_params()
+        for option in POOL_OPTIONS:
+            conn_params.pop(option, None)  # pool settings, not libpq parameters
+        return conn_params
+
+    def get_pool(self, conn_params):
+        key = (self.alias, os.getpid())  # a forked worker must not share its parent's sockets
+        with _pools_lock:
+            if key not in _pools:
+                options = self.settings_dict["OPTIONS"]
+                _pools[key] = ConnectionPool(
+                    self.alias,
+                    lambda: super(DatabaseWrapper, self).get_new_connection(conn_params),
+                    options.get("POOL_MIN_SIZE", 2),
+                    options.get("POOL_MAX_SIZE", 20),
+                )
+            return _pools[key]
+
+    def get_new_connection(self, conn_params):
+        pool = self.get_pool(conn_params)
+        connection = pool.getconn()
+        while connection.closed:  # dropped while it was idle in the pool
+            pool.putconn(connection, close=True)
+            connection = pool.getconn()
+
+        metrics.increment("db_pool_checkouts", alias=self.alias)
+        self.isolation_level = self.settings_dict["OPTIONS"].get("isolation_level", connection.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.get_pool(self.get_connection_params()).putconn(self.connection)  # rolls back if needed
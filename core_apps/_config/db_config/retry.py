@@ -0,0 +1,24 @@
+import random
+import time
+
+from django.db import OperationalError, transaction
+
+from core_apps._config.metrics_config.metrics import metrics
+
+
+def retry_on_conflict(function, attempts=5, base_delay=0.01):
+    """
+    Run function in a savepoint, retrying on deadlocks, serialization failures and lock timeouts.
+
+    A failed statement aborts the surrounding PostgreSQL transaction, so every attempt gets its own savepoint
+    to roll back to. Waits grow exponentially with jitter so that competing requests do not retry in lockstep.
+    """
+    for attempt in range(attempts):
+        try:
+            with transaction.atomic():
+                return function()
+        except OperationalError:
+            if attempt == attempts - 1:
+                raise
+            metrics.increment("db_conflict_retries")
+            time.sleep(base_delay * 2 ** attempt * random.uniform(0.5, 1.5))
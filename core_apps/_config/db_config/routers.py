@@ -0,0 +1,62 @@
+import asyncio
+import functools
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+from core_apps._config.metrics_config.metrics import metrics
+
+_replica_reads = ContextVar("replica_reads", default=False)
+
+
+@contextmanager
+def use_replica():
+    """Send the reads of this block to a read replica, when DATABASE_REPLICAS lists any."""
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def replica_reads(method):
+    """Decorator for read-only view methods, sync or async, whose queries may be served by a replica."""
+    if asyncio.iscoroutinefunction(method):
+        @functools.wraps(method)
+        async def async_wrapper(*args, **kwargs):
+            with use_replica():  # sync_to_async copies the context, so thread hops keep the flag
+                return await method(*args, **kwargs)
+
+        return async_wrapper
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        with use_replica():
+            return method(*args, **kwargs)
+
+    return wrapper
+
+
+class ReplicaRouter:
+    """
+    Routes reads inside use_replica() to a random replica alias and everything else to the default database.
+
+    Replicas lag behind the primary, so only views that tolerate slightly stale data opt in.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = getattr(settings, "DATABASE_REPLICAS", ())
+        alias = random.choice(replicas) if replicas and _replica_reads.get() else "default"
+        metrics.increment("db_routed_reads", alias=alias)
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True  # replicas hold the same rows as the primary
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == "default"  # replicas receive the schema through replication
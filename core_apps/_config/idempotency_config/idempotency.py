@@ -0,0 +1,130 @@
+"""
+Idempotency-Key support for POST endpoints.
+
+Keys live in the IdempotencyKey table, so every worker sees them, and are scoped to the client: its session
+cookie, or its IP before it has a session (X-Forwarded-For only counts behind REST_FRAMEWORK['NUM_PROXIES']
+proxies). The first request with a key claims a row through the unique index and runs the view; when it
+succeeds, its response and session key are kept for IDEMPOTENCY['TTL'] seconds and retries get them back
+without running the view again. Concurrent duplicates wait for the running request. A key reused for a
+different request body is rejected with 422.
+"""
+import functools
+import hashlib
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.throttling import BaseThrottle
+
+from core_apps._config.metrics_config.metrics import metrics
+from core_apps.order.models import IdempotencyKey
+
+POLL_INTERVAL = 0.05  # seconds between checks for the response of a running duplicate
+
+
+def fingerprint(request):
+    return hashlib.sha256(b"%s %s %s" % (request.method.encode(), request.path.encode(), request.body)).hexdigest()
+
+
+def scoped_key(request, key):
+    session_key = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    scope = f"session:{session_key}" if session_key else f"ip:{BaseThrottle().get_ident(request)}"
+    return hashlib.sha256(f"{scope} {key}".encode()).hexdigest()  # another client can not replay this response
+
+
+def replay(request, record):
+    metrics.increment("idempotency_replays", path=request.path)
+    response = Response(record.response, status=record.status, headers={"Idempotent-Replayed": "true"})
+    if record.session_key and not request.COOKIES.get(settings.SESSION_COOKIE_NAME):
+        response.set_cookie(
+            settings.SESSION_COOKIE_NAME, record.session_key, max_age=settings.SESSION_COOKIE_AGE,
+            domain=settings.SESSION_COOKIE_DOMAIN, path=settings.SESSION_COOKIE_PATH,
+            secure=settings.SESSION_COOKIE_SECURE, httponly=settings.SESSION_COOKIE_HTTPONLY,
+            samesite=settings.SESSION_COOKIE_SAMESITE,
+        )  # the first response created the session and was lost with its cookie, same scope so same client
+    return response
+
+
+def claim(key, request_fingerprint, config):
+    """Return (record, True) when this request must run the view, (record, False) when another one owns the key."""
+    now = timezone.now()
+    lock = now + timedelta(seconds=config["LOCK_TIMEOUT"])
+    IdempotencyKey.objects.filter(key=key, expires_at__lte=now).delete()  # an expired key can be used again
+
+    try:
+        with transaction.atomic():  # savepoint, the unique index decides which duplicate runs
+            return IdempotencyKey.objects.create(key=key, fingerprint=request_fingerprint, locked_until=lock,
+                                                 expires_at=now + timedelta(seconds=config["TTL"])), True
+    except IntegrityError:
+        pass
+
+    record = IdempotencyKey.objects.filter(key=key).first()
+    if record is None:  # deleted since, try again on the next poll
+        return None, False
+    if record.status is None and record.locked_until <= now and record.fingerprint == request_fingerprint:
+        taken = IdempotencyKey.objects.filter(id=record.id, status__isnull=True,
+                                              locked_until=record.locked_until).update(locked_until=lock)
+        return record, bool(taken)  # the original request died without an answer, take it over
+    return record, False
+
+
+def purge_expired(batch_size=1000):
+    """Delete expired keys in batches; returns the number of keys deleted."""
+    deleted = 0
+    while True:
+        expired = IdempotencyKey.objects.filter(expires_at__lte=timezone.now())
+        ids = list(expired.values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        IdempotencyKey.objects.filter(id__in=ids).delete()
+        deleted += len(ids)
+
+
+def idempotent(view_method):
+    """Decorator for APIView post methods; requests without an Idempotency-Key header run as before."""
+
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get("Idempotency-Key")
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+
+        config = settings.IDEMPOTENCY
+        key = scoped_key(request, key)
+        request_fingerprint = fingerprint(request)
+        deadline = time.monotonic() + config["LOCK_TIMEOUT"]
+
+        while True:
+            record, owned = claim(key, request_fingerprint, config)
+            if owned:  # only one duplicate runs the view
+                break
+            if record is not None:
+                if record.fingerprint != request_fingerprint:
+                    error_response = {"message": "error: Idempotency-Key was used for a different request"}
+                    return Response(error_response, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+                if record.status is not None:
+                    return replay(request, record)  # return the stored response
+
+            if time.monotonic() >= deadline:
+                error_response = {"message": "error: A request with this Idempotency-Key is in progress"}
+                return Response(error_response, status=status.HTTP_409_CONFLICT)
+            time.sleep(POLL_INTERVAL)
+
+        stored = False
+        try:
+            response = view_method(self, request, *args, **kwargs)
+            if status.is_success(response.status_code):  # failed requests may be retried with the same key
+                if request.session.modified and request.session.session_key is None:
+                    request.session.save()  # create the session key now so a replay can hand it out
+                stored = IdempotencyKey.objects.filter(id=record.id).update(
+                    status=response.status_code, response=response.data, session_key=request.session.session_key)
+            return response
+        finally:
+            if not stored:
+                IdempotencyKey.objects.filter(id=record.id, status__isnull=True).delete()  # release the key
+
+    return wrapper
@@ -0,0 +1,168 @@
+"""
+Per-request timing.
+
+InstrumentationMiddleware times every request into the request duration histogram. A sampled share of the
+requests (INSTRUMENTATION['SAMPLE_RATE']) is also profiled: every query goes through an execute wrapper that
+adds up database time and spots repeated statements, and views time their own sections with profile_section.
+Profiled requests are logged as one JSON line and get a Server-Timing header with the breakdown.
+
+The middleware runs natively under WSGI and ASGI. The profile of a request is found through a context variable,
+which follows the request into the threads of sync_to_async, so the execute wrapper is installed once on every
+connection instead of around each request.
+"""
+import asyncio
+import json
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from core_apps._config.metrics_config.metrics import metrics
+
+logger = logging.getLogger("core_apps.instrumentation")
+
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+_current_profile = ContextVar("request_profile", default=None)
+
+
+class RequestProfile:
+
+    def __init__(self):
+        self.db_time = 0.0
+        self.queries = 0
+        self.statements = {}
+        self.sections = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+            self.statements[sql] = self.statements.get(sql, 0) + 1  # same SQL with other parameters counts too
+
+    @property
+    def duplicates(self):
+        return {sql: count for sql, count in self.statements.items() if count > 1}
+
+
+def profiled_execute(execute, sql, params, many, context):
+    profile = _current_profile.get()
+    if profile is None:  # not sampled, one context variable lookup per query
+        return execute(sql, params, many, context)
+    return profile(execute, sql, params, many, context)
+
+
+@receiver(connection_created)
+def install_execute_wrapper(sender, connection, **kwargs):
+    if profiled_execute not in connection.execute_wrappers:
+        connection.execute_wrappers.append(profiled_execute)
+
+
+@contextmanager
+def profile_section(name):
+    """Time a part of a view, e.g. serialization; free when the request is not sampled."""
+    profile = _current_profile.get()
+    if profile is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.sections[name] = profile.sections.get(name, 0.0) + time.perf_counter() - start
+
+
+def endpoint_name(request):
+    match = request.resolver_match
+    if match is None:
+        return "unmatched"
+    view = getattr(match.func, "view_class", match.func)
+    return f"{request.method} {view.__name__}"
+
+
+class InstrumentationMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            self._is_coroutine = asyncio.coroutines._is_coroutine  # Django awaits __call__, no thread hop
+        for connection in connections.all():  # connections opened before this module was imported
+            install_execute_wrapper(None, connection)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        profile, token = self.start()
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            if token is not None:
+                _current_profile.reset(token)
+        return self.finish(request, response, profile, start)
+
+    async def __acall__(self, request):
+        profile, token = self.start()
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            if token is not None:
+                _current_profile.reset(token)
+        return self.finish(request, response, profile, start)
+
+    def start(self):
+        if random.random() >= settings.INSTRUMENTATION["SAMPLE_RATE"]:
+            return None, None
+        profile = RequestProfile()
+        return profile, _current_profile.set(profile)
+
+    def finish(self, request, response, profile, start):
+        duration = (time.perf_counter() - start) * 1000
+        endpoint = endpoint_name(request)
+        metrics.observe("http_request_duration_ms", duration, endpoint=endpoint, status=response.status_code)
+        if profile is not None:
+            self.report(request, response, endpoint, duration, profile, settings.INSTRUMENTATION)
+        return response
+
+    def report(self, request, response, endpoint, duration, profile, config):
+        db_time = profile.db_time * 1000
+        sections = {name: seconds * 1000 for name, seconds in profile.sections.items()}
+        duplicates = profile.duplicates
+
+        metrics.observe("db_time_ms", db_time, endpoint=endpoint)
+        metrics.observe("db_queries_per_request", profile.queries, buckets=QUERY_BUCKETS, endpoint=endpoint)
+        metrics.increment("db_duplicate_queries", sum(count - 1 for count in duplicates.values()), endpoint=endpoint)
+        for name, milliseconds in sections.items():
+            metrics.observe(f"{name}_time_ms", milliseconds, endpoint=endpoint)
+
+        if config["SERVER_TIMING"]:
+            timings = [f"app;dur={duration:.1f}", f'db;dur={db_time:.1f};desc="{profile.queries} queries"']
+            timings += [f"{name};dur={milliseconds:.1f}" for name, milliseconds in sections.items()]
+            response["Server-Timing"] = ", ".join(timings)
+
+        slow = duration >= config["SLOW_REQUEST_MS"]
+        logger.log(logging.WARNING if slow or duplicates else logging.INFO, json.dumps({
+            "endpoint": endpoint,
+            "path": request.path,
+            "status": response.status_code,
+            "duration_ms": round(duration, 2),
+            "db_ms": round(db_time, 2),
+            "queries": profile.queries,
+            "duplicate_queries": [{"sql": sql[:200], "count": count} for sql, count in duplicates.items()],
+            "sections_ms": {name: round(milliseconds, 2) for name, milliseconds in sections.items()},
+        }))
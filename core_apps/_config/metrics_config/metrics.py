@@ -0,0 +1,95 @@
+import threading
+from collections import defaultdict
+
+DEFAULT_BUCKETS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)  # milliseconds
+
+
+class MetricsRegistry:
+    """
+    Process local counters and histograms.
+
+    Each uwsgi/uvicorn worker keeps its own registry, so the numbers describe the worker that served the metrics
+    request. Metrics are keyed by name and labels, e.g. increment("db_reads", alias="replica").
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(int)
+        self._histograms = {}
+
+    def increment(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] += value
+
+    def observe(self, name, value, buckets=DEFAULT_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {"buckets": buckets, "counts": [0] * len(buckets), "sum": 0.0,
+                                                     "count": 0}
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram["counts"][index] += 1
+                    break  # buckets are made cumulative when rendered
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    def value(self, name, **labels):
+        return self._counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def collect(self):
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, {**histogram, "counts": list(histogram["counts"])})
+                                for key, histogram in self._histograms.items())
+        return counters, histograms
+
+    def snapshot(self):
+        counters, histograms = self.collect()
+        data = defaultdict(list)
+        for (name, labels), value in counters:
+            data[name].append({"labels": dict(labels), "value": value})
+        for (name, labels), histogram in histograms:
+            data[name].append({"labels": dict(labels), "count": histogram["count"], "sum": histogram["sum"]})
+        return dict(data)
+
+    def prometheus(self):
+        """Render every metric in the Prometheus text exposition format."""
+        counters, histograms = self.collect()
+        lines = []
+        declared = set()
+        for (name, labels), value in counters:
+            if name not in declared:
+                lines.append(f"# TYPE {name} counter")
+                declared.add(name)
+            lines.append(f"{name}{render_labels(labels)} {value}")
+
+        for (name, labels), histogram in histograms:
+            if name not in declared:
+                lines.append(f"# TYPE {name} histogram")
+                declared.add(name)
+            cumulative = 0
+            for bound, count in zip(histogram["buckets"], histogram["counts"]):
+                cumulative += count
+                lines.append(f"{name}_bucket{render_labels(labels + (('le', bound),))} {cumulative}")
+            lines.append(f"{name}_bucket{render_labels(labels + (('le', '+Inf'),))} {histogram['count']}")
+            lines.append(f"{name}_sum{render_labels(labels)} {histogram['sum']}")
+            lines.append(f"{name}_count{render_labels(labels)} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+def render_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + "}"
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework import status, views
+from rest_framework.permissions import BasePermission
+from rest_framework.response import Response
+
+from core_apps._config.metrics_config.metrics import metrics
+
+
+class IsStaffOrMetricsScraper(BasePermission):
+    """Staff users, or requests from an address in INSTRUMENTATION['METRICS_ALLOWED_IPS'] (the Prometheus host)."""
+
+    def has_permission(self, request, view):
+        if request.META.get("REMOTE_ADDR") in settings.INSTRUMENTATION["METRICS_ALLOWED_IPS"]:
+            return True  # the socket address, X-Forwarded-For can be made up by anyone
+        return bool(request.user and request.user.is_staff)
+
+
+class MetricsView(views.APIView):
+    permission_classes = [IsStaffOrMetricsScraper]
+
+    def get(self, request):
+        return Response(metrics.snapshot(), status=status.HTTP_200_OK)  # return counters of this worker
+
+
+class PrometheusMetricsView(views.APIView):
+    permission_classes = [IsStaffOrMetricsScraper]
+
+    def get(self, request):
+        return HttpResponse(metrics.prometheus(), content_type="text/plain; version=0.0.4; charset=utf-8")
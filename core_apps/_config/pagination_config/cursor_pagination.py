@@ -0,0 +1,33 @@
+import base64
+import binascii
+import json
+
+from core_apps._config.exception_config.exception_handler import CustomException
+
+
+def encode_cursor(values):
+    raw = json.dumps(list(values), separators=(",", ":"), default=str).encode()  # serialize keyset values
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")  # opaque url safe token
+
+
+def decode_cursor(cursor, size):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))  # restore padding
+        values = json.loads(raw)
+    except (binascii.Error, ValueError, UnicodeDecodeError):
+        raise CustomException("Invalid cursor")  # raise exception if cursor can not be decoded
+
+    if not isinstance(values, list) or len(values) != size:
+        raise CustomException("Invalid cursor")  # raise exception if cursor does not match the keyset
+
+    return values
+
+
+def paginate_keyset(queryset, limit, key):
+    rows = list(queryset[:limit + 1])  # fetch one extra row to know if there is a next page
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(key(rows[-1]))  # build cursor from the last row of this page
+
+    return rows, next_cursor
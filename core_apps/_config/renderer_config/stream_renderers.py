@@ -0,0 +1,70 @@
+import csv
+
+import orjson
+from rest_framework.renderers import BaseRenderer
+
+from core_apps._config.renderer_config.orjson_renderer import ORJSON_OPTIONS, encode_default
+
+
+class StreamRenderer(BaseRenderer):
+    """
+    Renderer for row exports: stream() turns an iterable of dicts into chunks for a StreamingHttpResponse.
+
+    Rows are encoded as they come, so memory only grows with chunk_size. render() encodes rows at once,
+    such as a single error message dict.
+    """
+
+    chunk_size = 1000
+
+    def header(self, fields):
+        return b""
+
+    def encode_rows(self, rows):
+        raise NotImplementedError
+
+    def stream(self, rows, fields, chunk_size=None):
+        chunk_size = chunk_size or self.chunk_size
+        yield self.header(fields)
+
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield self.encode_rows(chunk)
+                chunk = []
+        if chunk:
+            yield self.encode_rows(chunk)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        rows = [data] if isinstance(data, dict) else list(data)
+        return b"".join(self.stream(rows, list(rows[0]) if rows else []))
+
+
+class NDJSONRenderer(StreamRenderer):
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+
+    def encode_rows(self, rows):
+        return b"".join(orjson.dumps(row, default=encode_default, option=ORJSON_OPTIONS) + b"\n" for row in rows)
+
+
+class Echo:
+    """File-like object handing back what csv.writer writes, instead of buffering it."""
+
+    def write(self, value):
+        return value
+
+
+class CSVRenderer(StreamRenderer):
+    media_type = "text/csv"
+    format = "csv"
+    charset = "utf-8"
+
+    def __init__(self):
+        self.writer = csv.writer(Echo())
+
+    def header(self, fields):
+        return self.writer.writerow(fields).encode()
+
+    def encode_rows(self, rows):
+        return "".join(self.writer.writerow(row.values()) for row in rows).encode()
@@ -0,0 +1,20 @@
+from django.utils.crypto import get_random_string
+
+CART_SESSION_KEY = "cart_key"
+
+
+def retrieve_cart_key(session, create=False):
+    """
+    Return the key that identifies the cart of this session.
+
+    Read-only requests never create a session. When create is set a random cart key is stored in the session;
+    the session middleware then writes the new session once, together with the response. Sessions created
+    before cart keys existed keep using their session key.
+    """
+    cart_key = session.get(CART_SESSION_KEY) or session.session_key
+    if cart_key or not create:
+        return cart_key
+
+    cart_key = get_random_string(32)
+    session[CART_SESSION_KEY] = cart_key  # mark the session as modified
+    return cart_key
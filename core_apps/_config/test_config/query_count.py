@@ -0,0 +1,20 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryCountMixin:
+    """TestCase mixin to check that an endpoint runs the same number of queries whatever the data size."""
+
+    def count_queries(self, action):
+        with CaptureQueriesContext(connection) as context:
+            action()
+        return len(context.captured_queries)
+
+    def assertConstantQueries(self, prepare, action, sizes=(1, 5, 25)):
+        counts = {}
+        for size in sizes:
+            prepare(size)  # build a fixture of this size
+            counts[size] = self.count_queries(action)
+
+        self.assertEqual(len(set(counts.values())), 1, f"query count grows with size: {counts}")
+        return counts[sizes[0]]
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """
+    DiscoverRunner with request throttling turned off.
+
+    Every test client shares one IP and tests send requests much faster than real clients. Throttling tests
+    turn it back on with override_settings.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.throttle = settings.THROTTLE
+        settings.THROTTLE = {**settings.THROTTLE, 'ENABLED': False}
+
+    def teardown_test_environment(self, **kwargs):
+        settings.THROTTLE = self.throttle
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,92 @@
+import math
+
+from django.conf import settings
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from core_apps._config.metrics_config.metrics import metrics
+from core_apps._config.renderer_config.orjson_renderer import json_response
+from core_apps._config.throttle_config.token_bucket import get_bucket_store
+
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_rate(rate):
+    """'20/s' -> (20 tokens per second, burst of 20): the bucket holds one period worth of requests."""
+    requests, period = rate.split("/")
+    requests = int(requests)
+    return requests / PERIODS[period[0]], requests
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Token bucket throttle for views with a throttle_scope.
+
+    The rate of a request is THROTTLE['RATES'][rate_name]; views without a scope and scopes without a rate are
+    not throttled. Rejected requests get a 429 with Retry-After from DRF.
+    """
+
+    def __init__(self):
+        self.wait_time = 0.0
+
+    def rate_name(self, request, view):
+        raise NotImplementedError
+
+    def bucket_key(self, request, view):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        config = settings.THROTTLE
+        if not config["ENABLED"] or not getattr(view, "throttle_scope", None):
+            return True
+
+        rate_name = self.rate_name(request, view)
+        rate = config["RATES"].get(rate_name)
+        if not rate:
+            return True
+
+        tokens_per_second, burst = parse_rate(rate)
+        self.wait_time = get_bucket_store().consume(f"{rate_name}:{self.bucket_key(request, view)}",
+                                                    tokens_per_second, burst)
+        if self.wait_time:
+            metrics.increment("throttled_requests", rate=rate_name)
+        return not self.wait_time
+
+    def wait(self):
+        return self.wait_time
+
+
+class ScopedTokenBucketThrottle(TokenBucketThrottle):
+    """Per endpoint limit ('<scope>.read' or '<scope>.write') for each session, or each IP without a session."""
+
+    def rate_name(self, request, view):
+        return f"{view.throttle_scope}.{'read' if request.method in SAFE_METHODS else 'write'}"
+
+    def bucket_key(self, request, view):
+        session_key = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+        return f"session:{session_key}" if session_key else f"ip:{self.get_ident(request)}"
+
+
+class IPTokenBucketThrottle(TokenBucketThrottle):
+    """Overall limit of an IP, so that clients can not escape the scoped limit with made up session cookies."""
+
+    def rate_name(self, request, view):
+        return "ip"
+
+    def bucket_key(self, request, view):
+        return self.get_ident(request)
+
+
+def throttled_response(request, view):
+    """Throttle check for the async views, which do not go through DRF; returns a 429 response or None."""
+    waits = [throttle.wait() for throttle in (cls() for cls in api_settings.DEFAULT_THROTTLE_CLASSES)
+             if not throttle.allow_request(request, view)]
+    if not waits:
+        return None
+
+    wait = math.ceil(max(waits))
+    response = json_response({"detail": f"Request was throttled. Expected available in {wait} seconds."},
+                             status=429)  # same body as DRF's Throttled
+    response["Retry-After"] = str(wait)
+    return response
@@ -0,0 +1,119 @@
+"""
+Token bucket stores for request throttling.
+
+A bucket holds up to `burst` tokens and gains `rate` tokens per second; every request takes one. consume()
+returns 0.0 when the request may run, otherwise the seconds until a token is available.
+"""
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+
+def take(tokens, updated, now, rate, burst):
+    """Refill a bucket up to now and take one token; returns (tokens left, updated, seconds to wait)."""
+    tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+    if tokens >= 1:
+        return tokens - 1, now, 0.0
+    return tokens, now, (1 - tokens) / rate
+
+
+class SharedMemoryBucketStore:
+    """
+    Buckets in a memory mapped file, shared by every process that maps it (the uwsgi workers of one host).
+
+    The file is a fixed hash table split in stripes of STRIPE_SLOTS slots (key hash, tokens, updated). A key
+    lives in the stripe its hash points to; when the stripe is full the least recently used slot is reused,
+    which only forgets an idle client. A stripe is guarded by a byte range lock for other processes and by a
+    thread lock inside this process, so a check is a hash, two uncontended locks and a few struct operations.
+    """
+
+    SLOT = struct.Struct("<Qdd")
+    STRIPE_SLOTS = 8
+    THREAD_LOCKS = 64
+
+    def __init__(self, path, slots):
+        self.stripes = max(1, slots // self.STRIPE_SLOTS)
+        self.stripe = struct.Struct("<" + "Qdd" * self.STRIPE_SLOTS)
+        size = self.stripes * self.stripe.size
+
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self.fd).st_size < size:
+            os.ftruncate(self.fd, size)  # new pages read as zeros, that is empty slots
+        self.memory = mmap.mmap(self.fd, size)  # MAP_SHARED, forked workers see the same pages
+        self.thread_locks = [threading.Lock() for _ in range(self.THREAD_LOCKS)]
+
+    def consume(self, key, rate, burst):
+        digest = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little") or 1  # 0 is empty
+        stripe = digest % self.stripes
+        offset = stripe * self.stripe.size
+
+        with self.thread_locks[stripe % self.THREAD_LOCKS]:  # fcntl locks are per process, not per thread
+            fcntl.lockf(self.fd, fcntl.LOCK_EX, 1, stripe)
+            try:
+                values = self.stripe.unpack_from(self.memory, offset)
+                slot, tokens, updated = self.find_slot(values, digest, burst)
+                tokens, updated, wait = take(tokens, updated, time.time(), rate, burst)
+                self.SLOT.pack_into(self.memory, offset + slot * self.SLOT.size, digest, tokens, updated)
+            finally:
+                fcntl.lockf(self.fd, fcntl.LOCK_UN, 1, stripe)
+        return wait
+
+    def find_slot(self, values, digest, burst):
+        oldest = 0
+        for slot in range(self.STRIPE_SLOTS):
+            slot_digest, tokens, updated = values[slot * 3:slot * 3 + 3]
+            if slot_digest == digest:
+                return slot, tokens, updated
+            if updated < values[oldest * 3 + 2]:
+                oldest = slot
+        return oldest, float(burst), 0.0  # new client, empty slots have never been updated
+
+
+class CacheBucketStore:
+    """
+    Buckets in a Django cache alias, for deployments spanning several hosts.
+
+    The read and the write are separate cache calls, so concurrent requests of one client may both take the
+    last token; the limit is approximate, which is fine for throttling.
+    """
+
+    def __init__(self, alias):
+        self.cache = caches[alias]
+
+    def consume(self, key, rate, burst):
+        cache_key = "throttle:" + hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+        tokens, updated = self.cache.get(cache_key) or (float(burst), 0.0)
+        tokens, updated, wait = take(tokens, updated, time.time(), rate, burst)
+        self.cache.set(cache_key, (tokens, updated), timeout=int(burst / rate) + 1)  # a full bucket is forgotten
+        return wait
+
+
+_bucket_store = None
+
+
+def get_bucket_store():
+    global _bucket_store
+    if _bucket_store is None:
+        config = settings.THROTTLE
+        if config["STORE"] == "cache":
+            _bucket_store = CacheBucketStore(alias=config["CACHE_ALIAS"])
+        else:
+            _bucket_store = SharedMemoryBucketStore(path=config["SHARED_MEMORY_PATH"],
+                                                    slots=config["SHARED_MEMORY_SLOTS"])
+    return _bucket_store
+
+
+@receiver(setting_changed)
+def reset_bucket_store(setting, **kwargs):
+    global _bucket_store
+    if setting == "THROTTLE":
+        _bucket_store = None
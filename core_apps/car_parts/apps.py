@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class CarPartsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core_apps.car_parts'
+
+    def ready(self):
+        from core_apps.car_parts import search  # noqa: F401 register search index signal handlers
+        from core_apps._config.db_config import connection_health  # noqa: F401 connection metrics, health checks
@@ -0,0 +1,74 @@
+from core_apps._config.async_config.async_orm import afirst, database_sync_to_async
+from core_apps._config.async_config.async_view import AsyncView
+from core_apps._config.cache_config.product_cache import get_product_cache
+from core_apps._config.conditional_config.conditional_get import not_modified_response, set_validators
+from core_apps._config.db_config.routers import replica_reads
+from core_apps._config.exception_config.exception_handler import CustomException
+from core_apps._config.renderer_config.orjson_renderer import json_response
+from core_apps._config.throttle_config.throttles import throttled_response
+from core_apps.car_parts.models import Product
+from core_apps.car_parts.serializers import PRODUCT_FIELDS, map_product_row
+from core_apps.car_parts.views import ProductView
+
+
+class AsyncProductView(AsyncView):
+    """
+    ASGI variant of ProductView.
+
+    GET runs on the event loop and only leaves it for database work. POST, PUT and DELETE run the synchronous
+    ProductView unchanged in the request thread, so its transactions behave exactly as under WSGI.
+    """
+
+    sync_view = staticmethod(ProductView.as_view())
+    throttle_scope = ProductView.throttle_scope
+
+    @replica_reads  # reads may be served by a read replica
+    async def get(self, request, product_id=None):
+        throttled = throttled_response(request, self)  # writes are throttled by the DRF view
+        if throttled is not None:
+            return throttled
+
+        view = ProductView(request=request)  # reuse the request parsing of the synchronous view
+
+        try:
+            view.product_id = product_id  # set product id
+            view.populate_variables()  # define a function to populate variables
+
+            if view.product_id:
+                data = await get_product_cache().aget_detail(view.product_id, lambda: self.load_details(view))
+                updated_on = data.get("updated_on")  # the payload carries its last change
+            else:
+                updated_on = await get_product_cache().aget_catalogue_updated_on(
+                    database_sync_to_async(view.load_catalogue_updated_on))
+
+            not_modified = not_modified_response(request, updated_on)  # answer If-None-Match/If-Modified-Since
+            if not_modified is not None:
+                return not_modified
+
+            if not view.product_id:
+                data = await get_product_cache().aget_list(view.list_params(), database_sync_to_async(view.load_list))
+
+            return set_validators(json_response(data, status=200), updated_on)  # return response
+
+        except CustomException as error_message:
+            return json_response({"message": "error: " + str(error_message)}, status=400)  # return error response
+
+        except Exception as ex:
+            return json_response({"message": "error: " + str(ex)}, status=400)
+
+    async def load_details(self, view):
+        product = await afirst(
+            Product.objects.filter(id=view.product_id, is_delete=False).values_list(*PRODUCT_FIELDS)
+        )  # get product row
+        if product is None:
+            raise CustomException("Product does not exist")  # raise exception if product does not exist
+        return map_product_row(product)
+
+    async def post(self, request, *args, **kwargs):
+        return await database_sync_to_async(self.sync_view)(request, *args, **kwargs)
+
+    async def put(self, request, *args, **kwargs):
+        return await database_sync_to_async(self.sync_view)(request, *args, **kwargs)
+
+    async def delete(self, request, *args, **kwargs):
+        return await database_sync_to_async(self.sync_view)(request, *args, **kwargs)
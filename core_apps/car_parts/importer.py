@@ -0,0 +1,181 @@
+"""
+Bulk product import from CSV or NDJSON.
+
+Rows are read one at a time from any iterable of byte lines (an open file, an upload, the request stream), so
+memory only grows with the batch size. Every row is validated on its own and a bad row is reported with its
+number instead of stopping the import. Valid rows are upserted by active product name, one INSERT ... ON
+CONFLICT statement and one transaction per batch.
+"""
+import codecs
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+
+from core_apps._config.cache_config.product_cache import get_product_cache
+from core_apps._config.exception_config.exception_handler import CustomException
+from core_apps._config.payload_config.payload_validator import validate_payload
+from core_apps.car_parts.models import Product
+from core_apps.car_parts.search import invalidate_search_index
+
+IMPORT_FIELDS = ["name", "description", "price", "quantity"]  # the fields ProductView.post requires
+
+FORMATS = ("csv", "ndjson")
+
+PRICE_FIELD = Product._meta.get_field("price")
+NAME_LENGTH = Product._meta.get_field("name").max_length
+
+
+def read_csv(lines):
+    reader = csv.DictReader(codecs.iterdecode(lines, "utf-8-sig"))  # a quoted value may span several lines
+    for row_number, row in enumerate(reader, start=1):
+        yield row_number, {key: value if value != "" else None for key, value in row.items()}, None
+
+
+def read_ndjson(lines):
+    for row_number, line in enumerate(codecs.iterdecode(lines, "utf-8-sig"), start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as error:
+            yield row_number, None, f"Invalid JSON: {error}"
+            continue
+        if not isinstance(row, dict):
+            yield row_number, None, "Row must be a JSON object"
+            continue
+        yield row_number, row, None
+
+
+def read_rows(lines, file_format):
+    """Yield (row number, row dict, parse error) for every row of a CSV or NDJSON file."""
+    return read_csv(lines) if file_format == "csv" else read_ndjson(lines)
+
+
+def clean_row(row):
+    """Validate a row like ProductView.post does and convert it; raises CustomException."""
+    is_valid, message = validate_payload(IMPORT_FIELDS, row)
+    if not is_valid:
+        raise CustomException(message)
+
+    name = str(row["name"]).strip()
+    if not name or len(name) > NAME_LENGTH:
+        raise CustomException(f"name must have 1 to {NAME_LENGTH} characters")
+
+    try:
+        price = Decimal(str(row["price"]))
+    except InvalidOperation:
+        price = None
+    if price is None or not price.is_finite() or price < 0 or price != round(price, PRICE_FIELD.decimal_places) \
+            or price >= 10 ** (PRICE_FIELD.max_digits - PRICE_FIELD.decimal_places):
+        raise CustomException("price must be a positive amount with at most 2 decimal places")
+
+    quantity = row["quantity"]
+    if isinstance(quantity, str) and quantity.strip().lstrip("-").isdigit():
+        quantity = int(quantity)
+    if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity < 0:
+        raise CustomException("quantity must be a positive integer")
+
+    return name, str(row["description"]), price, quantity
+
+
+def upsert_products(rows, now):
+    """Insert or update (name, description, price, quantity) rows by active name; returns the rows written."""
+    table = connection.ops.quote_name(Product._meta.db_table)
+    updated_on = connection.ops.adapt_datetimefield_value(now)
+    values = ", ".join(["(%s, %s, %s, %s, 0, %s, %s, %s)"] * len(rows))
+    params = []
+    for name, description, price, quantity in rows:
+        params += [name, description, connection.ops.adapt_decimalfield_value(price), quantity, False, updated_on,
+                   updated_on]
+
+    with connection.cursor() as cursor:  # unchanged products keep their updated_on
+        cursor.execute(
+            f"INSERT INTO {table} (name, description, price, quantity, reserved, is_delete, created_on, updated_on) "
+            f"VALUES {values} "
+            f"ON CONFLICT (name) WHERE NOT is_delete DO UPDATE SET description = excluded.description, "
+            f"price = excluded.price, quantity = excluded.quantity, updated_on = excluded.updated_on "
+            f"WHERE {table}.description <> excluded.description OR {table}.price <> excluded.price "
+            f"OR {table}.quantity <> excluded.quantity",
+            params,
+        )
+        return cursor.rowcount
+
+
+class ProductImporter:
+
+    def __init__(self, batch_size=None, max_errors=None):
+        self.batch_size = batch_size or settings.PRODUCT_IMPORT["BATCH_SIZE"]
+        self.max_errors = max_errors or settings.PRODUCT_IMPORT["MAX_ERRORS"]
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.duplicates = 0
+        self.error_count = 0
+        self.errors = []
+
+    def add_error(self, row_number, message):
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:  # the report stays small whatever the file
+            self.errors.append({"row": row_number, "message": message})
+
+    def run(self, lines, file_format):
+        if file_format not in FORMATS:
+            raise CustomException(f"Unsupported format {file_format}, use csv or ndjson")
+
+        batch = {}  # name: (row number, values), a later row of the same name replaces the earlier one
+        for row_number, row, error in read_rows(lines, file_format):
+            self.rows += 1
+            try:
+                if error:
+                    raise CustomException(error)
+                values = clean_row(row)
+            except CustomException as error_message:
+                self.add_error(row_number, str(error_message))
+                continue
+
+            if values[0] in batch:
+                self.duplicates += 1
+            batch[values[0]] = (row_number, values)
+            if len(batch) >= self.batch_size:
+                self.write(batch)
+                batch = {}
+        if batch:
+            self.write(batch)
+
+        if self.created or self.updated:
+            invalidate_search_index()
+        return self.report()
+
+    def write(self, batch):
+        rows = [values for _, values in batch.values()]
+        try:
+            with transaction.atomic():
+                existing = list(Product.objects.filter(is_delete=False, name__in=list(batch)).values_list(
+                    "id", flat=True))  # tells created rows from updated ones
+                written = upsert_products(rows, timezone.now())
+        except DatabaseError as error:  # only this batch is lost
+            for row_number, _ in batch.values():
+                self.add_error(row_number, f"Batch failed: {error}")
+            return
+
+        created = len(rows) - len(existing)
+        self.created += created
+        self.updated += written - created
+        self.unchanged += len(existing) - (written - created)
+        get_product_cache().invalidate(existing)  # new products only change list pages
+
+    def report(self):
+        return {
+            "rows": self.rows,
+            "created": self.created,
+            "updated": self.updated,
+            "unchanged": self.unchanged,
+            "duplicates": self.duplicates,
+            "error_count": self.error_count,
+            "errors": self.errors,
+        }
@@ -0,0 +1,200 @@
+import io
+import json
+import random
+import statistics
+import time
+from itertools import count
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import F, Max, Min
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from core_apps._config.cache_config.product_cache import get_product_cache
+from core_apps.car_parts.models import Product
+from core_apps.car_parts.search import invalidate_search_index
+from core_apps.order.models import Cart, Order, StockReservation
+
+ORDER_PAYLOAD = {
+    "customer_name": "James Nathan",
+    "customer_email": "james@gmail.com",
+    "customer_phone": "+112254873697",
+    "delivery_date": "2024-01-25",
+    "delivery_time": "12:25",
+}  # body of the Postman "Create order" request
+
+
+class Scenarios:
+    """
+    The requests of the Postman collection. Each scenario returns (client, method, path, body) for one timed
+    request; whatever it sends before that, like filling a cart, is setup and is not measured.
+    """
+
+    def __init__(self, seed):
+        self.sequence = count()
+        self.random = random.Random(seed)
+        bounds = Product.objects.aggregate(low=Min('id'), high=Max('id'))
+        self.low, self.high = bounds['low'], bounds['high']
+
+    def product(self):
+        """A random product with stock left to reserve."""
+        products = Product.objects.filter(is_delete=False, quantity__gte=F('reserved') + 10).order_by('id')
+        start = self.random.randint(self.low, self.high)
+        return (products.filter(id__gte=start).values_list('id', flat=True).first()
+                or products.values_list('id', flat=True).first())
+
+    def cart_client(self, lines=3):
+        client = Client()
+        for _ in range(lines):
+            client.post('/api/v1/cart/', {'product_id': self.product(), 'quantity': 1},
+                        content_type='application/json')
+        return client
+
+    def save_product(self):
+        body = {'name': f'Benchmark item {next(self.sequence)}', 'description': 'Description 1', 'price': 20.5,
+                'quantity': 10}
+        return Client(), 'post', '/api/v1/product/', body
+
+    def update_product(self):
+        return Client(), 'put', f'/api/v1/product/{self.product()}/', {'description': 'Description Updated'}
+
+    def list_products(self):
+        return Client(), 'get', '/api/v1/product/', None
+
+    def search_products(self):
+        return Client(), 'get', '/api/v1/product/?keyword=brake', None
+
+    def list_products_page(self):
+        return Client(), 'get', '/api/v1/product/?page=1&limit=10', None
+
+    def search_products_page(self):
+        return Client(), 'get', '/api/v1/product/?page=1&limit=10&keyword=brake', None
+
+    def product_detail(self):
+        return Client(), 'get', f'/api/v1/product/{self.product()}/', None
+
+    def create_cart(self):
+        return Client(), 'post', '/api/v1/cart/', {'product_id': self.product(), 'quantity': 2}
+
+    def update_cart(self):
+        return self.cart_client(1), 'post', '/api/v1/cart/', {'product_id': self.product(), 'quantity': 4}
+
+    def view_cart(self):
+        return self.cart_client(), 'get', '/api/v1/cart/', None
+
+    def delete_cart_item(self):
+        client = Client()
+        product_id = self.product()
+        client.post('/api/v1/cart/', {'product_id': product_id, 'quantity': 1}, content_type='application/json')
+        return client, 'delete', f'/api/v1/cart/{product_id}/', None
+
+    def create_order(self):
+        return self.cart_client(), 'post', '/api/v1/order/', ORDER_PAYLOAD
+
+    def delete_product(self):
+        product = Product.objects.create(name=f'Benchmark delete {next(self.sequence)}', description='d',
+                                         price='1.00', quantity=1)
+        return Client(), 'delete', f'/api/v1/product/{product.id}/', None
+
+
+SCENARIOS = [
+    'save_product', 'update_product', 'list_products', 'search_products', 'list_products_page',
+    'search_products_page', 'product_detail', 'create_cart', 'update_cart', 'view_cart', 'delete_cart_item',
+    'create_order', 'delete_product',
+]
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks every endpoint on a throwaway test database seeded at several sizes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000], help='Products per run')
+        parser.add_argument('--requests', type=int, default=50, help='Timed requests per scenario')
+        parser.add_argument('--scenario', choices=SCENARIOS, nargs='+', default=SCENARIOS)
+        parser.add_argument('--no-cache', action='store_true', help='Measure with the product cache disabled')
+        parser.add_argument('--save-baseline', metavar='PATH', help='Write the results to a JSON file')
+        parser.add_argument('--baseline', metavar='PATH', help='Compare with a JSON file written earlier')
+        parser.add_argument('--threshold', type=float, default=0.25,
+                            help='Allowed p95 slowdown over the baseline, 0.25 is 25%%')
+        parser.add_argument('--keep-db', action='store_true', help='Reuse the test database between runs')
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keep_db'])
+        try:
+            cache = {'PRODUCT_CACHE': {'BACKEND': 'none'}} if options['no_cache'] else {}
+            throttle = {**settings.THROTTLE, 'ENABLED': False}  # measure the endpoints, not the limits
+            with override_settings(DEBUG=False, THROTTLE=throttle, **cache):
+                results = {str(size): self.run_size(size, options) for size in options['sizes']}
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keep_db'])
+
+        if options['save_baseline']:
+            with open(options['save_baseline'], 'w') as baseline:
+                json.dump(results, baseline, indent=2, sort_keys=True)
+        if options['baseline']:
+            self.compare(results, options['baseline'], options['threshold'])
+
+    def run_size(self, size, options):
+        for model in (Order, Cart, StockReservation, Product):
+            model.objects.all().delete()  # order items and cart items go by cascade
+        call_command('product_seed', products=size, carts=size // 10, orders=size // 10, seed=size,
+                     stdout=self.stdout if options['verbosity'] > 1 else io.StringIO())
+        # the deleted ids come back with the new rows, so payloads cached for them and the old pages must go
+        get_product_cache().invalidate(Product.objects.values_list('id', flat=True))
+        invalidate_search_index()
+
+        self.stdout.write(f'\n{size} products')
+        self.stdout.write(f'{"scenario":<22} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"req/s":>8} {"queries":>8}')
+        scenarios = Scenarios(seed=size)
+        results = {}
+        for name in options['scenario']:
+            results[name] = self.run_scenario(getattr(scenarios, name), options['requests'])
+            result = results[name]
+            self.stdout.write(f'{name:<22} {result["p50"]:>8.2f} {result["p95"]:>8.2f} {result["p99"]:>8.2f} '
+                              f'{result["rps"]:>8.1f} {result["queries"]:>8.1f}')
+        return results
+
+    def run_scenario(self, scenario, requests):
+        timings, queries = [], []
+        for _ in range(requests):
+            client, method, path, body = scenario()
+            with CaptureQueriesContext(connection) as context:
+                start = time.perf_counter()
+                response = getattr(client, method)(path, body, content_type='application/json')
+                timings.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                raise CommandError(f'{method.upper()} {path} returned {response.status_code}: {response.content!r}')
+            queries.append(len(context.captured_queries))
+
+        percentiles = statistics.quantiles([timing * 1000 for timing in timings], n=100, method='inclusive')
+        return {
+            'p50': percentiles[49],
+            'p95': percentiles[94],
+            'p99': percentiles[98],
+            'rps': len(timings) / sum(timings),
+            'queries': statistics.mean(queries),
+        }
+
+    def compare(self, results, path, threshold):
+        with open(path) as baseline_file:
+            baseline = json.load(baseline_file)
+
+        regressions = []
+        for size, scenarios in results.items():
+            for name, result in scenarios.items():
+                before = baseline.get(size, {}).get(name)
+                if before is None:
+                    continue
+                if result['p95'] > before['p95'] * (1 + threshold):
+                    regressions.append(f'{size} products, {name}: p95 {before["p95"]:.2f} -> {result["p95"]:.2f} ms')
+                if result['queries'] > before['queries']:
+                    regressions.append(f'{size} products, {name}: queries {before["queries"]:.1f} -> '
+                                       f'{result["queries"]:.1f}')
+
+        if regressions:
+            raise CommandError('Regressions against the baseline:\n' + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS('No regressions against the baseline'))
@@ -0,0 +1,81 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from django.utils import timezone
+
+from core_apps.car_parts.models import Product
+from core_apps.car_parts.search import get_search_engine, tokenize
+from core_apps.order.models import Cart, CartItem, Order, OrderItem, StockReservation
+
+FULL_SCAN_PATTERNS = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(r'\bSCAN (?:TABLE )?(\w+)(?!.*\bUSING\b)'),  # "SCAN t USING INDEX i" is an index scan
+}
+
+
+class Command(BaseCommand):
+    help = 'Runs EXPLAIN on the queries behind each endpoint and fails on full table scans of large tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-rows', type=int, default=10000,
+                            help='Full scans of tables with fewer rows are accepted')
+
+    def handle(self, *args, **options):
+        pattern = FULL_SCAN_PATTERNS.get(connection.vendor)
+        if pattern is None:
+            raise CommandError(f'EXPLAIN output of {connection.vendor} is not supported')
+
+        sizes = self.table_sizes()
+        failures = []
+        for name, queryset in self.endpoint_queries():
+            plan = queryset.explain()
+            scanned = {table for table in pattern.findall(plan) if sizes.get(table, 0) >= options['min_rows']}
+            if scanned:
+                failures.append(f'{name}: full scan of {", ".join(sorted(scanned))}')
+
+            self.stdout.write(f'{"FAIL" if scanned else "ok":<5} {name}')
+            if options['verbosity'] > 1:
+                self.stdout.write(plan)
+
+        if failures:
+            raise CommandError('Sequential scans found:\n' + '\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS('No full scans on large tables'))
+
+    def table_sizes(self):
+        models = (Product, Cart, CartItem, Order, OrderItem, StockReservation)
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:  # planner estimate, counting a large table is itself a full scan
+                cursor.execute('SELECT relname, reltuples FROM pg_class WHERE relname = ANY(%s)',
+                               [[model._meta.db_table for model in models]])
+                return dict(cursor.fetchall())
+        return {model._meta.db_table: model.objects.count() for model in models}
+
+    def endpoint_queries(self):
+        product = Product.objects.filter(is_delete=False).values_list('id', 'name').last() or (0, '')
+        cart_key, cart_id = Cart.objects.values_list('session_key', 'id').last() or ('', 0)
+        order_id, email = Order.objects.values_list('id', 'customer_email').last() or (0, '')
+        active = Product.objects.filter(is_delete=False)
+        keyword = ' '.join(tokenize(product[1])) or 'part'  # every word of a real name, a narrow match
+        newest_orders = Order.objects.order_by('-ordered_at', '-id')
+        reservations = StockReservation.objects.select_for_update()
+
+        return [
+            ('GET /product/', active.order_by('-id')[:20]),
+            ('GET /product/?page=&limit=', active.order_by('-id')[100:120]),
+            ('GET /product/?cursor=', active.filter(id__lt=product[0]).order_by('-id')[:21]),
+            ('GET /product/?keyword=', get_search_engine().search(active, keyword)[:21]),
+            ('GET /product/<id>/', active.filter(id=product[0])),
+            ('POST /product/ name check', active.filter(name=product[1])),
+            ('GET /cart/ cart lookup', Cart.objects.filter(session_key=cart_key).values_list('id', flat=True)),
+            ('GET /cart/ cart lines', CartItem.objects.filter(cart_id=cart_id).select_related('product')),
+            ('DELETE /cart/<id>/', CartItem.objects.filter(cart__session_key=cart_key, product_id=product[0])),
+            ('POST /cart/ held stock', reservations.filter(cart_key=cart_key, product_id__in=[product[0]])),
+            ('POST /order/ cart reservations', reservations.filter(cart_key=cart_key)),
+            ('outbox_worker expired reservations', reservations.filter(expires_at__lte=timezone.now())[:1000]),
+            ('POST /order/ product lookup', Product.objects.filter(id__in=[product[0]])),  # in_bulk of the cart lines
+            ('GET /order/', newest_orders[:21]),
+            ('GET /order/?customer_email=', newest_orders.filter(customer_email=email)[:21]),
+            ('GET /order/ order lines', OrderItem.objects.filter(order_id__in=[order_id]).select_related('product')),
+        ]
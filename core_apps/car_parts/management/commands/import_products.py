@@ -0,0 +1,42 @@
+import os
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core_apps._config.exception_config.exception_handler import CustomException
+from core_apps.car_parts.importer import FORMATS, ProductImporter
+
+
+class Command(BaseCommand):
+    help = 'Creates or updates products by name from a CSV or NDJSON file, reporting invalid rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import, - reads standard input')
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, help='Rows upserted per statement and transaction')
+        parser.add_argument('--max-errors', type=int, help='Invalid rows listed in the report')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or os.path.splitext(path)[1].lstrip('.').lower().replace('jsonl', 'ndjson')
+        if file_format not in FORMATS:
+            raise CommandError('Can not tell the format from the file name, use --format')
+
+        importer = ProductImporter(batch_size=options['batch_size'], max_errors=options['max_errors'])
+        started = time.perf_counter()
+        try:
+            if path == '-':
+                report = importer.run(sys.stdin.buffer, file_format)
+            else:
+                with open(path, 'rb') as lines:
+                    report = importer.run(lines, file_format)
+        except (OSError, CustomException) as error:
+            raise CommandError(str(error))
+
+        for error in report['errors']:
+            self.stderr.write(f'row {error["row"]}: {error["message"]}')
+        self.stdout.write(self.style.SUCCESS(
+            f'{report["rows"]} rows in {time.perf_counter() - started:.1f}s: {report["created"]} created, '
+            f'{report["updated"]} updated, {report["unchanged"]} unchanged, {report["error_count"]} invalid'
+        ))
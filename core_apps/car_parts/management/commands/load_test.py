@@ -0,0 +1,77 @@
+import asyncio
+import statistics
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+SCENARIOS = {
+    'product-list': '/api/v1/product/?limit=20&page=1',
+    'product-search': '/api/v1/product/?keyword=brake&limit=20&page=1',
+    'product-detail': '/api/v1/product/1/',
+}  # read endpoints served by both the WSGI and the ASGI deployment
+
+
+class Command(BaseCommand):
+    help = 'Runs concurrent GET requests against one or more running servers and reports RPS and latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('targets', nargs='+', help='Base urls, e.g. http://localhost:80 http://localhost:8000')
+        parser.add_argument('--scenario', choices=sorted(SCENARIOS), default='product-list')
+        parser.add_argument('--concurrency', type=int, default=200, help='Concurrent clients')
+        parser.add_argument('--duration', type=float, default=20.0, help='Seconds per target')
+        parser.add_argument('--timeout', type=float, default=10.0, help='Seconds before a request counts as failed')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'target':<32} {'requests':>9} {'errors':>7} {'rps':>9} {'p50 ms':>9} {'p99 ms':>9}")
+        for target in options['targets']:
+            url = urlsplit(target)
+            if url.scheme != 'http' or not url.hostname:
+                raise CommandError(f'Unsupported target {target}, expected http://host:port')
+
+            latencies, errors, elapsed = asyncio.run(self.run_target(
+                url.hostname, url.port or 80, SCENARIOS[options['scenario']], options['concurrency'],
+                options['duration'], options['timeout'],
+            ))
+            if not latencies:
+                raise CommandError(f'No successful requests against {target}')
+
+            percentiles = statistics.quantiles(latencies, n=100)
+            self.stdout.write(
+                f'{target:<32} {len(latencies):>9} {errors:>7} {len(latencies) / elapsed:>9.1f} '
+                f'{percentiles[49]:>9.1f} {percentiles[98]:>9.1f}'
+            )
+
+    async def run_target(self, host, port, path, concurrency, duration, timeout):
+        latencies, errors = [], 0
+        request = f'GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n'.encode()
+        deadline = time.perf_counter() + duration
+
+        async def client():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    status = await asyncio.wait_for(self.send(host, port, request), timeout)
+                except (OSError, asyncio.TimeoutError):
+                    status = None
+                if status == 200:
+                    latencies.append((time.perf_counter() - start) * 1000)
+                else:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        return latencies, errors, time.perf_counter() - start
+
+    @staticmethod
+    async def send(host, port, request):
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            writer.write(request)
+            await writer.drain()
+            response = await reader.read()  # the server closes the connection after the response
+        finally:
+            writer.close()
+        status_line = response.split(b'\r\n', 1)[0].split()
+        return int(status_line[1]) if len(status_line) > 1 else None
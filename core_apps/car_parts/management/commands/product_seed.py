@@ -1,20 +1,199 @@
-from django.core.management.base import BaseCommand
+import csv
+import functools
+import io
+import math
+import multiprocessing
 import random
-import decimal
+from array import array
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, connections, transaction
+from django.db.models import Max
+from django.utils import timezone
 
 from core_apps.car_parts.models import Product
+from core_apps.order.models import Cart, CartItem, Order, OrderItem
+
+PARTS = ['Brake Pad', 'Brake Disc', 'Oil Filter', 'Air Filter', 'Spark Plug', 'Clutch Kit', 'Timing Belt',
+         'Water Pump', 'Radiator', 'Alternator', 'Starter Motor', 'Shock Absorber', 'Wiper Blade', 'Headlight',
+         'Battery', 'Fuel Pump', 'Gasket', 'Bearing', 'Thermostat', 'Exhaust Pipe']
+QUALIFIERS = ['Front', 'Rear', 'Left', 'Right', 'Ceramic', 'Heavy Duty', 'Performance', 'Standard', 'OEM',
+              'Vented', 'Long Life', 'Compact']
+SCRAMBLE = 1000003  # prime step that spreads popular ranks over the whole catalogue
+
+_command = None  # the running command, inherited by forked workers instead of being pickled
+
+
+def seed_batch(job):
+    _command.seed_batch(job)
 
 
 class Command(BaseCommand):
-    help = 'Seeds the database with Product data'
+    help = 'Seeds the database with products and, optionally, carts and orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=10, help='Products to create')
+        parser.add_argument('--carts', type=int, default=0, help='Carts to create')
+        parser.add_argument('--orders', type=int, default=0, help='Orders to create')
+        parser.add_argument('--items-per-cart', type=int, default=3, help='Most lines per cart')
+        parser.add_argument('--items-per-order', type=int, default=3, help='Most lines per order')
+        parser.add_argument('--skew', type=float, default=1.1,
+                            help='Zipf exponent of product popularity, 0 for uniform')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed, equal seeds give equal data')
+        parser.add_argument('--batch-size', type=int, default=10000, help='Rows written per statement')
+        parser.add_argument('--workers', type=int, default=1, help='Parallel worker processes (PostgreSQL)')
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.now = timezone.now()
+        self.use_copy = connection.vendor == 'postgresql'
+        workers = options['workers'] if connection.vendor == 'postgresql' else 1  # SQLite has one writer
+
+        products = self.id_range(Product, options['products'])
+        self.run(workers, [('products', start, size) for start, size in self.batches(products)])
+
+        self.product_ids = array('q', Product.objects.filter(is_delete=False).order_by('id').values_list(
+            'id', flat=True).iterator())  # 8 bytes per product, shared with forked workers
+        if not self.product_ids and (options['carts'] or options['orders']):
+            raise CommandError('Carts and orders need products')
+        self.scramble = SCRAMBLE if math.gcd(SCRAMBLE, len(self.product_ids)) == 1 else 1
+
+        carts = self.id_range(Cart, options['carts'])
+        orders = self.id_range(Order, options['orders'])
+        self.run(workers, [('carts', start, size) for start, size in self.batches(carts)]
+                 + [('orders', start, size) for start, size in self.batches(orders)])
+
+        self.reset_sequences()
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully seeded the database with {options["products"]} products, {options["carts"]} carts '
+            f'and {options["orders"]} orders'
+        ))
+
+    def id_range(self, model, size):
+        first_id = (model.objects.aggregate(last_id=Max('id'))['last_id'] or 0) + 1  # append after existing rows
+        return range(first_id, first_id + size)
+
+    def batches(self, ids):
+        for start in range(ids.start, ids.stop, self.options['batch_size']):
+            yield start, min(self.options['batch_size'], ids.stop - start)
+
+    def run(self, workers, jobs):
+        if workers <= 1:
+            for job in jobs:
+                self.seed_batch(job)
+            return
+
+        global _command
+        _command = self
+        connections.close_all()  # forked workers must open their own connections
+        with multiprocessing.get_context('fork').Pool(workers) as pool:
+            for _ in pool.imap_unordered(seed_batch, jobs):
+                pass
+
+    def seed_batch(self, job):
+        kind, start, size = job
+        rng = random.Random(f'{self.options["seed"]}:{kind}:{start}')  # same data whatever the worker count
+        with transaction.atomic():
+            getattr(self, f'seed_{kind}')(rng, start, size)
+        if multiprocessing.parent_process() is not None:
+            connection.close()
+
+    def seed_products(self, rng, start, size):
+        rows = []
+        for product_id in range(start, start + size):
+            part = f'{rng.choice(QUALIFIERS)} {rng.choice(PARTS)}'
+            rows.append((product_id, f'{part} {product_id}', f'{part} for {rng.choice(PARTS).lower()} systems',
+                         price(product_id), rng.randint(0, 500), 0, False, self.now, self.now))
+        self.write(Product, ['id', 'name', 'description', 'price', 'quantity', 'reserved', 'is_delete',
+                             'created_on', 'updated_on'], rows)
+
+    def seed_carts(self, rng, start, size):
+        carts, items = [], []
+        for cart_id in range(start, start + size):
+            carts.append((cart_id, f'seed-{cart_id}', self.now - timedelta(minutes=rng.randint(0, 60))))
+            for product_id in self.pick_products(rng, self.options['items_per_cart']):
+                items.append((cart_id, product_id, rng.randint(1, 5)))
+
+        self.write(Cart, ['id', 'session_key', 'created_on'], carts)
+        self.write(CartItem, ['cart_id', 'product_id', 'quantity'], items)
+
+    def seed_orders(self, rng, start, size):
+        orders, items = [], []
+        for order_id in range(start, start + size):
+            total = Decimal('0.00')
+            for product_id in self.pick_products(rng, self.options['items_per_order']):
+                quantity = rng.randint(1, 5)
+                total += price(product_id) * quantity
+                items.append((order_id, product_id, quantity, price(product_id)))
+            ordered_at = self.now - timedelta(minutes=rng.randint(0, 60 * 24 * 365))
+            orders.append((order_id, f'Customer {order_id}', f'customer{order_id}@example.com', '+10000000000',
+                           total, ordered_at, (ordered_at + timedelta(days=rng.randint(1, 7))).date(), '12:00:00'))
+
+        self.write(Order, ['id', 'customer_name', 'customer_email', 'customer_phone', 'total_amount', 'ordered_at',
+                           'delivery_date', 'delivery_time'], orders)
+        self.write(OrderItem, ['order_id', 'product_id', 'quantity', 'unit_price'], items)
+
+    def pick_products(self, rng, most):
+        """Distinct product ids for one cart or order, drawn with a Zipf-like popularity."""
+        count = len(self.product_ids)
+        skew = self.options['skew']
+        picked = set()
+        for _ in range(rng.randint(1, most)):
+            if skew <= 0:
+                rank = rng.randrange(count)
+            elif skew == 1:
+                rank = int(count ** rng.random()) - 1  # inverse CDF of the continuous 1/x distribution
+            else:
+                rank = int(((count ** (1 - skew) - 1) * rng.random() + 1) ** (1 / (1 - skew))) - 1
+            picked.add(self.product_ids[min(rank, count - 1) * self.scramble % count])
+        return picked
+
+    def write(self, model, columns, rows):
+        if not rows:
+            return
+        table = connection.ops.quote_name(model._meta.db_table)
+        if not self.use_copy:
+            with connection.cursor() as cursor:  # plain executemany, bulk_create spends its time building SQL
+                cursor.executemany(
+                    f'INSERT INTO {table} ({", ".join(columns)}) VALUES ({", ".join(["%s"] * len(columns))})',
+                    adapt(model, columns, rows),
+                )
+            return
+
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+        with connection.cursor() as cursor:  # COPY streams the batch without per-row statements
+            cursor.cursor.copy_expert(
+                f'COPY {table} ({", ".join(columns)}) FROM STDIN WITH (FORMAT csv)', buffer
+            )
+
+    def reset_sequences(self):
+        statements = connection.ops.sequence_reset_sql(no_style(), [Product, Cart, CartItem, Order, OrderItem])
+        with connection.cursor() as cursor:  # rows were inserted with explicit ids
+            for sql in statements:
+                cursor.execute(sql)
+
+
+def price(product_id):
+    return Decimal((product_id * 2654435761) % 9900 + 100) / 100  # stable price between 1.00 and 99.99
 
-    def handle(self, *args, **kwargs):
-        for _ in range(10):
-            name = f'Product {_}'
-            description = f'Description for Product {_}'
-            price = decimal.Decimal(random.randrange(100, 10000)) / 100
-            quantity = random.randint(1, 100)
 
-            Product.objects.create(name=name, description=description, price=price, quantity=quantity)
+def adapt(model, columns, rows):
+    """Convert dates and datetimes to what the database driver expects, once per distinct value."""
+    converters = []
+    for column in columns:
+        internal_type = model._meta.get_field(column.removesuffix('_id')).get_internal_type()
+        if internal_type == 'DateTimeField':
+            converters.append(functools.lru_cache(maxsize=None)(connection.ops.adapt_datetimefield_value))
+        elif internal_type == 'DateField':
+            converters.append(functools.lru_cache(maxsize=None)(connection.ops.adapt_datefield_value))
+        else:
+            converters.append(None)
 
-        self.stdout.write(self.style.SUCCESS('Successfully seeded the database with products'))
+    if not any(converters):
+        return rows
+    return [[convert(value) if convert else value for convert, value in zip(converters, row)] for row in rows]
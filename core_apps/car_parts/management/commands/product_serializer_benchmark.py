@@ -0,0 +1,46 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from core_apps._config.renderer_config.orjson_renderer import ORJSONRenderer
+from core_apps.car_parts.models import Product
+from core_apps.car_parts.serializers import PRODUCT_FIELDS, ProductSerializer, map_product_row
+
+
+class Command(BaseCommand):
+    help = 'Compares ProductSerializer + JSONRenderer with the values() row mapper + ORJSONRenderer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000, help='Products per page')
+        parser.add_argument('--repeat', type=int, default=20, help='Runs per implementation')
+
+    def handle(self, *args, **options):
+        products = Product.objects.filter(is_delete=False).order_by('-id')[:options['rows']]
+        rows = products.count()
+        if not rows:
+            raise CommandError('No products found, run product_seed first')
+
+        def serializer_path():
+            return JSONRenderer().render(ProductSerializer(products, many=True).data)
+
+        def fast_path():
+            return ORJSONRenderer().render([map_product_row(row) for row in products.values_list(*PRODUCT_FIELDS)])
+
+        if serializer_path() != fast_path():
+            raise CommandError('Fast path output differs from ProductSerializer output')
+
+        results = {}
+        for name, implementation in (('ProductSerializer + JSONRenderer', serializer_path),
+                                     ('values_list + ORJSONRenderer', fast_path)):
+            timings = []
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                implementation()
+                timings.append((time.perf_counter() - start) * 1000)
+            results[name] = statistics.median(timings)
+            self.stdout.write(f'{name:<36} median {results[name]:8.2f} ms  min {min(timings):8.2f} ms')
+
+        baseline, fast = results.values()
+        self.stdout.write(self.style.SUCCESS(f'{rows} rows, identical output, {baseline / fast:.1f}x faster'))
@@ -0,0 +1,27 @@
+# Generated by Django 4.0.3 on 2026-10-18 10:12
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+from core_apps._config.db_config.operations import PostgresOnlyAddIndex
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('car_parts', '0002_product_created_on_product_is_delete'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        PostgresOnlyAddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.search.SearchVector('name', 'description', config='simple'), name='product_search_vector_idx'),
+        ),
+        PostgresOnlyAddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='product_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+    ]
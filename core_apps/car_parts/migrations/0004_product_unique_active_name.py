@@ -0,0 +1,32 @@
+# Generated by Django 4.0.3 on 2026-10-18 10:15
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def rename_duplicate_names(apps, schema_editor):
+    Product = apps.get_model('car_parts', 'Product')
+    duplicates = Product.objects.filter(is_delete=False).values('name').annotate(
+        keep_id=Min('id'), products=Count('id')
+    ).filter(products__gt=1)  # the racy exists() check let concurrent creates through, keep the first product
+
+    for duplicate in duplicates.iterator():
+        for product in Product.objects.filter(name=duplicate['name'], is_delete=False).exclude(id=duplicate['keep_id']):
+            suffix = f' ({product.id})'
+            product.name = product.name[:100 - len(suffix)] + suffix  # still visible, staff can merge or rename it
+            product.save(update_fields=['name'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('car_parts', '0003_product_search_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(rename_duplicate_names, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='product',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_delete', False)), fields=('name',), name='unique_active_product_name'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.0.3 on 2026-10-18 10:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('car_parts', '0004_product_unique_active_name'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_delete', False)), fields=['-id'], name='product_active_id_idx'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.0.3 on 2026-10-18 10:28
+
+from django.db import migrations, models
+
+from core_apps._config.db_config.operations import AddColumn
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('car_parts', '0005_product_active_id_index'),
+    ]
+
+    operations = [
+        AddColumn(
+            model_name='product',
+            name='reserved',
+            field=models.IntegerField(default=0),
+        ),
+    ]
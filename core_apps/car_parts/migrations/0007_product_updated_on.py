@@ -0,0 +1,24 @@
+# Generated by Django 4.0.3 on 2026-10-18 11:02
+
+from django.db import migrations, models
+
+from core_apps._config.db_config.operations import AddColumn
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('car_parts', '0006_product_reserved'),
+    ]
+
+    operations = [
+        AddColumn(
+            model_name='product',
+            name='updated_on',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.RunSQL(
+            'UPDATE car_parts_product SET updated_on = created_on',  # existing rows last changed when created
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -1,13 +1,33 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector
 from django.db import models
 
+SEARCH_CONFIG = 'simple'
+
 
 class Product(models.Model):
     name = models.CharField(max_length=100)
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     quantity = models.IntegerField()
+    reserved = models.IntegerField(default=0)  # units held by carts, see core_apps.order.reservations
     is_delete = models.BooleanField(default=False)
     created_on = models.DateTimeField(auto_now_add=True)
+    updated_on = models.DateTimeField(auto_now=True, db_index=True)  # set explicitly by queryset updates
+
+    class Meta:
+        indexes = [
+            GinIndex(
+                SearchVector('name', 'description', config=SEARCH_CONFIG),
+                name='product_search_vector_idx',
+            ),
+            GinIndex(fields=['name'], opclasses=['gin_trgm_ops'], name='product_name_trgm_idx'),
+            models.Index(fields=['-id'], condition=models.Q(is_delete=False), name='product_active_id_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['name'], condition=models.Q(is_delete=False),
+                                    name='unique_active_product_name'),
+        ]
 
     def __str__(self):
         return self.name
@@ -0,0 +1,148 @@
+import bisect
+import re
+import threading
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramSimilarity
+from django.db import connection
+from django.db.models import Case, FloatField, Q, Value, When
+from django.db.models.functions import Cast
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core_apps.car_parts.models import Product, SEARCH_CONFIG
+
+TOKEN_PATTERN = re.compile(r'[^\W_]+')
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())  # lower case words, punctuation and underscores dropped
+
+
+def no_results(queryset):
+    return queryset.annotate(rank=Value(0.0, output_field=FloatField())).none()  # same shape as real results
+
+
+class PostgresSearchEngine:
+    """Full-text search backed by the product_search_vector_idx and product_name_trgm_idx GIN indexes."""
+
+    def search(self, queryset, keyword):
+        terms = tokenize(keyword)
+        if not terms:
+            return no_results(queryset)
+
+        vector = SearchVector('name', 'description', config=SEARCH_CONFIG)  # must match the indexed expression
+        query = SearchQuery(' & '.join(f'{term}:*' for term in terms), config=SEARCH_CONFIG,
+                            search_type='raw')  # every term as a prefix match
+        return queryset.alias(search=vector).annotate(
+            # float4 widened to double precision, so the rank in a cursor compares equal to the stored one
+            rank=Cast(SearchRank(vector, query) + TrigramSimilarity('name', keyword), FloatField()),
+        ).filter(Q(search=query) | Q(name__trigram_similar=keyword)).order_by('-rank', '-id')
+
+    def invalidate(self):
+        pass  # the database keeps its indexes up to date
+
+
+class InMemorySearchEngine:
+    """
+    In-process inverted index used when PostgreSQL is not available (SQLite in development and tests).
+
+    The index is built lazily on the first search and dropped whenever a product is saved or deleted
+    in this process, so it is meant for single process deployments only.
+    """
+
+    NAME_WEIGHT = 1.0
+    DESCRIPTION_WEIGHT = 0.4
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._tokens = None  # sorted distinct tokens, for prefix lookups with bisect
+        self._postings = None  # token -> {product id: weight}
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._tokens = None
+            self._postings = None
+
+    def build(self):
+        postings = {}
+        rows = Product.objects.filter(is_delete=False).values_list('id', 'name', 'description')
+        for product_id, name, description in rows.iterator(chunk_size=2000):
+            for weight, text in ((self.NAME_WEIGHT, name), (self.DESCRIPTION_WEIGHT, description)):
+                for token in tokenize(text):
+                    weights = postings.setdefault(token, {})
+                    weights[product_id] = weights.get(product_id, 0.0) + weight
+
+        return sorted(postings), postings
+
+    def index(self):
+        with self._lock:
+            if self._postings is not None:
+                return self._tokens, self._postings
+            generation = self._generation
+
+        tokens, postings = self.build()  # build outside the lock, searches on other threads keep working
+        with self._lock:
+            if generation == self._generation:  # only keep the index if nothing changed while building
+                self._tokens, self._postings = tokens, postings
+        return tokens, postings
+
+    def rank(self, keyword):
+        tokens, postings = self.index()
+        ranks = None
+        for term in tokenize(keyword):
+            term_ranks = {}
+            position = bisect.bisect_left(tokens, term)
+            while position < len(tokens) and tokens[position].startswith(term):  # every token with this prefix
+                for product_id, weight in postings[tokens[position]].items():
+                    term_ranks[product_id] = term_ranks.get(product_id, 0.0) + weight
+                position += 1
+
+            if ranks is None:
+                ranks = term_ranks
+            else:  # all terms must match
+                ranks = {product_id: rank + term_ranks[product_id]
+                         for product_id, rank in ranks.items() if product_id in term_ranks}
+
+        return ranks or {}
+
+    def search(self, queryset, keyword):
+        ranks = self.rank(keyword)
+        if not ranks:
+            return no_results(queryset)
+
+        return queryset.filter(id__in=list(ranks)).annotate(
+            rank=Case(*[When(id=product_id, then=Value(rank)) for product_id, rank in ranks.items()],
+                      default=Value(0.0), output_field=FloatField())
+        ).order_by('-rank', '-id')
+
+
+ENGINES = {
+    'postgres': PostgresSearchEngine,
+    'memory': InMemorySearchEngine,
+}
+
+_engine = None
+
+
+def get_search_engine():
+    global _engine
+    if _engine is None:
+        name = settings.PRODUCT_SEARCH_ENGINE
+        if name == 'auto':  # pick the engine that the configured database supports
+            name = 'postgres' if connection.vendor == 'postgresql' else 'memory'
+        _engine = ENGINES[name]()
+    return _engine
+
+
+def invalidate_search_index():
+    if _engine is not None:
+        _engine.invalidate()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_changed(sender, **kwargs):
+    invalidate_search_index()
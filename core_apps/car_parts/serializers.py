@@ -1,3 +1,5 @@
+from decimal import Decimal
+
 from rest_framework import serializers
 
 from .models import Product
@@ -6,4 +8,34 @@ from .models import Product
 class ProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
-        fields = ['id', 'name', 'description', 'price', 'quantity', 'created_on']
+        fields = ['id', 'name', 'description', 'price', 'quantity', 'created_on', 'updated_on']
+
+
+PRODUCT_FIELDS = tuple(ProductSerializer.Meta.fields)
+
+
+def build_row_mapper(fields, decimal_places):
+    """
+    Compile a function turning a values_list() tuple into the dict ProductSerializer would return.
+
+    Decimal fields are formatted as strings like serializers.DecimalField does, other values are left to the
+    renderer. Extra trailing values (such as a search rank) are ignored.
+    """
+    exponents = {fields.index(name): Decimal(1).scaleb(-places) for name, places in decimal_places.items()}
+
+    def map_row(row):
+        data = dict(zip(fields, row))
+        for index, exponent in exponents.items():
+            value = row[index]
+            if value is not None:
+                data[fields[index]] = '{:f}'.format(value.quantize(exponent))
+        return data
+
+    return map_row
+
+
+map_product_row = build_row_mapper(PRODUCT_FIELDS, {'price': Product._meta.get_field('price').decimal_places})
+
+EXPORT_FIELDS = PRODUCT_FIELDS + ('is_delete',)  # incremental exports also carry deletions
+
+map_export_row = build_row_mapper(EXPORT_FIELDS, {'price': Product._meta.get_field('price').decimal_places})
@@ -1,3 +1,596 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock, skipUnless
+from urllib.parse import urlencode
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core_apps._config.cache_config.cache_backends import LRUCacheBackend
+from core_apps._config.cache_config.product_cache import get_product_cache
+from core_apps._config.db_config.routers import ReplicaRouter, use_replica
+from core_apps._config.metrics_config.instrumentation import InstrumentationMiddleware
+from core_apps._config.metrics_config.metrics import metrics
+from core_apps._config.throttle_config.token_bucket import SharedMemoryBucketStore
+from core_apps.car_parts import search
+from core_apps.car_parts.async_views import AsyncProductView
+from core_apps.car_parts.management.commands.benchmark import Command as BenchmarkCommand
+from core_apps.car_parts.management.commands.explain_queries import Command as ExplainQueriesCommand
+from core_apps.car_parts.models import Product
+from core_apps.car_parts.search import InMemorySearchEngine, get_search_engine
+from core_apps.order.models import Cart, CartItem, Order, OrderItem, StockReservation
+
+
+class InMemorySearchEngineTest(TestCase):
+
+    def setUp(self):
+        self.engine = InMemorySearchEngine()
+        self.brake = Product.objects.create(name="Brake Pad", description="Front ceramic pads", price="20.00",
+                                            quantity=5)
+        self.disc = Product.objects.create(name="Brake Disc", description="Vented rotor", price="55.00",
+                                           quantity=5)
+        self.oil = Product.objects.create(name="Oil Filter", description="Fits brake-less engines", price="8.00",
+                                          quantity=5)
+
+    def search(self, keyword):
+        return list(self.engine.search(Product.objects.filter(is_delete=False), keyword))
+
+    def test_prefix_match(self):
+        self.assertEqual({product.id for product in self.search("bra")}, {self.brake.id, self.disc.id, self.oil.id})
+
+    def test_all_terms_must_match(self):
+        self.assertEqual(self.search("brake ceram"), [self.brake])
+
+    def test_name_matches_rank_above_description_matches(self):
+        self.assertEqual(self.search("brake")[-1], self.oil)
+
+    def test_deleted_products_are_not_indexed(self):
+        self.disc.is_delete = True
+        self.disc.save()
+        self.engine.invalidate()
+        self.assertNotIn(self.disc, self.search("brake"))
+
+    def test_saving_a_product_invalidates_the_shared_engine(self):
+        engine = get_search_engine()
+        engine.search(Product.objects.all(), "brake")
+        Product.objects.create(name="Brake Fluid", description="DOT 4", price="9.00", quantity=5)
+        self.assertEqual(len(engine.search(Product.objects.all(), "fluid")), 1)
+
+    def test_blank_keyword_matches_nothing(self):
+        self.assertEqual(self.search("  --  "), [])
+
+
+class ProductKeywordSearchTest(TestCase):
+
+    def setUp(self):
+        for index in range(5):
+            Product.objects.create(name=f"Spark Plug {index}", description="Iridium", price="4.00", quantity=5)
+        Product.objects.create(name="Wiper", description="Spark free rubber", price="4.00", quantity=5)
+
+    def test_keyword_results_are_ranked(self):
+        response = self.client.get("/api/v1/product/", {"keyword": "spark"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 6)
+        self.assertEqual(response.data[-1]["name"], "Wiper")
+
+    def test_keyword_cursor_pagination_walks_every_result_once(self):
+        names = []
+        cursor = ""
+        while cursor is not None:
+            response = self.client.get("/api/v1/product/", {"keyword": "spark", "cursor": cursor, "limit": 4})
+            names += [product["name"] for product in response.data["results"]]
+            cursor = response.data["next_cursor"]
+
+        self.assertEqual(len(names), 6)
+        self.assertEqual(len(set(names)), 6)
+        self.assertEqual(names[-1], "Wiper")
+
+
+@skipUnless(connection.vendor == "postgresql", "ranks are computed by PostgreSQL")
+@override_settings(PRODUCT_SEARCH_ENGINE="postgres")
+class PostgresKeywordCursorTest(TestCase):
+
+    def setUp(self):
+        search.invalidate_search_index()
+        search._engine = None  # pick the engine of the overridden setting
+        self.addCleanup(setattr, search, "_engine", None)
+        for index in range(7):  # same length names, tied ranks that are not exact in binary
+            Product.objects.create(name=f"Brake Pad {index}", description="Ceramic", price="4.00", quantity=5)
+        Product.objects.create(name="Brake Pad Set Rear", description="Ceramic", price="9.00", quantity=5)
+
+    def test_cursor_walks_tied_ranks_once(self):
+        ids = []
+        cursor = ""
+        while cursor is not None:
+            response = self.client.get("/api/v1/product/", {"keyword": "brake pad", "cursor": cursor, "limit": 3})
+            ids += [product["id"] for product in response.data["results"]]
+            cursor = response.data["next_cursor"]
+
+        self.assertEqual(len(ids), 8)
+        self.assertEqual(set(ids), set(Product.objects.values_list("id", flat=True)))
+
+
+class LRUCacheBackendTest(TestCase):
+
+    def test_least_recently_used_entry_is_evicted(self):
+        backend = LRUCacheBackend(timeout=60, max_entries=2)
+        backend.set("a", 1)
+        backend.set("b", 2)
+        backend.get("a")
+        backend.set("c", 3)
+        self.assertEqual((backend.get("a"), backend.get("b"), backend.get("c")), (1, None, 3))
+
+    def test_entries_expire(self):
+        backend = LRUCacheBackend(timeout=10, max_entries=2)
+        with mock.patch("core_apps._config.cache_config.cache_backends.time.monotonic", return_value=100):
+            backend.set("a", 1)
+        with mock.patch("core_apps._config.cache_config.cache_backends.time.monotonic", return_value=111):
+            self.assertIsNone(backend.get("a"))
+
+
+@override_settings(PRODUCT_CACHE={**settings.PRODUCT_CACHE, "BACKEND": "memory"})  # one test process
+class ProductCacheTest(TestCase):
+
+    def setUp(self):
+        self.cache = get_product_cache()
+        self.cache.clear()
+        self.product = Product.objects.create(name="Clutch", description="Kit", price="90.00", quantity=3)
+
+    def test_detail_is_served_from_cache(self):
+        self.client.get(f"/api/v1/product/{self.product.id}/")
+        with self.assertNumQueries(0):
+            response = self.client.get(f"/api/v1/product/{self.product.id}/")
+
+        self.assertEqual(response.data["name"], "Clutch")
+        self.assertEqual(self.client.get("/api/v1/product/cache/stats/").data["hit_ratio"], 0.5)
+
+    def test_update_invalidates_detail_and_list(self):
+        self.client.get(f"/api/v1/product/{self.product.id}/")
+        self.client.get("/api/v1/product/")
+        self.client.put(f"/api/v1/product/{self.product.id}/", {"quantity": 7}, content_type="application/json")
+
+        self.assertEqual(self.client.get(f"/api/v1/product/{self.product.id}/").data["quantity"], 7)
+        self.assertEqual(self.client.get("/api/v1/product/").data[0]["quantity"], 7)
+
+    def test_delete_invalidates_detail(self):
+        self.client.get(f"/api/v1/product/{self.product.id}/")
+        self.client.delete(f"/api/v1/product/{self.product.id}/")
+
+        self.assertEqual(self.client.get(f"/api/v1/product/{self.product.id}/").status_code, 400)
+
+
+class ProductWriteTest(TestCase):
+
+    def setUp(self):
+        self.pump = Product.objects.create(name="Pump", description="Water", price="30.00", quantity=3)
+        self.belt = Product.objects.create(name="Belt", description="Timing", price="12.00", quantity=8)
+
+    def rename(self, product, name):
+        return self.client.put(f"/api/v1/product/{product.id}/", {"name": name}, content_type="application/json")
+
+    def test_rename_to_an_active_name_is_rejected(self):
+        response = self.rename(self.belt, "Pump")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["message"], "error: Product name already exist")
+        self.belt.refresh_from_db()
+        self.assertEqual(self.belt.name, "Belt")
+
+    def test_rename_to_a_deleted_name_is_allowed(self):
+        self.client.delete(f"/api/v1/product/{self.pump.id}/")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.rename(self.belt, "Pump")
+
+        self.assertEqual(response.status_code, 200)
+        statements = [query["sql"].split()[0] for query in queries.captured_queries]
+        self.assertEqual([statement for statement in statements if statement in ("SELECT", "UPDATE")], ["UPDATE"])
+        self.assertEqual(Product.objects.filter(name="Pump").count(), 2)
+
+    def test_second_delete_reports_a_missing_product(self):
+        first = self.client.delete(f"/api/v1/product/{self.pump.id}/")
+        second = self.client.delete(f"/api/v1/product/{self.pump.id}/")
+
+        self.assertEqual((first.status_code, second.status_code), (200, 400))
+        self.assertEqual(second.data["message"], "error: Product does not exist")
+        self.assertTrue(Product.objects.get(id=self.pump.id).is_delete)
+
+
+class AsyncProductViewTest(TestCase):
+
+    def setUp(self):
+        get_product_cache().clear()
+        self.view = async_to_sync(AsyncProductView.as_view())
+        self.product = Product.objects.create(name="Gasket", description="Head", price="12.50", quantity=4)
+
+    def test_get_matches_sync_view(self):
+        detail_path = f"/api/v1/product/{self.product.id}/"
+        detail = self.view(RequestFactory().get(detail_path), product_id=self.product.id)
+        listing = self.view(RequestFactory().get("/api/v1/product/?limit=5&page=1"))
+
+        self.assertJSONEqual(detail.content, self.client.get(detail_path).content.decode())
+        self.assertJSONEqual(listing.content, self.client.get("/api/v1/product/?limit=5&page=1").content.decode())
+
+    def test_writes_run_through_sync_view(self):
+        request = RequestFactory().put(f"/api/v1/product/{self.product.id}/", {"quantity": 9},
+                                       content_type="application/json")
+        self.assertEqual(self.view(request, product_id=self.product.id).status_code, 200)
+        self.assertEqual(Product.objects.get(id=self.product.id).quantity, 9)
+
+    def test_missing_product(self):
+        response = self.view(RequestFactory().get("/api/v1/product/999/"), product_id=999)
+        self.assertEqual(response.status_code, 400)
+
+
+class ReplicaRouterTest(TestCase):
+
+    @override_settings(DATABASE_REPLICAS=["replica_0"])
+    def test_only_opted_in_reads_use_a_replica(self):
+        router = ReplicaRouter()
+        with use_replica():
+            self.assertEqual(router.db_for_read(Product), "replica_0")
+            self.assertEqual(router.db_for_write(Product), "default")
+        self.assertEqual(router.db_for_read(Product), "default")
+
+    def test_without_replicas_reads_use_default(self):
+        with use_replica():
+            self.assertEqual(ReplicaRouter().db_for_read(Product), "default")
+
+    def test_metrics_endpoint_reports_routed_reads(self):
+        metrics.clear()
+        get_product_cache().clear()
+        product = Product.objects.create(name="Bearing", description="Wheel", price="15.00", quantity=2)
+        with override_settings(DATABASE_REPLICAS=["default"]):  # the test database stands in for a replica
+            self.client.get(f"/api/v1/product/{product.id}/")
+
+        data = self.client.get("/api/v1/metrics/").json()
+        self.assertEqual(data["http_requests"], [{"labels": {}, "value": 2}])
+        self.assertEqual(data["db_routed_reads"], [{"labels": {"alias": "default"}, "value": 1}])
+
+
+class ExplainQueriesTest(TestCase):
+
+    def test_endpoint_queries_use_indexes(self):
+        Product.objects.create(name="Spark Plug", description="Iridium", price="9.00", quantity=8)
+        output = StringIO()
+        call_command("explain_queries", min_rows=0, stdout=output)  # any full scan fails, whatever the table size
+        self.assertNotIn("FAIL", output.getvalue())
+
+    def test_order_and_reservation_tables_are_checked(self):
+        sizes = ExplainQueriesCommand().table_sizes()
+        tables = {Order._meta.db_table, OrderItem._meta.db_table, StockReservation._meta.db_table}
+        self.assertTrue(tables <= set(sizes))
+
+    def test_search_page_and_reservation_queries_are_explained(self):
+        Product.objects.create(name="Spark Plug", description="Iridium", price="9.00", quantity=8)
+        names = [name for name, _ in ExplainQueriesCommand().endpoint_queries()]
+        for name in ("GET /product/?keyword=", "GET /product/?page=&limit=", "POST /cart/ held stock",
+                     "outbox_worker expired reservations"):
+            self.assertIn(name, names)
+
+
+class ProductSeedTest(TestCase):
+
+    def seed(self):
+        call_command("product_seed", products=40, carts=6, orders=8, seed=3, batch_size=7, stdout=StringIO())
+        return list(Order.objects.order_by("id").values_list("total_amount", flat=True))
+
+    def test_seeds_every_table_in_batches(self):
+        self.seed()
+
+        self.assertEqual((Product.objects.count(), Cart.objects.count(), Order.objects.count()), (40, 6, 8))
+        self.assertTrue(CartItem.objects.exists())
+        self.assertTrue(OrderItem.objects.exists())
+        self.assertEqual(Product.objects.create(name="After seed", description="d", price="1.00", quantity=1).id, 41)
+
+    def test_equal_seeds_give_equal_data(self):
+        totals = self.seed()
+        Order.objects.all().delete()
+        Cart.objects.all().delete()
+        Product.objects.all().delete()
+
+        self.assertEqual(self.seed(), totals)
+
+
+class ProductSerializerBenchmarkTest(TestCase):
+
+    def test_fast_path_output_is_identical_with_line_separators(self):
+        Product.objects.create(name="Hose\u2028Clamp", description="Steel\u2029", price="1.10", quantity=4)
+        output = StringIO()
+        call_command("product_serializer_benchmark", repeat=1, stdout=output)  # fails when the bytes differ
+
+        self.assertIn("identical output", output.getvalue())
+
+
+class BenchmarkBaselineTest(TestCase):
+
+    def compare(self, result):
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as baseline:
+            json.dump({"1000": {"product_detail": {"p95": 2.0, "queries": 1.0}}}, baseline)
+            baseline.flush()
+            BenchmarkCommand(stdout=StringIO()).compare({"1000": {"product_detail": result}}, baseline.name, 0.25)
+
+    def test_within_threshold_passes(self):
+        self.compare({"p95": 2.4, "queries": 1.0})
+
+    def test_slower_p95_or_more_queries_fail(self):
+        with self.assertRaisesMessage(CommandError, "p95 2.00 -> 3.00 ms"):
+            self.compare({"p95": 3.0, "queries": 1.0})
+        with self.assertRaisesMessage(CommandError, "queries 1.0 -> 2.0"):
+            self.compare({"p95": 2.0, "queries": 2.0})
+
+    @override_settings(PRODUCT_CACHE={**settings.PRODUCT_CACHE, "BACKEND": "memory"})
+    def test_reseeding_invalidates_the_cached_payloads(self):
+        product = Product.objects.create(name="Fuel Pump", description="Electric", price="30.00", quantity=5)
+        cache = get_product_cache()
+        cache.get_detail(product.id, lambda: {"name": "Fuel Pump"})
+        cached_key = cache.detail_key(product.id)
+        options = {"verbosity": 0, "scenario": [], "requests": 1}
+        BenchmarkCommand(stdout=StringIO()).run_size(5, options)
+
+        self.assertEqual(cache.stats()["invalidations"], 1)
+        self.assertNotEqual(cache.detail_key(product.id), cached_key)  # a reused id does not get the old payload
+
+
+@override_settings(INSTRUMENTATION={"SAMPLE_RATE": 1.0, "SERVER_TIMING": True, "SLOW_REQUEST_MS": 10000,
+                                    "METRICS_ALLOWED_IPS": ["127.0.0.1"]})
+class InstrumentationTest(TestCase):
+
+    def setUp(self):
+        metrics.clear()
+        get_product_cache().clear()
+        Product.objects.create(name="Radiator Cap", description="Brass", price="6.00", quantity=9)
+
+    def test_profiled_request_reports_timings(self):
+        with self.assertLogs("core_apps.instrumentation", "INFO") as logs:
+            response = self.client.get("/api/v1/product/")
+
+        self.assertRegex(response["Server-Timing"], r'^app;dur=[\d.]+, db;dur=[\d.]+;desc="2 queries", serializer;dur=')
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual((record["endpoint"], record["queries"], record["duplicate_queries"]),
+                         ("GET ProductView", 2, []))
+
+    def test_repeated_statements_are_flagged(self):
+        def list_twice(request):
+            list(Product.objects.filter(id=1))
+            list(Product.objects.filter(id=2))
+            return HttpResponse()
+
+        with self.assertLogs("core_apps.instrumentation", "WARNING") as logs:
+            InstrumentationMiddleware(list_twice)(RequestFactory().get("/"))
+
+        self.assertEqual(json.loads(logs.records[0].getMessage())["duplicate_queries"][0]["count"], 2)
+
+    def test_prometheus_endpoint(self):
+        self.client.get("/api/v1/product/")
+        body = self.client.get("/metrics").content.decode()
+
+        self.assertIn("# TYPE http_request_duration_ms histogram", body)
+        self.assertIn('http_request_duration_ms_count{endpoint="GET ProductView",status="200"} 1', body)
+        self.assertIn('db_queries_per_request_bucket{endpoint="GET ProductView",le="2"} 1', body)
+
+    def test_metrics_are_for_staff_and_allowed_scrapers(self):
+        self.assertEqual(self.client.get("/metrics", REMOTE_ADDR="10.1.2.3").status_code, 403)
+        self.assertEqual(self.client.get("/api/v1/metrics/", REMOTE_ADDR="10.1.2.3").status_code, 403)
+
+        self.client.force_login(User.objects.create_user("ops", is_staff=True))
+        self.assertEqual(self.client.get("/metrics", REMOTE_ADDR="10.1.2.3").status_code, 200)
+
+    def test_async_requests_are_profiled_without_a_thread_hop(self):
+        async def list_products(request):
+            await sync_to_async(Order.objects.exists, thread_sensitive=False)()  # another thread and connection
+            return HttpResponse()
+
+        middleware = InstrumentationMiddleware(list_products)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        with self.assertLogs("core_apps.instrumentation", "INFO") as logs:
+            async_to_sync(middleware)(RequestFactory().get("/"))
+
+        self.assertEqual(json.loads(logs.records[0].getMessage())["queries"], 1)
+
+
+@override_settings(PRODUCT_CACHE={**settings.PRODUCT_CACHE, "BACKEND": "memory"})  # one test process
+class ConditionalGetTest(TestCase):
+
+    def setUp(self):
+        get_product_cache().clear()
+        self.product = Product.objects.create(name="Fan Belt", description="Rubber", price="12.00", quantity=4)
+
+    def revalidate(self, url, response):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+
+    def test_unchanged_detail_and_list_answer_not_modified(self):
+        for url in (f"/api/v1/product/{self.product.id}/", "/api/v1/product/?page=1&limit=10"):
+            response = self.client.get(url)
+            with self.assertNumQueries(0):  # validators come from the cache, the page is not serialised
+                revalidated = self.revalidate(url, response)
+
+            self.assertEqual(revalidated.status_code, 304)
+            self.assertEqual(revalidated["ETag"], response["ETag"])
+            self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]).status_code, 304)
+
+    def test_writes_change_the_validators(self):
+        url = "/api/v1/product/"
+        response = self.client.get(url)
+        other = Product.objects.create(name="Spark Plug", description="Iridium", price="8.00", quantity=20)
+        self.client.put(f"/api/v1/product/{self.product.id}/", {"price": "13.00"}, content_type="application/json")
+
+        detail = self.client.get(f"/api/v1/product/{self.product.id}/", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(detail.status_code, 200)
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+        response = self.client.get(url)
+        self.client.delete(f"/api/v1/product/{other.id}/")
+        self.assertEqual(len(self.revalidate(url, response).data), 1)
+
+
+@override_settings(PRODUCT_EXPORT={"CHUNK_SIZE": 2})
+class ProductExportTest(TestCase):
+
+    def setUp(self):
+        self.products = [Product.objects.create(name=f"Hose {index}", description="Coolant", price="4.50",
+                                                quantity=index) for index in range(5)]
+
+    def export(self, query="", **headers):
+        response = self.client.get(f"/api/v1/product/export/{query}", **headers)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode()
+
+    def test_ndjson_export_streams_every_active_product(self):
+        self.client.delete(f"/api/v1/product/{self.products[0].id}/")
+        rows = [json.loads(line) for line in self.export().splitlines()]
+
+        self.assertEqual([row["name"] for row in rows], [f"Hose {index}" for index in range(1, 5)])
+        self.assertEqual((rows[0]["price"], rows[0]["is_delete"]), ("4.50", False))
+
+    def test_csv_export(self):
+        lines = self.export("?format=csv").splitlines()
+
+        self.assertEqual(lines[0], "id,name,description,price,quantity,created_on,updated_on,is_delete")
+        self.assertEqual(len(lines), 6)
+        self.assertIn(",Hose 4,Coolant,4.50,4,", lines[-1])
+
+    def test_updated_since_exports_changes_and_deletions(self):
+        since = timezone.now()
+        self.client.put(f"/api/v1/product/{self.products[3].id}/", {"quantity": 9}, content_type="application/json")
+        self.client.delete(f"/api/v1/product/{self.products[1].id}/")
+
+        query = "?" + urlencode({"updated_since": since.isoformat()})
+        rows = [json.loads(line) for line in self.export(query).splitlines()]
+        self.assertEqual([(row["name"], row["is_delete"]) for row in rows], [("Hose 3", False), ("Hose 1", True)])
+
+        response = self.client.get("/api/v1/product/export/?updated_since=yesterday")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.content), {"message": "error: Invalid updated_since"})
+
+
+class ProductImportTest(TestCase):
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user("buyer", is_staff=True))
+        self.pump = Product.objects.create(name="Pump", description="Water", price="30.00", quantity=3)
+        self.belt = Product.objects.create(name="Belt", description="Timing", price="12.00", quantity=8)
+
+    def test_csv_upload_creates_products_and_reports_bad_rows(self):
+        upload = SimpleUploadedFile("parts.csv", (
+            "name,description,price,quantity\n"
+            "Gasket,Head,7.25,10\n"
+            ",Nameless,1.00,1\n"
+            "Spark plug,Iridium,-2,4\n"
+            "Pump,Water,35.00,3\n"
+            "Wiper,Rear,4.999,2\n"
+        ).encode(), content_type="text/csv")
+        response = self.client.post("/api/v1/product/import/", {"file": upload})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data["rows"], response.data["created"], response.data["updated"]), (5, 1, 1))
+        self.assertEqual([error["row"] for error in response.data["errors"]], [2, 3, 5])
+        self.assertEqual(response.data["errors"][0]["message"], "Following fields are required: name")
+        self.assertEqual(str(Product.objects.get(name="Gasket").price), "7.25")
+        self.pump.refresh_from_db()
+        self.assertEqual(str(self.pump.price), "35.00")
+
+    def test_ndjson_body_keeps_unchanged_products_and_last_duplicate(self):
+        body = "\n".join([
+            json.dumps({"name": "Belt", "description": "Timing", "price": "12.00", "quantity": 8}),
+            json.dumps({"name": "Pump", "description": "Water", "price": "30.00", "quantity": 1}),
+            json.dumps({"name": "Pump", "description": "Water", "price": "30.00", "quantity": 5}),
+            "{broken",
+        ])
+        updated_on = self.belt.updated_on
+        response = self.client.post("/api/v1/product/import/", body, content_type="application/x-ndjson")
+
+        self.assertEqual((response.data["updated"], response.data["unchanged"], response.data["duplicates"]), (1, 1, 1))
+        self.assertEqual(response.data["errors"][0]["row"], 4)
+        self.assertEqual(Product.objects.get(id=self.pump.id).quantity, 5)
+        self.assertEqual(Product.objects.get(id=self.belt.id).updated_on, updated_on)
+
+    def test_unsupported_body_and_staff_only_access(self):
+        response = self.client.post("/api/v1/product/import/", {"name": "Pump"}, content_type="application/json")
+        self.assertEqual(response.data, {"status": 490, "message": "error: Unsupported file, send CSV or NDJSON"})
+
+        self.client.logout()
+        response = self.client.post("/api/v1/product/import/", "name\n", content_type="text/csv")
+        self.assertEqual(response.status_code, 403)
+
+    def test_import_products_command_in_small_batches(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as file:
+            file.write("name,description,price,quantity\n")
+            file.writelines(f"Fuse {index},Blade,0.50,{index}\n" for index in range(25))
+        self.addCleanup(os.remove, file.name)
+
+        output = StringIO()
+        call_command("import_products", file.name, "--batch-size", "10", stdout=output)
+        self.assertIn("25 rows", output.getvalue())
+        self.assertEqual(Product.objects.filter(name__startswith="Fuse").count(), 25)
+
+        with self.assertRaises(CommandError):
+            call_command("import_products", "/tmp/parts.xlsx")
+
+
+class TokenBucketTest(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "buckets")
+
+    def throttle_settings(self, **rates):
+        return override_settings(THROTTLE={**settings.THROTTLE, "ENABLED": True, "STORE": "shared_memory",
+                                           "SHARED_MEMORY_PATH": self.path, "RATES": rates})
+
+    def test_buckets_are_shared_through_the_file_and_refill(self):
+        first = SharedMemoryBucketStore(self.path, slots=1024)
+        second = SharedMemoryBucketStore(self.path, slots=1024)  # another worker process maps the same file
+
+        with mock.patch("core_apps._config.throttle_config.token_bucket.time.time", return_value=1000.0):
+            self.assertEqual([first.consume("a", 1.0, 2), second.consume("a", 1.0, 2)], [0.0, 0.0])
+            self.assertEqual(first.consume("a", 1.0, 2), 1.0)
+            self.assertEqual(second.consume("b", 1.0, 2), 0.0)
+        with mock.patch("core_apps._config.throttle_config.token_bucket.time.time", return_value=1001.5):
+            self.assertEqual(second.consume("a", 1.0, 2), 0.0)
+
+    def test_full_stripe_forgets_the_least_recently_used_client(self):
+        store = SharedMemoryBucketStore(self.path, slots=SharedMemoryBucketStore.STRIPE_SLOTS)
+        store.consume("idle", 1.0, 1)
+        for index in range(SharedMemoryBucketStore.STRIPE_SLOTS):
+            store.consume(f"client {index}", 1.0, 1)
+
+        self.assertEqual(store.consume("idle", 1.0, 1), 0.0)  # evicted, starts with a full bucket again
+
+    def test_exhausted_scope_answers_429_with_retry_after(self):
+        Product.objects.create(name="Horn", description="12V", price="15.00", quantity=3)
+        with self.throttle_settings(**{"ip": "100/s", "product.read": "3/m"}):
+            statuses = [self.client.get("/api/v1/product/").status_code for _ in range(4)]
+            response = self.client.get("/api/v1/product/")
+            self.assertEqual(self.client.get("/api/v1/product/cache/stats/").status_code, 200)  # no scope
+
+        self.assertEqual(statuses, [200, 200, 200, 429])
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "20")
+
+    def test_made_up_sessions_still_hit_the_ip_limit(self):
+        with self.throttle_settings(**{"ip": "2/m", "product.read": "100/s"}):
+            statuses = []
+            for index in range(3):
+                self.client.cookies[settings.SESSION_COOKIE_NAME] = f"made-up-{index}"
+                statuses.append(self.client.get("/api/v1/product/").status_code)
+
+        self.assertEqual(statuses, [200, 200, 429])
+
+    def test_forged_forwarded_for_headers_still_hit_the_ip_limit(self):
+        with self.throttle_settings(**{"ip": "100/s", "product.read": "3/m"}):
+            statuses = [self.client.get("/api/v1/product/", HTTP_X_FORWARDED_FOR=f"10.0.0.{index}").status_code
+                        for index in range(5)]
+
+        self.assertEqual(statuses, [200, 200, 200, 429, 429])
@@ -1,7 +1,14 @@
+from django.conf import settings
 from django.urls import re_path
-from core_apps.car_parts.views import ProductView
+
+from core_apps.car_parts.async_views import AsyncProductView
+from core_apps.car_parts.views import ProductCacheStatsView, ProductExportView, ProductImportView, ProductView
+
+product_view = AsyncProductView.as_view() if settings.ASYNC_VIEWS else ProductView.as_view()
 
 urlpatterns = [
-    re_path(r'^product/?(?P<product_id>[\d]+)?/$', ProductView.as_view(), name='product'),
+    re_path(r'^product/?(?P<product_id>[\d]+)?/$', product_view, name='product'),
+    re_path(r'^product/import/$', ProductImportView.as_view(), name='product-import'),
+    re_path(r'^product/export/$', ProductExportView.as_view(), name='product-export'),
+    re_path(r'^product/cache/stats/$', ProductCacheStatsView.as_view(), name='product-cache-stats'),
 ]
-
@@ -1,26 +1,48 @@
+import logging
 from datetime import datetime
 
 import environ
+from django.conf import settings
 from django.core.paginator import Paginator
-from django.db import transaction
+from django.db import IntegrityError, router, transaction
+from django.db.models import Max, Q
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from rest_framework import views, status
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 
+from core_apps._config.cache_config.product_cache import get_product_cache
+from core_apps._config.conditional_config.conditional_get import not_modified_response, set_validators
+from core_apps._config.db_config.routers import replica_reads
 from core_apps._config.exception_config.exception_handler import CustomException
+from core_apps._config.metrics_config.instrumentation import profile_section
+from core_apps._config.pagination_config.cursor_pagination import decode_cursor, paginate_keyset
 from core_apps._config.payload_config.payload_validator import validate_payload
+from core_apps._config.renderer_config.stream_renderers import CSVRenderer, NDJSONRenderer
+from core_apps.car_parts.importer import FORMATS, ProductImporter
 from core_apps.car_parts.models import Product
-from core_apps.car_parts.serializers import ProductSerializer
+from core_apps.car_parts.search import get_search_engine, invalidate_search_index
+from core_apps.car_parts.serializers import EXPORT_FIELDS, PRODUCT_FIELDS, map_export_row, map_product_row
 
 env = environ.Env(
     DEBUG=(bool, False)
 )
 
+logger = logging.getLogger(__name__)
+
+UPDATABLE_FIELDS = ["name", "description", "price", "quantity"]
+
+DEFAULT_CURSOR_LIMIT = 20
+
 
 class ProductView(views.APIView):
+    throttle_scope = "product"
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self._product_id = None
+        self.product_id = None
         self.products = None
         self.product = None
         self.count = 0
@@ -28,6 +50,9 @@ class ProductView(views.APIView):
         self.keyword = None
         self.page_number = None
         self.limit = None
+        self.cursor = None
+        self.with_count = False
+        self.updated_on = None
 
         self.request_data = None
 
@@ -48,6 +73,7 @@ class ProductView(views.APIView):
             return Response(error_response, status=status.HTTP_400_BAD_REQUEST)  # return error response
 
         except Exception as ex:
+            logger.exception("Unexpected error in %s %s", request.method, request.path)  # log the traceback
             transaction.set_rollback(True)
             error_response = {"message": "error: " + str(ex)}
             return Response(error_response, status=status.HTTP_400_BAD_REQUEST)
@@ -69,6 +95,7 @@ class ProductView(views.APIView):
             return Response(error_response, status=status.HTTP_400_BAD_REQUEST)  # return error response
 
         except Exception as ex:
+            logger.exception("Unexpected error in %s %s", request.method, request.path)  # log the traceback
             transaction.set_rollback(True)
             error_response = {"message": "error: " + str(ex)}
             return Response(error_response, status=status.HTTP_400_BAD_REQUEST)
@@ -86,9 +113,11 @@ class ProductView(views.APIView):
             return Response(error_response, status=status.HTTP_400_BAD_REQUEST)  # return error response
 
         except Exception as ex:
+            logger.exception("Unexpected error in %s %s", request.method, request.path)  # log the traceback
             error_response = {"message": "error: " + str(ex)}
             return Response(error_response, status=status.HTTP_400_BAD_REQUEST)
 
+    @replica_reads  # reads may be served by a read replica
     def get(self, request, product_id=None):
 
         try:
@@ -97,16 +126,25 @@ class ProductView(views.APIView):
 
             if self.product_id:
                 self.get_details()
+                self.updated_on = self.data.get("updated_on")  # the payload carries its last change
             else:
+                self.updated_on = self.get_catalogue_updated_on()  # the page itself is not loaded yet
+
+            not_modified = not_modified_response(request, self.updated_on)  # answer If-None-Match/If-Modified-Since
+            if not_modified is not None:
+                return not_modified
+
+            if not self.product_id:
                 self.get_list()
 
-            return Response(self.data, status=status.HTTP_200_OK)  # return response
+            return set_validators(Response(self.data, status=status.HTTP_200_OK), self.updated_on)  # return response
 
         except CustomException as error_message:
             error_response = {"message": "error: " + str(error_message)}  # define error response
             return Response(error_response, status=status.HTTP_400_BAD_REQUEST)  # return error response
 
         except Exception as ex:
+            logger.exception("Unexpected error in %s %s", request.method, request.path)  # log the traceback
             error_response = {"message": "error: " + str(ex)}
             return Response(error_response, status=status.HTTP_400_BAD_REQUEST)
 
@@ -116,86 +154,287 @@ class ProductView(views.APIView):
         if not is_valid:
             raise CustomException(message)  # raise exception if payload is not valid")
 
-    @property
-    def product_id(self):
-        return self._product_id  # return product id
-
-    @product_id.setter
-    def product_id(self, value):
-        self._product_id = value  # set product id
-        if self._product_id:  # if product id is not None
-            self.retrieve_product()  # define a function to retrieve product
-
     def retrieve_product(self):
-        try:
-            self.product = Product.objects.get(id=self.product_id, is_delete=False)  # get product
-        except Product.DoesNotExist:
+        self.product = Product.objects.filter(id=self.product_id, is_delete=False).values_list(
+            *PRODUCT_FIELDS).first()  # get product row
+        if self.product is None:
             raise CustomException("Product does not exist")  # raise exception if product does not exist
 
     def retrieve_products(self):
         self.products = Product.objects.filter(is_delete=False).order_by("-id")  # get products
 
     def save_data(self):
-        if Product.objects.filter(name=self.request_data["name"], is_delete=False).exists():
+        try:
+            self.product = Product.objects.create(
+                name=self.request_data["name"],
+                description=self.request_data["description"],
+                price=self.request_data["price"],
+                quantity=self.request_data["quantity"],
+                created_on=datetime.now()
+            )  # create product, the unique index rejects duplicate active names
+        except IntegrityError:
             raise CustomException("Product name already exist")  # raise exception if product already exist
 
-        self.product = Product.objects.create(
-            name=self.request_data["name"],
-            description=self.request_data["description"],
-            price=self.request_data["price"],
-            quantity=self.request_data["quantity"],
-            created_on=datetime.now()
-        )  # create product
+        get_product_cache().invalidate([self.product.id])  # new product shows up in list pages
 
     def update_data(self):
-        if "name" in self.request_data:
-            if Product.objects.filter(name=self.request_data["name"],
-                                      is_delete=False).exists():  # check if product name already exist
-                raise CustomException("Product name already exist")  # raise exception if product already exist
-
-            self.product.name = self.request_data["name"]  # set product name
+        changes = {field: self.request_data[field] for field in UPDATABLE_FIELDS
+                   if field in self.request_data}  # only the fields sent by the client
 
-        if "description" in self.request_data:  # check if description is in request data
-            self.product.description = self.request_data["description"]  # set product description
+        products = Product.objects.filter(id=self.product_id, is_delete=False)
+        if not changes:  # nothing to update, only make sure the product exists
+            if not products.exists():
+                raise CustomException("Product does not exist")
+            return
 
-        if "price" in self.request_data:  # check if price is in request data
-            self.product.price = self.request_data["price"]  # set product price
+        try:
+            # single UPDATE ... WHERE id = %s AND NOT is_delete
+            updated = products.update(**changes, updated_on=timezone.now())
+        except IntegrityError:  # the unique index rejects duplicate active names
+            raise CustomException("Product name already exist")  # raise exception if product already exist
 
-        if "quantity" in self.request_data:  # check if quantity is in request data
-            self.product.quantity = self.request_data["quantity"]  # set product quantity
+        if not updated:
+            raise CustomException("Product does not exist")  # raise exception if product does not exist
 
-        self.product.updated_on = datetime.now()  # set updated on
-        self.product.save()  # save updated product
+        get_product_cache().invalidate([self.product_id])  # drop cached payloads of this product
+        invalidate_search_index()  # queryset updates do not send save signals
 
     def delete_data(self):
-        self.product.is_delete = True  # set is delete to true
-        self.product.save()
+        deleted = Product.objects.filter(id=self.product_id, is_delete=False).update(
+            is_delete=True, updated_on=timezone.now()
+        )  # soft delete
+        if not deleted:
+            raise CustomException("Product does not exist")  # raise exception if product does not exist
+
+        get_product_cache().invalidate([self.product_id])  # drop cached payloads of this product
+        invalidate_search_index()  # queryset updates do not send save signals
 
     def populate_variables(self):
         self.limit = int(self.request.GET.get('limit')) if self.request.GET.get('limit') else None  # set limit
         self.page_number = int(self.request.GET.get('page')) if self.request.GET.get(
             'page') else None  # set page number
         self.keyword = self.request.GET.get('keyword') if self.request.GET.get('keyword') else None  # set keyword
+        self.cursor = self.request.GET.get('cursor')  # set cursor, an empty cursor requests the first page
+        self.with_count = self.request.GET.get('with_count', '').lower() in ('1', 'true')  # set count flag
 
     def get_details(self):
-        serializer = ProductSerializer(self.product, many=False)  # serialize product
-        self.data = serializer.data  # set data
+        self.data = get_product_cache().get_detail(self.product_id, self.load_details)  # set data
+
+    def load_details(self):
+        self.retrieve_product()  # define a function to retrieve product
+        with profile_section("serializer"):
+            return map_product_row(self.product)  # serialize product
 
     def handle_pagination(self):
         paginator = Paginator(self.products, self.limit)  # set paginator
-        if self.page_number not in list(paginator.page_range):  # check if page number is in paginator page range
+        if not 1 <= self.page_number <= paginator.num_pages:  # check if page number is in paginator page range
             raise CustomException("Invalid page number")  # raise exception if page number is invalid
 
+        self.count = paginator.count  # set count
         self.products = paginator.page(self.page_number)  # set products
 
+    def handle_cursor_pagination(self):
+        limit = self.limit or DEFAULT_CURSOR_LIMIT  # set limit
+        if limit < 1:
+            raise CustomException("Invalid limit")  # raise exception if limit is invalid
+
+        if self.with_count:  # count only when the caller asks for it
+            self.count = self.products.count()
+
+        if self.cursor:  # if cursor is not empty continue after the last seen product
+            values = decode_cursor(self.cursor, 2 if self.keyword else 1)
+            if not all(isinstance(value, (int, float)) for value in values):
+                raise CustomException("Invalid cursor")  # raise exception if cursor is invalid
+
+            if self.keyword:
+                rank, last_id = values
+                self.products = self.products.filter(Q(rank__lt=rank) | Q(rank=rank, id__lt=last_id))
+            else:
+                last_id, = values
+                self.products = self.products.filter(id__lt=last_id)
+
+        products, next_cursor = paginate_keyset(self.products, limit, key=self.cursor_key)
+        with profile_section("serializer"):
+            self.data = {
+                "results": [map_product_row(product) for product in products],
+                "next_cursor": next_cursor,
+            }  # set data
+        if self.with_count:
+            self.data["count"] = self.count
+
+    def cursor_key(self, product):
+        if self.keyword:  # search results are ordered by rank and then by id
+            return [product[-1], product[0]]
+        return [product[0]]
+
+    def list_params(self):
+        return {
+            "keyword": self.keyword,
+            "page": self.page_number,
+            "limit": self.limit,
+            "cursor": self.cursor,
+            "with_count": self.with_count,
+        }  # everything that changes the page content
+
+    def get_catalogue_updated_on(self):
+        return get_product_cache().get_catalogue_updated_on(self.load_catalogue_updated_on)
+
+    def load_catalogue_updated_on(self):
+        # deleted products are included, a soft delete changes the lists too
+        return Product.objects.aggregate(updated_on=Max("updated_on"))["updated_on"]  # read from the index
+
     def get_list(self):
+        self.data = get_product_cache().get_list(self.list_params(), self.load_list)  # set data
+
+    def load_list(self):
         self.retrieve_products()  # define a function to retrieve products
         if self.keyword:  # if keyword is not None
-            self.products = self.products.filter(name__icontains=self.keyword)  # filter products by keyword
+            self.products = get_search_engine().search(self.products, self.keyword)  # rank products by keyword
+
+        fields = PRODUCT_FIELDS + ('rank',) if self.keyword else PRODUCT_FIELDS
+        self.products = self.products.values_list(*fields)  # plain tuples instead of model instances
+
+        if self.cursor is not None:  # if cursor pagination is requested
+            self.handle_cursor_pagination()  # define a function to handle cursor pagination
+            return self.data
 
-        self.count = self.products.count()  # set count
         if self.page_number and self.limit:  # if page number and limit is not None
             self.handle_pagination()  # define a function to handle pagination
 
-        serializer = ProductSerializer(self.products, many=True)  # serialize products
-        self.data = serializer.data  # set data
+        products = list(self.products)  # run the query outside the serializer timing
+        with profile_section("serializer"):
+            self.data = [map_product_row(product) for product in products]  # serialize products
+        return self.data
+
+
+class ProductExportView(views.APIView):
+    """
+    Whole catalogue as NDJSON (default) or CSV, chosen with the Accept header or ?format=csv.
+
+    Rows are read with a server-side cursor and written as they arrive, so memory does not grow with the
+    catalogue. With ?updated_since=<ISO datetime> only products changed since then are exported, deleted
+    ones included, in updated_on order.
+    """
+
+    renderer_classes = [NDJSONRenderer, CSVRenderer]
+    throttle_scope = "export"
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.products = None
+        self.updated_since = None
+
+    @replica_reads  # reads may be served by a read replica
+    def get(self, request):
+
+        try:
+            self.populate_variables()  # define a function to populate variables
+            self.retrieve_products()  # define a function to retrieve products
+            return self.stream_products()  # define a function to build the streaming response
+
+        except CustomException as error_message:
+            error_response = {"message": "error: " + str(error_message)}  # define error response
+            return Response(error_response, status=status.HTTP_400_BAD_REQUEST)  # return error response
+
+        except Exception as ex:
+            logger.exception("Unexpected error in %s %s", request.method, request.path)  # log the traceback
+            error_response = {"message": "error: " + str(ex)}
+            return Response(error_response, status=status.HTTP_400_BAD_REQUEST)
+
+    def populate_variables(self):
+        updated_since = self.request.GET.get('updated_since')
+        if not updated_since:
+            return
+
+        try:
+            self.updated_since = parse_datetime(updated_since)
+        except ValueError:  # well formed but out of range
+            self.updated_since = None
+        if self.updated_since is None:
+            raise CustomException("Invalid updated_since")  # raise exception if the date can not be parsed
+        if timezone.is_naive(self.updated_since):
+            self.updated_since = timezone.make_aware(self.updated_since, timezone.utc)
+
+    def retrieve_products(self):
+        # the rows are read while the response streams, after the view returned, so pin the database now
+        products = Product.objects.using(router.db_for_read(Product))
+        if self.updated_since is None:
+            products = products.filter(is_delete=False).order_by("id")
+        else:
+            products = products.filter(updated_on__gte=self.updated_since).order_by("updated_on", "id")
+
+        self.products = products.values_list(*EXPORT_FIELDS).iterator(
+            chunk_size=settings.PRODUCT_EXPORT['CHUNK_SIZE'])  # server-side cursor, no result cache
+
+    def stream_products(self):
+        renderer = self.request.accepted_renderer
+        rows = (map_export_row(product) for product in self.products)
+        response = StreamingHttpResponse(
+            renderer.stream(rows, EXPORT_FIELDS, chunk_size=settings.PRODUCT_EXPORT['CHUNK_SIZE']),
+            content_type=f"{renderer.media_type}; charset=utf-8",
+        )
+        response["Content-Disposition"] = f'attachment; filename="products.{renderer.format}"'
+        return response
+
+
+class ProductImportView(views.APIView):
+    """
+    Bulk create or update products by name from a CSV or NDJSON file.
+
+    The file is either a multipart upload in the "file" field, its format taken from the file name, or the
+    request body itself with a text/csv or application/x-ndjson content type. Each batch commits on its own;
+    the response lists the rows that were rejected.
+    """
+
+    permission_classes = [IsAdminUser]  # bulk writes are for staff only
+    throttle_scope = "import"
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.lines = None
+        self.file_format = None
+        self.data = None
+
+    def post(self, request):
+
+        try:
+            self.retrieve_source()  # define a function to find the rows and their format
+            self.import_products()  # define a function to import the rows
+
+            response = {"status": 200, "message": "Import finished", **self.data}  # define response
+            return Response(response, status=status.HTTP_200_OK)  # return response
+
+        except CustomException as error_message:
+            error_response = {"status": 490, "message": "error: " + str(error_message)}  # define error response
+            return Response(error_response, status=status.HTTP_400_BAD_REQUEST)  # return error response
+
+        except Exception as ex:
+            logger.exception("Unexpected error in %s %s", request.method, request.path)  # log the traceback
+            error_response = {"message": "error: " + str(ex)}
+            return Response(error_response, status=status.HTTP_400_BAD_REQUEST)
+
+    def retrieve_source(self):
+        content_type = self.request.content_type.split(";")[0].strip().lower()
+        if content_type == "multipart/form-data":
+            upload = self.request.FILES.get("file")  # large uploads are spooled to a temporary file
+            if upload is None:
+                raise CustomException("Following fields are required: file")
+            self.file_format = upload.name.rsplit(".", 1)[-1].lower().replace("jsonl", "ndjson")
+            self.lines = upload
+        else:
+            self.file_format = {"text/csv": "csv", "application/x-ndjson": "ndjson"}.get(content_type)
+            self.lines = self.request.stream  # read line by line, the body is never loaded at once
+
+        if self.file_format not in FORMATS:
+            raise CustomException("Unsupported file, send CSV or NDJSON")  # raise exception if format is unknown
+        if self.lines is None:
+            raise CustomException("File is empty")  # raise exception if there is no body
+
+    def import_products(self):
+        self.data = ProductImporter().run(self.lines, self.file_format)  # set data
+
+
+class ProductCacheStatsView(views.APIView):
+
+    def get(self, request):
+        return Response(get_product_cache().stats(), status=status.HTTP_200_OK)  # return cache statistics
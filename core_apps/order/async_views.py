@@ -0,0 +1,49 @@
+from core_apps._config.async_config.async_orm import database_sync_to_async
+from core_apps._config.async_config.async_view import AsyncView
+from core_apps._config.db_config.routers import replica_reads
+from core_apps._config.exception_config.exception_handler import CustomException
+from core_apps._config.renderer_config.orjson_renderer import json_response
+from core_apps._config.throttle_config.throttles import throttled_response
+from core_apps.order.cart_storage import get_cart_storage
+from core_apps.order.serializers import CartItemSerializer
+from core_apps.order.views import CartView
+
+
+class AsyncCartView(AsyncView):
+    """
+    ASGI variant of CartView.
+
+    GET runs on the event loop and only leaves it for the session and cart lookups. POST and DELETE run the
+    synchronous CartView unchanged in the request thread.
+    """
+
+    sync_view = staticmethod(CartView.as_view())
+    throttle_scope = CartView.throttle_scope
+
+    @replica_reads  # reads may be served by a read replica
+    async def get(self, request):
+        throttled = throttled_response(request, self)  # writes are throttled by the DRF view
+        if throttled is not None:
+            return throttled
+
+        view = CartView(request=request)
+
+        try:
+            await database_sync_to_async(view.retrieve_session)()  # loading the session may query the database
+            cart_items = await database_sync_to_async(get_cart_storage().get_lines)(view.session_id)
+            if cart_items is None:
+                raise CustomException("Cart does not exist")  # raise exception if cart does not exist
+
+            return json_response(CartItemSerializer(cart_items, many=True).data, status=200)  # return response
+
+        except CustomException as error_message:
+            return json_response({"message": "error: " + str(error_message)}, status=400)  # return error response
+
+        except Exception as ex:
+            return json_response({"message": "error: " + str(ex)}, status=400)
+
+    async def post(self, request, *args, **kwargs):
+        return await database_sync_to_async(self.sync_view)(request, *args, **kwargs)
+
+    async def delete(self, request, *args, **kwargs):
+        return await database_sync_to_async(self.sync_view)(request, *args, **kwargs)
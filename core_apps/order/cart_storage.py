@@ -0,0 +1,109 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.db import connection, transaction
+from django.dispatch import receiver
+
+from core_apps.car_parts.models import Product
+from core_apps.order.models import Cart, CartItem
+
+
+class DatabaseCartStorage:
+    """Carts kept in the Cart and CartItem tables."""
+
+    def get_items(self, cart_key):
+        cart_id = Cart.objects.filter(session_key=cart_key).values_list('id', flat=True).first()
+        if cart_id is None:
+            return None  # no cart for this key
+        return dict(CartItem.objects.filter(cart_id=cart_id).values_list('product_id', 'quantity'))
+
+    def get_lines(self, cart_key):
+        cart_id = Cart.objects.filter(session_key=cart_key).values_list('id', flat=True).first()
+        if cart_id is None:
+            return None  # no cart for this key
+        return list(CartItem.objects.filter(cart_id=cart_id).select_related('product'))  # join products once
+
+    def set_items(self, cart_key, items):
+        cart, created = Cart.objects.get_or_create(session_key=cart_key)  # get or create Cart object
+
+        table = connection.ops.quote_name(CartItem._meta.db_table)
+        rows = ", ".join(["(%s, %s, %s)"] * len(items))
+        params = [value for product_id, quantity in items.items() for value in (cart.id, product_id, quantity)]
+        with connection.cursor() as cursor:  # insert or update every line in one statement
+            cursor.execute(
+                f"INSERT INTO {table} (cart_id, product_id, quantity) VALUES {rows} "
+                f"ON CONFLICT (cart_id, product_id) DO UPDATE SET quantity = excluded.quantity",
+                params,
+            )
+
+    def remove_item(self, cart_key, product_id):
+        deleted, _ = CartItem.objects.filter(cart__session_key=cart_key, product_id=product_id).delete()
+        return bool(deleted)
+
+    def clear(self, cart_key):
+        Cart.objects.filter(session_key=cart_key).delete()  # cart items are removed by cascade
+
+
+class CacheCartStorage:
+    """
+    Carts kept as a {product id: quantity} mapping in a cache alias, expiring with the session.
+
+    Nothing is written to the database until checkout. With the default local memory cache a cart only lives
+    in one process, so deployments with several workers must point the alias at a shared cache server.
+    """
+
+    def __init__(self, alias, timeout):
+        self.cache = caches[alias]
+        self.timeout = timeout
+
+    def key(self, cart_key):
+        return f"cart:{cart_key}"
+
+    def get_items(self, cart_key):
+        return self.cache.get(self.key(cart_key))
+
+    def get_lines(self, cart_key):
+        items = self.get_items(cart_key)
+        if items is None:
+            return None
+        products = Product.objects.in_bulk(list(items))  # one query for every product in the cart
+        return [CartItem(product=products[product_id], quantity=quantity)
+                for product_id, quantity in items.items() if product_id in products]
+
+    def set_items(self, cart_key, items):
+        cart = self.get_items(cart_key) or {}
+        cart.update(items)
+        self.cache.set(self.key(cart_key), cart, self.timeout)  # every write extends the cart lifetime
+
+    def remove_item(self, cart_key, product_id):
+        cart = self.get_items(cart_key)
+        if not cart or product_id not in cart:
+            return False
+        del cart[product_id]
+        self.cache.set(self.key(cart_key), cart, self.timeout)
+        return True
+
+    def clear(self, cart_key):
+        # keep the cart if the checkout transaction rolls back
+        transaction.on_commit(lambda: self.cache.delete(self.key(cart_key)))
+
+
+_cart_storage = None
+
+
+def get_cart_storage():
+    global _cart_storage
+    if _cart_storage is None:
+        config = settings.CART_STORAGE
+        if config['BACKEND'] == 'cache':
+            _cart_storage = CacheCartStorage(alias=config['CACHE_ALIAS'], timeout=settings.SESSION_COOKIE_AGE)
+        else:
+            _cart_storage = DatabaseCartStorage()
+    return _cart_storage
+
+
+@receiver(setting_changed)
+def reset_cart_storage(setting, **kwargs):
+    global _cart_storage
+    if setting in ('CART_STORAGE', 'SESSION_COOKIE_AGE'):
+        _cart_storage = None
@@ -0,0 +1,80 @@
+import statistics
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Sum
+from django.test import Client, override_settings
+from django.utils.crypto import get_random_string
+
+from core_apps.car_parts.models import Product
+from core_apps.order.models import Order, StockReservation
+
+CUSTOMER_EMAIL = 'contention@example.com'
+
+
+class Command(BaseCommand):
+    help = 'Checks out one product from many threads at once and verifies that it is never oversold'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16, help='Concurrent shoppers')
+        parser.add_argument('--orders', type=int, default=10, help='Checkouts attempted per shopper')
+        parser.add_argument('--stock', type=int, default=100, help='Units of the contended product')
+        parser.add_argument('--keep', action='store_true', help='Keep the product and orders for inspection')
+
+    def handle(self, *args, **options):
+        product = Product.objects.create(name=f'Contention {get_random_string(8)}', description='load test',
+                                         price='1.00', quantity=options['stock'])
+        payload = {
+            'customer_name': 'Contention', 'customer_email': CUSTOMER_EMAIL, 'customer_phone': '0',
+            'delivery_date': '2030-01-01', 'delivery_time': '12:00',
+        }
+        results = []  # (status, seconds), list.append is thread safe
+        start_barrier = threading.Barrier(options['threads'])
+
+        def shopper():
+            client = Client(raise_request_exception=False)
+            start_barrier.wait()  # every shopper starts at the same moment
+            try:
+                for _ in range(options['orders']):
+                    started = time.perf_counter()
+                    response = client.post('/api/v1/cart/', {'product_id': product.id, 'quantity': 1},
+                                           content_type='application/json')
+                    if response.status_code == 201:
+                        response = client.post('/api/v1/order/', payload, content_type='application/json')
+                    results.append((response.status_code, time.perf_counter() - started))
+            finally:
+                connection.close()  # every thread has its own connection
+
+        threads = [threading.Thread(target=shopper) for _ in range(options['threads'])]
+        with override_settings(THROTTLE={**settings.THROTTLE, 'ENABLED': False}):  # every shopper has one IP
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+
+        try:
+            self.report(product, results, elapsed, options['stock'])
+        finally:
+            if not options['keep']:
+                Order.objects.filter(customer_email=CUSTOMER_EMAIL, order_items__product=product).delete()
+                product.delete()  # reservations and order items go with it
+
+    def report(self, product, results, elapsed, stock):
+        product.refresh_from_db()
+        orders = sum(1 for status, _ in results if status == 201)
+        held = StockReservation.objects.filter(product=product).aggregate(held=Sum('quantity'))['held'] or 0
+        latencies = sorted(seconds * 1000 for _, seconds in results)
+
+        self.stdout.write(f'{len(results)} attempts, {orders} orders, {orders / elapsed:.1f} orders/s, '
+                          f'p50 {statistics.median(latencies):.1f} ms, stock left {product.quantity}')
+
+        if product.quantity < 0 or product.quantity + orders != stock:
+            raise CommandError(f'Oversold: {stock} units, {orders} orders, {product.quantity} left')
+        if product.reserved != held:
+            raise CommandError(f'Reserved counter {product.reserved} does not match {held} held units')
+        self.stdout.write(self.style.SUCCESS('No oversell'))
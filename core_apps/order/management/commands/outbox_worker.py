@@ -0,0 +1,66 @@
+import signal
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from core_apps._config.idempotency_config.idempotency import purge_expired
+from core_apps.order.outbox import process_batch, purge_processed
+from core_apps.order.reservations import release_expired
+
+
+class Command(BaseCommand):
+    help = 'Processes outbox events (order emails, low stock alerts) and runs the periodic cart cleanup'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.OUTBOX['BATCH_SIZE'],
+                            help='Events locked and handled per transaction')
+        parser.add_argument('--poll-interval', type=float, default=settings.OUTBOX['POLL_INTERVAL'],
+                            help='Seconds to sleep when the outbox is empty')
+        parser.add_argument('--cleanup-interval', type=float, default=300,
+                            help='Seconds between releasing expired reservations and purging old carts')
+        parser.add_argument('--once', action='store_true', help='Drain the outbox, clean up once and exit')
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        handlers = {signum: signal.signal(signum, self.stop) for signum in (signal.SIGTERM, signal.SIGINT)}
+        try:
+            processed = self.run(options)  # the current batch is finished before exiting
+        finally:
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} outbox events'))
+
+    def run(self, options):
+        batch_size = options['batch_size']
+        next_cleanup = 0
+        processed = 0
+        while not self.stopping:
+            if time.monotonic() >= next_cleanup:
+                self.cleanup(batch_size)
+                next_cleanup = time.monotonic() + options['cleanup_interval']
+
+            taken = process_batch(batch_size)
+            processed += taken
+            if taken < batch_size:  # drained, wait for new events
+                if options['once']:
+                    break
+                close_old_connections()  # do not keep an idle connection past its age
+                time.sleep(options['poll_interval'])
+        return processed
+
+    def stop(self, signum, frame):
+        self.stopping = True
+
+    def cleanup(self, batch_size):
+        released = release_expired(batch_size=batch_size)
+        purged = purge_processed(timezone.now() - timedelta(seconds=settings.OUTBOX['RETENTION']), batch_size)
+        expired = purge_expired(batch_size)
+        call_command('purge_carts', batch_size=batch_size, stdout=self.stdout)
+        self.stdout.write(f'Released {released} expired reservations, purged {purged} processed events and '
+                          f'{expired} expired idempotency keys')
@@ -0,0 +1,57 @@
+import time
+from datetime import timedelta
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core_apps.order.models import Cart
+
+DATABASE_SESSION_ENGINES = (
+    'django.contrib.sessions.backends.db',
+    'django.contrib.sessions.backends.cached_db',
+)
+
+
+class Command(BaseCommand):
+    help = 'Deletes expired sessions and carts that outlived their session, in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows deleted per statement')
+        parser.add_argument('--pause', type=float, default=0.0, help='Seconds to sleep between batches')
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.pause = options['pause']
+        now = timezone.now()
+
+        sessions = self.purge_sessions(now)
+        carts = self.purge_carts(now - timedelta(seconds=settings.SESSION_COOKIE_AGE))
+
+        self.stdout.write(self.style.SUCCESS(f'Deleted {sessions} expired sessions and {carts} orphaned carts'))
+
+    def purge_in_batches(self, queryset, model):
+        deleted = 0
+        while True:
+            keys = list(queryset.values_list('pk', flat=True)[:self.batch_size])  # short statements, short locks
+            if not keys:
+                return deleted
+
+            model.objects.filter(pk__in=keys).delete()
+            deleted += len(keys)
+            if self.pause:
+                time.sleep(self.pause)
+
+    def purge_sessions(self, now):
+        if settings.SESSION_ENGINE not in DATABASE_SESSION_ENGINES:
+            import_module(settings.SESSION_ENGINE).SessionStore.clear_expired()  # engine specific cleanup
+            return 0
+
+        return self.purge_in_batches(Session.objects.filter(expire_date__lt=now), Session)
+
+    def purge_carts(self, created_before):
+        # a session expires SESSION_COOKIE_AGE after its last save, and cart requests only save it when they
+        # create the cart key; a cart older than that has lost its session and its cookie
+        return self.purge_in_batches(Cart.objects.filter(created_on__lt=created_before), Cart)
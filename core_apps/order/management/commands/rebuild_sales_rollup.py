@@ -0,0 +1,36 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+
+from core_apps.order.models import Order
+from core_apps.order.sales_rollup import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the daily product sales rollup of past days from the order tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date-from', type=date.fromisoformat, help='First day, defaults to the first order')
+        parser.add_argument('--date-to', type=date.fromisoformat, help='Last day included, defaults to yesterday')
+        parser.add_argument('--chunk-days', type=int, default=7, help='Days recomputed per transaction')
+
+    def handle(self, *args, **options):
+        yesterday = timezone.localdate() - timedelta(days=1)
+        date_to = options['date_to'] or yesterday
+        date_from = options['date_from']
+        if date_from is None:
+            first_order = Order.objects.aggregate(first=Min('ordered_at'))['first']
+            if first_order is None:
+                self.stdout.write('No orders to roll up')
+                return
+            date_from = timezone.localdate(first_order)
+
+        if date_to > yesterday:
+            raise CommandError('Only past days can be rebuilt, the outbox worker records today')
+        if date_from > date_to or options['chunk_days'] < 1:
+            raise CommandError('Nothing to rebuild, check --date-from, --date-to and --chunk-days')
+
+        written = rebuild(date_from, date_to, chunk_days=options['chunk_days'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {date_from} to {date_to}: {written} rollup rows'))
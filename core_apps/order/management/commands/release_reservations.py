@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core_apps.order.reservations import release_expired
+
+
+class Command(BaseCommand):
+    help = 'Gives the stock held by expired cart reservations back to the products'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Reservations released per transaction')
+
+    def handle(self, *args, **options):
+        released = release_expired(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Released {released} expired reservations'))
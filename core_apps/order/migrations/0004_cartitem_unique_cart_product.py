@@ -0,0 +1,31 @@
+# Generated by Django 4.0.3 on 2026-10-18 10:16
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def remove_duplicate_cart_items(apps, schema_editor):
+    CartItem = apps.get_model('order', 'CartItem')
+    duplicates = CartItem.objects.values('cart_id', 'product_id').annotate(
+        keep_id=Max('id'), items=models.Count('id')
+    ).filter(items__gt=1)  # keep the most recent line of every (cart, product) pair
+
+    for duplicate in duplicates.iterator():
+        CartItem.objects.filter(cart_id=duplicate['cart_id'], product_id=duplicate['product_id']).exclude(
+            id=duplicate['keep_id']
+        ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0003_order_total_amount'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_cart_items, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(fields=('cart', 'product'), name='unique_cart_product'),
+        ),
+    ]
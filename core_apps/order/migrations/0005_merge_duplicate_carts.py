@@ -0,0 +1,31 @@
+# Generated by Django 4.0.3 on 2026-10-18 10:26
+
+from django.db import migrations
+from django.db.models import Count, Max
+
+
+def merge_duplicate_carts(apps, schema_editor):
+    Cart = apps.get_model('order', 'Cart')
+    CartItem = apps.get_model('order', 'CartItem')
+    duplicates = Cart.objects.values('session_key').annotate(
+        keep_id=Max('id'), carts=Count('id')
+    ).filter(carts__gt=1)  # keep the most recent cart of every session
+
+    for duplicate in duplicates.iterator():
+        older_carts = Cart.objects.filter(session_key=duplicate['session_key']).exclude(id=duplicate['keep_id'])
+        for item in CartItem.objects.filter(cart__in=older_carts).order_by('-id'):  # newest line per product wins
+            if not CartItem.objects.filter(cart_id=duplicate['keep_id'], product_id=item.product_id).exists():
+                item.cart_id = duplicate['keep_id']  # move lines the kept cart does not have yet
+                item.save(update_fields=['cart'])
+        older_carts.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0004_cartitem_unique_cart_product'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_carts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.0.3 on 2026-10-18 10:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0005_merge_duplicate_carts'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cart',
+            name='session_key',
+            field=models.CharField(max_length=40, unique=True),
+        ),
+    ]
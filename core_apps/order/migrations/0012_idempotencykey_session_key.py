@@ -0,0 +1,18 @@
+# Generated by Django 4.0.3 on 2026-10-18 11:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0011_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='idempotencykey',
+            name='session_key',
+            field=models.CharField(blank=True, max_length=40, null=True),
+        ),
+    ]
@@ -1,10 +1,13 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.db.models import Q
+from django.utils import timezone
 
 from core_apps.car_parts.models import Product
 
 
 class Cart(models.Model):
-    session_key = models.CharField(max_length=40)
+    session_key = models.CharField(max_length=40, unique=True)
     created_on = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -16,6 +19,11 @@ class CartItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.IntegerField(default=1)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'product'], name='unique_cart_product'),
+        ]
+
     def total_price(self):
         return self.quantity * self.product.price
 
@@ -23,6 +31,21 @@ class CartItem(models.Model):
         return f'{self.quantity} x {self.product.name}'
 
 
+class StockReservation(models.Model):
+    cart_key = models.CharField(max_length=40)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    quantity = models.IntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart_key', 'product'], name='unique_cart_key_product'),
+        ]
+
+    def __str__(self):
+        return f'{self.quantity} x {self.product_id} for {self.cart_key}'
+
+
 class Order(models.Model):
     customer_name = models.CharField(max_length=100, blank=True, null=True)
     customer_email = models.EmailField(default=None, blank=True, null=True)
@@ -32,6 +55,12 @@ class Order(models.Model):
     delivery_date = models.DateField()
     delivery_time = models.TimeField()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['customer_email', '-ordered_at', '-id'], name='order_email_ordered_idx'),
+            models.Index(fields=['-ordered_at', '-id'], name='order_ordered_idx'),
+        ]  # order history is filtered by customer and paged newest first
+
     def __str__(self):
         return f'Order {self.id} - {self.ordered_at.strftime("%Y-%m-%d")}'
 
@@ -40,9 +69,61 @@ class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='order_items')
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.IntegerField(default=1)
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)  # price when ordered
+
+    def price(self):
+        return self.product.price if self.unit_price is None else self.unit_price  # older rows have no unit price
 
     def total_price(self):
-        return self.quantity * self.product.price
+        return self.quantity * self.price()
 
     def __str__(self):
         return f'{self.quantity} x {self.product.name}'
+
+
+class OutboxEvent(models.Model):
+    topic = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+    created_on = models.DateTimeField(auto_now_add=True)
+    available_at = models.DateTimeField(default=timezone.now)
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True, default='')
+    processed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['available_at', 'id'], condition=Q(processed_at__isnull=True),
+                         name='outbox_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.topic} {self.id}'
+
+
+class DailyProductSales(models.Model):
+    day = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    orders = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'product'], name='unique_day_product_sales'),
+        ]  # also the index for day range reports
+
+    def __str__(self):
+        return f'{self.day} {self.product_id}: {self.units} units'
+
+
+class IdempotencyKey(models.Model):
+    key = models.CharField(max_length=64, unique=True)  # sha256 of the client scope and the Idempotency-Key header
+    fingerprint = models.CharField(max_length=64)
+    status = models.IntegerField(blank=True, null=True)  # null while the original request is running
+    response = models.JSONField(blank=True, null=True, encoder=DjangoJSONEncoder)
+    session_key = models.CharField(max_length=40, blank=True, null=True)  # handed out again by a replay
+    locked_until = models.DateTimeField()  # a running request older than this is taken over by a retry
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f'{self.key} {self.status}'
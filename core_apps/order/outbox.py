@@ -0,0 +1,140 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core_apps._config.metrics_config.metrics import metrics
+from core_apps.car_parts.models import Product
+from core_apps.order.models import OutboxEvent
+from core_apps.order.sales_rollup import SALES_RECORDED, fold_sales
+
+logger = logging.getLogger(__name__)
+
+ORDER_CREATED = 'order.created'
+
+
+def publish(topic, payload):
+    """Record an event in the current transaction; it is only seen by the worker if the transaction commits."""
+    return OutboxEvent.objects.create(topic=topic, payload=payload)
+
+
+def publish_many(events):
+    """Record several (topic, payload) events with a single INSERT."""
+    return OutboxEvent.objects.bulk_create([OutboxEvent(topic=topic, payload=payload) for topic, payload in events])
+
+
+def send_confirmations(events):
+    messages = [
+        EmailMessage(
+            subject=f"Order {event.payload['order_id']} confirmed",
+            body=(f"Hello {event.payload['customer_name'] or ''},\n\n"
+                  f"we received your order {event.payload['order_id']} of {event.payload['total_amount']}, "
+                  f"to be delivered on {event.payload['delivery_date']} at {event.payload['delivery_time']}."),
+            to=[event.payload['customer_email']],
+        )
+        for event in events if event.payload.get('customer_email')
+    ]
+    if messages:
+        get_connection().send_messages(messages)  # one connection for the whole batch
+
+
+def send_low_stock_alerts(events):
+    product_ids = {line['product_id'] for event in events for line in event.payload['lines']}
+    products = list(Product.objects.filter(
+        id__in=product_ids, quantity__lte=F('reserved') + settings.OUTBOX['LOW_STOCK_THRESHOLD']
+    ).order_by('id').values_list('id', 'name', 'quantity', 'reserved'))  # products sold down to the threshold
+    if not products:
+        return
+
+    lines = [f"{name} (id {product_id}): {quantity - reserved} available" for product_id, name, quantity, reserved
+             in products]
+    logger.warning("Low stock: %s", "; ".join(lines))
+    if settings.OUTBOX['ALERT_RECIPIENTS']:
+        EmailMessage(subject=f"Low stock on {len(products)} products", body="\n".join(lines),
+                     to=settings.OUTBOX['ALERT_RECIPIENTS']).send()
+
+
+def handle_order_created(events):
+    send_confirmations(events)
+    send_low_stock_alerts(events)
+
+
+HANDLERS = {
+    ORDER_CREATED: handle_order_created,
+    SALES_RECORDED: fold_sales,  # separate topic, failing emails never hold back the rollup
+}
+
+
+def pending_events():
+    return OutboxEvent.objects.filter(
+        processed_at__isnull=True,
+        available_at__lte=timezone.now(),
+        attempts__lt=settings.OUTBOX['MAX_ATTEMPTS'],
+    ).order_by('available_at', 'id')
+
+
+def fail(event, error):
+    event.attempts += 1
+    event.last_error = repr(error)
+    event.available_at = timezone.now() + timedelta(seconds=settings.OUTBOX['RETRY_DELAY'] * 2 ** event.attempts)
+    event.save(update_fields=['attempts', 'last_error', 'available_at'])
+    metrics.increment('outbox_failed', topic=event.topic)
+    logger.exception("Outbox event %s failed (attempt %s)", event.id, event.attempts)
+
+
+def process_batch(batch_size=None):
+    """
+    Handle up to batch_size pending events; returns the number of events taken.
+
+    The batch is locked with SKIP LOCKED so several workers can share the table. Each topic handler gets all its
+    events at once; when it raises, the events are retried one by one so a single bad event does not hold back
+    the rest. Delivery is at least once: an event whose handler succeeded may run again if the commit fails.
+    """
+    batch_size = batch_size or settings.OUTBOX['BATCH_SIZE']
+    with transaction.atomic():
+        events = list(pending_events().select_for_update(skip_locked=True)[:batch_size])  # other workers skip these
+
+        by_topic = {}
+        for event in events:
+            by_topic.setdefault(event.topic, []).append(event)
+
+        done = []
+        for topic, topic_events in by_topic.items():
+            handler = HANDLERS.get(topic)
+            if handler is None:
+                for event in topic_events:
+                    fail(event, LookupError(f"No handler for {topic}"))
+                continue
+
+            try:
+                with transaction.atomic():  # savepoint, the batch can still be retried per event
+                    handler(topic_events)
+                done.extend(topic_events)
+            except Exception:
+                for event in topic_events:
+                    try:
+                        with transaction.atomic():
+                            handler([event])
+                        done.append(event)
+                    except Exception as error:
+                        fail(event, error)
+
+        OutboxEvent.objects.filter(id__in=[event.id for event in done]).update(processed_at=timezone.now())
+        for event in done:
+            metrics.increment('outbox_processed', topic=event.topic)
+    return len(events)
+
+
+def purge_processed(before, batch_size=1000):
+    """Delete events processed before the given time, in batches; returns the number of events deleted."""
+    deleted = 0
+    while True:
+        ids = list(OutboxEvent.objects.filter(processed_at__lt=before).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        OutboxEvent.objects.filter(id__in=ids).delete()
+        deleted += len(ids)
@@ -0,0 +1,158 @@
+"""
+Stock reservations.
+
+Adding a product to a cart holds the units in Product.reserved, so the stock that other carts can claim is
+quantity - reserved. Every change is a conditional UPDATE (WHERE quantity >= reserved + n) instead of a read
+followed by a write, which keeps row locks short and can never oversell. Reservations expire
+STOCK_RESERVATION_TTL seconds after the last cart change; release_expired hands expired units back.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, F, IntegerField, Q, When
+from django.utils import timezone
+
+from core_apps._config.db_config.retry import retry_on_conflict
+from core_apps._config.exception_config.exception_handler import CustomException
+from core_apps.car_parts.models import Product
+from core_apps.order.models import StockReservation
+
+
+def held_quantities(cart_key, product_ids=None):
+    reservations = StockReservation.objects.select_for_update().filter(cart_key=cart_key)  # lock this cart's rows
+    if product_ids is not None:
+        reservations = reservations.filter(product_id__in=list(product_ids))
+    return dict(reservations.values_list('product_id', 'quantity'))
+
+
+def adjust_reserved(deltas):
+    conditions = Q()
+    whens = []
+    for product_id, delta in deltas.items():
+        conditions |= Q(id=product_id, quantity__gte=F('reserved') + delta) if delta > 0 else Q(id=product_id)
+        whens.append(When(id=product_id, then=F('reserved') + delta))
+
+    updated = Product.objects.filter(conditions).update(
+        reserved=Case(*whens, output_field=IntegerField())
+    )  # single conditional update for every product
+    if updated != len(deltas):
+        raise CustomException("Product quantity is not enough")
+
+
+def write_reservations(cart_key, items, expires_at, on_conflict):
+    table = connection.ops.quote_name(StockReservation._meta.db_table)
+    rows = ", ".join(["(%s, %s, %s, %s)"] * len(items))
+    params = [
+        value for product_id, quantity in items.items()
+        for value in (cart_key, product_id, quantity, connection.ops.adapt_datetimefield_value(expires_at))
+    ]
+    with connection.cursor() as cursor:  # every reservation in one statement
+        cursor.execute(
+            f"INSERT INTO {table} (cart_key, product_id, quantity, expires_at) VALUES {rows} "
+            f"ON CONFLICT (cart_key, product_id) {on_conflict}",
+            params,
+        )
+
+
+def reserve(cart_key, items):
+    """Hold stock for the {product id: quantity} cart lines, replacing what the cart held for them before."""
+    expires_at = timezone.now() + timedelta(seconds=settings.STOCK_RESERVATION_TTL)
+    with transaction.atomic():  # the placeholders go away when the stock is not enough
+        # first adds have no row to lock yet: an empty one is inserted, so a concurrent add of the same line
+        # waits here and then sees the quantity this one holds instead of reserving the stock a second time
+        write_reservations(cart_key, {product_id: 0 for product_id in items}, expires_at, "DO NOTHING")
+        held = held_quantities(cart_key, items)
+        deltas = {product_id: quantity - held.get(product_id, 0) for product_id, quantity in items.items()}
+        deltas = {product_id: delta for product_id, delta in deltas.items() if delta}
+        if deltas:
+            retry_on_conflict(lambda: adjust_reserved(deltas))
+
+        write_reservations(cart_key, items, expires_at, "DO UPDATE SET quantity = excluded.quantity")
+    StockReservation.objects.filter(cart_key=cart_key).update(expires_at=expires_at)  # the whole cart stays held
+
+
+def reserve_available(cart_key, items):
+    """
+    Like reserve, but leaves out the lines the stock can not cover; returns their product ids.
+
+    A failed reserve rolls back entirely, so the short products are looked up, dropped and the rest reserved
+    again. Raises CustomException when the reserve fails without any product being short, e.g. after a race.
+    """
+    items = dict(items)
+    rejected = set()
+    while items:
+        try:
+            reserve(cart_key, items)
+            return rejected
+        except CustomException:
+            held = held_quantities(cart_key, items)
+            short = {product_id for product_id, available in Product.objects.filter(id__in=list(items)).values_list(
+                'id', F('quantity') - F('reserved')) if available < items[product_id] - held.get(product_id, 0)}
+            if not short:
+                raise
+            rejected |= short
+            items = {product_id: quantity for product_id, quantity in items.items() if product_id not in short}
+    return rejected
+
+
+def release(cart_key, product_ids=None):
+    """Give the units held by a cart, or by some of its lines, back to the stock."""
+    held = held_quantities(cart_key, product_ids)
+    if not held:
+        return
+
+    retry_on_conflict(lambda: adjust_reserved({product_id: -quantity for product_id, quantity in held.items()}))
+    StockReservation.objects.filter(cart_key=cart_key, product_id__in=list(held)).delete()
+
+
+def consume(cart_key, quantities, held):
+    """
+    Take the ordered {product id: quantity} out of the stock at checkout.
+
+    held are the cart's reservations, locked with held_quantities. They are released as the order is taken,
+    so only the units not held by other carts are checked.
+    """
+    def decrement():
+        conditions = Q()
+        quantity_whens = []
+        reserved_whens = []
+        for product_id in set(quantities) | set(held):
+            ordered = quantities.get(product_id, 0)
+            reserved = held.get(product_id, 0)
+            conditions |= Q(id=product_id, quantity__gte=F('reserved') - reserved + ordered) if ordered else Q(
+                id=product_id)
+            quantity_whens.append(When(id=product_id, then=F('quantity') - ordered))
+            reserved_whens.append(When(id=product_id, then=F('reserved') - reserved))
+
+        updated = Product.objects.filter(conditions).update(
+            quantity=Case(*quantity_whens, output_field=IntegerField()),
+            reserved=Case(*reserved_whens, output_field=IntegerField()),
+            updated_on=timezone.now(),
+        )  # single conditional update for every cart product
+        if updated != len(quantity_whens):  # a product was sold to another cart in the meantime
+            raise CustomException("Product quantity is not enough")
+
+    retry_on_conflict(decrement)
+    StockReservation.objects.filter(cart_key=cart_key).delete()
+
+
+def release_expired(now=None, batch_size=1000):
+    """Release reservations that expired before now, in batches; returns the number of reservations released."""
+    now = now or timezone.now()
+    released = 0
+    while True:
+        with transaction.atomic():
+            rows = list(StockReservation.objects.select_for_update(skip_locked=True).filter(
+                expires_at__lte=now
+            ).values_list('id', 'product_id', 'quantity')[:batch_size])  # carts in checkout are skipped
+            if not rows:
+                return released
+
+            deltas = defaultdict(int)
+            for _, product_id, quantity in rows:
+                deltas[product_id] -= quantity
+            retry_on_conflict(lambda: adjust_reserved(deltas))
+            StockReservation.objects.filter(id__in=[row[0] for row in rows]).delete()
+        released += len(rows)
@@ -0,0 +1,95 @@
+"""
+Daily sales per product, kept in DailyProductSales.
+
+Checkout publishes a sales.recorded outbox event; the outbox worker folds batches of them into the rollup with
+one upsert, in the transaction that marks the events processed, so every order is counted once. rebuild()
+recomputes whole days from the order tables with set-based INSERT ... SELECT statements.
+"""
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Count, DecimalField, F, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from core_apps.order.models import DailyProductSales, OrderItem, OutboxEvent
+
+SALES_RECORDED = 'sales.recorded'
+
+UPSERT_BATCH_SIZE = 500
+
+
+def fold_sales(events):
+    """Outbox handler: add the lines of sales.recorded events to the rollup."""
+    totals = defaultdict(lambda: [0, 0, Decimal('0.00')])
+    for event in events:
+        day = date.fromisoformat(event.payload['day'])
+        for line in event.payload['lines']:
+            row = totals[day, line['product_id']]
+            row[0] += 1
+            row[1] += line['quantity']
+            row[2] += Decimal(line['price']) * line['quantity']
+
+    rows = [(day, product_id, *values) for (day, product_id), values in sorted(totals.items())]  # stable lock order
+    for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+        upsert(rows[start:start + UPSERT_BATCH_SIZE])
+
+
+def upsert(rows):
+    table = connection.ops.quote_name(DailyProductSales._meta.db_table)
+    values = ", ".join(["(%s, %s, %s, %s, %s)"] * len(rows))
+    with connection.cursor() as cursor:  # add to existing rows in the same statement
+        cursor.execute(
+            f"INSERT INTO {table} (day, product_id, orders, units, revenue) VALUES {values} "
+            f"ON CONFLICT (day, product_id) DO UPDATE SET orders = {table}.orders + excluded.orders, "
+            f"units = {table}.units + excluded.units, revenue = {table}.revenue + excluded.revenue",
+            [value for row in rows for value in row],
+        )
+
+
+def day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def sales_query(first_day, end_day):
+    """Rollup rows of the orders placed in [first_day, end_day), grouped in SQL."""
+    return OrderItem.objects.filter(
+        order__ordered_at__gte=day_start(first_day),
+        order__ordered_at__lt=day_start(end_day),
+    ).values('product_id', day=TruncDate('order__ordered_at')).annotate(
+        orders=Count('order_id', distinct=True),
+        units=Sum('quantity'),
+        revenue=Sum(F('quantity') * Coalesce('unit_price', 'product__price'), output_field=DecimalField()),
+    ).order_by()
+
+
+def rebuild(first_day, last_day, chunk_days=7):
+    """
+    Recompute the rollup of first_day to last_day included, chunk_days per transaction.
+
+    Pending sales.recorded events of these days are marked processed in the same transaction, they are
+    counted by the rebuild. Returns the number of rollup rows written.
+    """
+    if last_day >= timezone.localdate():
+        raise ValueError("Only past days can be rebuilt, today's sales are still being recorded")
+
+    table = connection.ops.quote_name(DailyProductSales._meta.db_table)
+    written = 0
+    chunk_start = first_day
+    while chunk_start <= last_day:
+        chunk_end = min(chunk_start + timedelta(days=chunk_days), last_day + timedelta(days=1))
+        days = [(chunk_start + timedelta(days=offset)).isoformat() for offset in range((chunk_end - chunk_start).days)]
+        select, params = sales_query(chunk_start, chunk_end).query.sql_with_params()
+
+        with transaction.atomic():
+            OutboxEvent.objects.filter(topic=SALES_RECORDED, processed_at__isnull=True, payload__day__in=days).update(
+                processed_at=timezone.now())  # would be counted twice otherwise
+            DailyProductSales.objects.filter(day__gte=chunk_start, day__lt=chunk_end).delete()
+            with connection.cursor() as cursor:  # aggregated by the database, rows never reach Python
+                cursor.execute(f"INSERT INTO {table} (product_id, day, orders, units, revenue) {select}", params)
+                written += cursor.rowcount
+
+        chunk_start = chunk_end
+    return written
@@ -1,6 +1,6 @@
 from rest_framework import serializers
 
-from .models import CartItem
+from .models import CartItem, Order, OrderItem
 
 
 class CartItemSerializer(serializers.ModelSerializer):
@@ -15,3 +15,22 @@ class CartItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = CartItem
         fields = ['product_id', 'product_name', 'quantity', 'each_price', 'total_price']
+
+
+class OrderItemSerializer(serializers.ModelSerializer):
+    product_name = serializers.ReadOnlyField(source='product.name')
+    each_price = serializers.DecimalField(source='price', max_digits=10, decimal_places=2, read_only=True)
+    total_price = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = OrderItem
+        fields = ['product_id', 'product_name', 'quantity', 'each_price', 'total_price']
+
+
+class OrderSerializer(serializers.ModelSerializer):
+    items = OrderItemSerializer(source='order_items', many=True, read_only=True)  # needs prefetched items
+
+    class Meta:
+        model = Order
+        fields = ['id', 'customer_name', 'customer_email', 'customer_phone', 'total_amount', 'ordered_at',
+                  'delivery_date', 'delivery_time', 'items']
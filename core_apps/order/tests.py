@@ -1,3 +1,504 @@
-from django.test import TestCase
+import hashlib
+import json
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import skipIf
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core import mail
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core_apps._config.test_config.query_count import QueryCountMixin
+from core_apps.car_parts.models import Product
+from core_apps.order import outbox, reservations
+from core_apps.order.models import (
+    Cart, CartItem, DailyProductSales, IdempotencyKey, Order, OrderItem, OutboxEvent, StockReservation,
+)
+from core_apps.order.reservations import release_expired
+
+ORDER_PAYLOAD = {
+    "customer_name": "James Nathan",
+    "customer_email": "james@gmail.com",
+    "customer_phone": "+112254873697",
+    "delivery_date": "2024-01-25",
+    "delivery_time": "12:25",
+}
+
+
+class CartTestMixin(QueryCountMixin):
+
+    def fill_cart(self, size):
+        self.client.cookies.clear()
+        for index in range(size):
+            product = Product.objects.create(name=f"Part {size}-{index}", description="d", price="2.50",
+                                             quantity=10)
+            self.client.post("/api/v1/cart/", {"product_id": product.id, "quantity": 2},
+                             content_type="application/json")
+
+
+class CartQueryCountTest(CartTestMixin, TestCase):
+
+    def test_cart_items_are_read_with_a_fixed_number_of_queries(self):
+        self.assertConstantQueries(self.fill_cart, lambda: self.client.get("/api/v1/cart/"))
+
+    def test_cart_items_response(self):
+        self.fill_cart(2)
+        response = self.client.get("/api/v1/cart/")
+
+        self.assertEqual(len(response.data), 2)
+        self.assertEqual(response.data[0]["quantity"], 2)
+        self.assertEqual(str(response.data[0]["total_price"]), "5.00")
+
+
+class CheckoutQueryCountTest(CartTestMixin, TestCase):
+
+    def test_checkout_runs_a_fixed_number_of_queries(self):
+        self.assertConstantQueries(
+            self.fill_cart,
+            lambda: self.client.post("/api/v1/order/", ORDER_PAYLOAD, content_type="application/json"),
+        )
+
+    def test_checkout_decrements_stock_and_removes_the_cart(self):
+        self.fill_cart(3)
+        response = self.client.post("/api/v1/order/", ORDER_PAYLOAD, content_type="application/json")
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(set(Product.objects.values_list("quantity", flat=True)), {8})
+        self.assertFalse(Cart.objects.exists())
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_checkout_fails_when_stock_is_short(self):
+        self.fill_cart(2)
+        Product.objects.filter(name="Part 2-1").update(quantity=1)
+        response = self.client.post("/api/v1/order/", ORDER_PAYLOAD, content_type="application/json")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(Product.objects.values_list("quantity", flat=True)), {10, 1})
+
+
+class CartBulkTest(QueryCountMixin, TestCase):
+
+    def bulk_items(self, size):
+        self.client.cookies.clear()
+        self.items = [
+            {"product_id": Product.objects.create(name=f"Bulk {size}-{index}", description="d", price="1.00",
+                                                  quantity=5).id, "quantity": 2}
+            for index in range(size)
+        ]
+
+    def post_items(self):
+        return self.client.post("/api/v1/cart/bulk/", {"items": self.items}, content_type="application/json")
+
+    def test_bulk_add_runs_a_fixed_number_of_queries(self):
+        self.assertConstantQueries(self.bulk_items, self.post_items, sizes=(1, 50))
+
+    def test_bulk_add_upserts_and_reports_every_item(self):
+        self.bulk_items(2)
+        self.post_items()
+        self.items[0]["quantity"] = 4
+        self.items.append({"product_id": 999999, "quantity": 1})
+        response = self.post_items()
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([item["status"] for item in response.data["items"]], ["ok", "ok", "error"])
+        self.assertEqual(sorted(CartItem.objects.values_list("quantity", flat=True)), [2, 4])
+
+    def test_stock_shortage_is_reported_on_the_affected_items(self):
+        self.bulk_items(2)
+        self.items[1]["quantity"] = 6  # one more than the stock
+        response = self.post_items()
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([item["status"] for item in response.data["items"]], ["ok", "error"])
+        self.assertEqual(response.data["items"][1]["message"], "Product quantity is not enough")
+        self.assertEqual(list(CartItem.objects.values_list("quantity", flat=True)), [2])
+        self.assertEqual(sorted(Product.objects.values_list("reserved", flat=True)), [0, 2])
+
+    def test_nothing_applied_answers_400_without_a_session(self):
+        self.bulk_items(1)
+        self.items[0]["quantity"] = 9
+        self.items.append({"product_id": 999999, "quantity": 1})
+        response = self.post_items()
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([item["message"] for item in response.data["items"]],
+                         ["Product quantity is not enough", "Product does not exist"])
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+        self.assertFalse(CartItem.objects.exists())
+
+
+@override_settings(SESSION_ENGINE="django.contrib.sessions.backends.db")
+class CartSessionTest(TestCase):
+
+    def test_read_only_requests_create_no_session(self):
+        product = Product.objects.create(name="Mirror", description="d", price="30.00", quantity=2)
+
+        self.assertEqual(self.client.get("/api/v1/cart/").status_code, 400)
+        self.assertEqual(self.client.delete(f"/api/v1/cart/{product.id}/").status_code, 400)
+        self.assertFalse(Session.objects.exists())
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, self.client.cookies)
+
+        self.client.post("/api/v1/cart/", {"product_id": product.id, "quantity": 1}, content_type="application/json")
+        self.assertEqual(Session.objects.count(), 1)  # the first cart write creates it
+
+    def test_purge_deletes_expired_sessions_and_orphaned_carts_in_batches(self):
+        now = timezone.now()
+        for index in range(5):
+            Session.objects.create(session_key=f"expired-{index}", session_data="", expire_date=now - timedelta(1))
+        Session.objects.create(session_key="active", session_data="", expire_date=now + timedelta(1))
+        for index in range(3):
+            Cart.objects.create(session_key=f"old-{index}")
+        Cart.objects.update(created_on=now - timedelta(seconds=settings.SESSION_COOKIE_AGE + 60))
+        Cart.objects.create(session_key="recent")
+
+        output = StringIO()
+        with CaptureQueriesContext(connection) as queries:
+            call_command("purge_carts", batch_size=2, stdout=output)
+
+        self.assertIn("Deleted 5 expired sessions and 3 orphaned carts", output.getvalue())
+        self.assertEqual(list(Session.objects.values_list("session_key", flat=True)), ["active"])
+        self.assertEqual(list(Cart.objects.values_list("session_key", flat=True)), ["recent"])
+        session_deletes = [query for query in queries.captured_queries
+                           if query["sql"].startswith('DELETE FROM "django_session"')]
+        self.assertEqual(len(session_deletes), 3)  # batches of 2, 2 and 1
+
+
+@override_settings(CART_STORAGE={"BACKEND": "cache", "CACHE_ALIAS": "default"})
+class CacheCartStorageTest(CartTestMixin, TestCase):
+
+    def test_cart_lives_in_the_cache_until_checkout(self):
+        self.fill_cart(2)
+        product_id = Product.objects.first().id
+        self.client.delete(f"/api/v1/cart/{product_id}/")
+
+        self.assertEqual(len(self.client.get("/api/v1/cart/").data), 1)
+        self.assertFalse(Cart.objects.exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post("/api/v1/order/", ORDER_PAYLOAD, content_type="application/json")
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(sorted(Product.objects.values_list("quantity", flat=True)), [8, 10])
+        self.assertEqual(self.client.get("/api/v1/cart/").status_code, 400)
+
+
+class StockReservationTest(TestCase):
+
+    def setUp(self):
+        self.product = Product.objects.create(name="Turbo", description="d", price="300.00", quantity=3)
+
+    def add_to_cart(self, quantity):
+        return self.client.post("/api/v1/cart/", {"product_id": self.product.id, "quantity": quantity},
+                                content_type="application/json")
+
+    def test_cart_lines_hold_stock_for_other_carts(self):
+        self.add_to_cart(2)
+        self.client.cookies.clear()  # another shopper
+
+        self.assertEqual(self.add_to_cart(2).status_code, 400)
+        self.assertEqual(self.add_to_cart(1).status_code, 201)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.quantity, self.product.reserved), (3, 3))
+
+    def test_removing_a_line_releases_its_stock(self):
+        self.add_to_cart(2)
+        self.client.delete(f"/api/v1/cart/{self.product.id}/")
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved, 0)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_checkout_turns_the_reservation_into_a_sale(self):
+        self.add_to_cart(2)
+        response = self.client.post("/api/v1/order/", ORDER_PAYLOAD, content_type="application/json")
+
+        self.assertEqual(response.status_code, 201)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.quantity, self.product.reserved), (1, 0))
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_expired_reservations_are_released(self):
+        self.add_to_cart(2)
+        self.assertEqual(release_expired(), 0)
+        self.assertEqual(release_expired(now=timezone.now() + timedelta(days=1)), 1)
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved, 0)
+
+
+@skipIf(connection.vendor == "sqlite", "SQLite locks the whole database, concurrent checkouts fail instead of waiting")
+class CheckoutContentionTest(TransactionTestCase):
+
+    def test_one_product_is_never_oversold(self):
+        output = StringIO()
+        call_command("checkout_contention", threads=6, orders=3, stock=5, stdout=output)  # more shoppers than stock
+
+        self.assertIn("No oversell", output.getvalue())
+        self.assertIn(" 5 orders,", output.getvalue())  # every unit sold, not just none oversold
+        self.assertIn("stock left 0", output.getvalue())
+        self.assertFalse(Product.objects.exists())
+
+
+@skipIf(connection.vendor == "sqlite", "SQLite serializes writers, the adds can not interleave")
+class ConcurrentFirstAddTest(TransactionTestCase):
+
+    def test_double_tapped_first_add_reserves_once(self):
+        product = Product.objects.create(name="Clutch", description="d", price="80.00", quantity=10)
+        barrier = threading.Barrier(2)
+        errors = []
+
+        def add():
+            try:
+                barrier.wait()  # both adds find no reservation row
+                with transaction.atomic():
+                    reservations.reserve("double-tap", {product.id: 3})
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=add) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        product.refresh_from_db()
+        self.assertEqual(errors, [])
+        self.assertEqual(product.reserved, StockReservation.objects.get(cart_key="double-tap").quantity)
+        self.assertEqual(product.reserved, 3)
+
+
+@override_settings(IDEMPOTENCY={"TTL": 60, "LOCK_TIMEOUT": 0})
+class IdempotencyTest(CartTestMixin, TestCase):
+
+    def checkout(self, key, payload=ORDER_PAYLOAD, **extra):
+        return self.client.post("/api/v1/order/", payload, content_type="application/json",
+                                HTTP_IDEMPOTENCY_KEY=key, **extra)
+
+    def test_retried_checkout_is_replayed(self):
+        self.fill_cart(2)
+        first = self.checkout("order-1")
+        with CaptureQueriesContext(connection) as queries:
+            retry = self.checkout("order-1")
+
+        self.assertEqual((first.status_code, retry.status_code), (201, 201))
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(set(Product.objects.values_list("quantity", flat=True)), {8})
+        tables = ("order_cart", "order_order", "car_parts_product")  # the session may be read by authentication
+        self.assertFalse([query for query in queries.captured_queries
+                          if any(table in query["sql"] for table in tables)])
+
+    def test_key_reused_for_another_request_is_rejected(self):
+        self.fill_cart(1)
+        self.checkout("order-2")
+        response = self.checkout("order-2", {**ORDER_PAYLOAD, "customer_name": "Someone Else"})
+
+        self.assertEqual(response.status_code, 422)
+
+    def test_duplicate_of_a_running_request_is_rejected_after_waiting(self):
+        self.fill_cart(1)
+        IdempotencyKey.objects.create(
+            key=hashlib.sha256(f"session:{self.client.cookies[settings.SESSION_COOKIE_NAME].value} order-3".encode())
+            .hexdigest(),
+            fingerprint=hashlib.sha256(b"POST /api/v1/order/ " + json.dumps(ORDER_PAYLOAD).encode()).hexdigest(),
+            locked_until=timezone.now() + timedelta(minutes=1), expires_at=timezone.now() + timedelta(minutes=1),
+        )  # the original request is still running
+
+        self.assertEqual(self.checkout("order-3").status_code, 409)
+        self.assertFalse(Order.objects.exists())
+
+    def test_keys_are_scoped_to_the_client(self):
+        self.fill_cart(1)
+        first = self.checkout("order-4")
+        self.client.cookies.clear()  # another client sending the same key and body
+        other = self.checkout("order-4", REMOTE_ADDR="10.0.0.9")
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(other.status_code, 400)  # ran on its own, and failed on its empty cart
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_replayed_cart_add_hands_out_the_session_cookie(self):
+        product = Product.objects.create(name="Horn", description="d", price="7.00", quantity=5)
+        payload = {"product_id": product.id, "quantity": 1}
+        first = self.client.post("/api/v1/cart/", payload, content_type="application/json", HTTP_IDEMPOTENCY_KEY="c")
+        self.client.cookies.clear()  # the first response never reached the client
+        retry = self.client.post("/api/v1/cart/", payload, content_type="application/json", HTTP_IDEMPOTENCY_KEY="c")
+
+        cookie = settings.SESSION_COOKIE_NAME
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(retry.cookies[cookie].value, first.cookies[cookie].value)
+        self.assertEqual(len(self.client.get("/api/v1/cart/").data), 1)
+        self.assertEqual(CartItem.objects.get().quantity, 1)
+
+    def test_forged_forwarded_for_does_not_reach_another_clients_key(self):
+        product = Product.objects.create(name="Horn", description="d", price="7.00", quantity=5)
+        payload = {"product_id": product.id, "quantity": 1}
+        self.client.post("/api/v1/cart/", payload, content_type="application/json", HTTP_IDEMPOTENCY_KEY="d")
+        self.client.cookies.clear()
+        other = self.client.post("/api/v1/cart/", payload, content_type="application/json", HTTP_IDEMPOTENCY_KEY="d",
+                                 REMOTE_ADDR="10.0.0.7", HTTP_X_FORWARDED_FOR="127.0.0.1")
+
+        self.assertNotIn("Idempotent-Replayed", other)
+        self.assertEqual(CartItem.objects.count(), 2)  # ran as a request of its own
+
+
+@override_settings(OUTBOX={**settings.OUTBOX, "LOW_STOCK_THRESHOLD": 8,
+                           "ALERT_RECIPIENTS": ["stock@autocompany.local"]})
+class OutboxTest(CartTestMixin, TestCase):
+
+    def checkout(self, size):
+        self.fill_cart(size)
+        self.client.post("/api/v1/order/", ORDER_PAYLOAD, content_type="application/json")
+
+    def test_checkout_only_records_the_event(self):
+        self.checkout(2)
+
+        event = OutboxEvent.objects.get(topic=outbox.ORDER_CREATED)
+        self.assertEqual(event.topic, outbox.ORDER_CREATED)
+        self.assertEqual(event.payload["customer_email"], ORDER_PAYLOAD["customer_email"])
+        self.assertEqual([line["quantity"] for line in event.payload["lines"]], [2, 2])
+        self.assertEqual(mail.outbox, [])
+
+    def test_worker_sends_confirmations_and_low_stock_alerts(self):
+        self.checkout(1)
+        self.checkout(2)
+        call_command("outbox_worker", "--once", stdout=StringIO())
+
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox),
+                         ["james@gmail.com", "james@gmail.com", "stock@autocompany.local"])
+        self.assertEqual(mail.outbox[-1].body.count("8 available"), 3)
+        self.assertFalse(OutboxEvent.objects.filter(processed_at__isnull=True).exists())
+
+    def test_failing_event_is_retried_later_without_blocking_the_batch(self):
+        self.checkout(1)
+        self.checkout(2)
+        OutboxEvent.objects.filter(id=OutboxEvent.objects.first().id).update(payload={})  # the first order.created
+
+        with self.assertLogs("core_apps.order.outbox", "ERROR"):
+            self.assertEqual(outbox.process_batch(), 4)
+
+        failed, sent = OutboxEvent.objects.filter(topic=outbox.ORDER_CREATED).order_by("id")
+        self.assertEqual((failed.attempts, failed.processed_at), (1, None))
+        self.assertGreater(failed.available_at, timezone.now())
+        self.assertIsNotNone(sent.processed_at)
+        self.assertEqual(outbox.process_batch(), 0)  # backed off
+
+
+class OrderHistoryTest(QueryCountMixin, TestCase):
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user("support", is_staff=True))
+        self.product = Product.objects.create(name="Wiper", description="Blade", price="7.00", quantity=1000)
+
+    def create_orders(self, size, email="james@gmail.com", days_ago=0):
+        for index in range(size):
+            order = Order.objects.create(customer_email=email, total_amount="14.00", delivery_date="2024-01-25",
+                                         delivery_time="12:25")
+            Order.objects.filter(id=order.id).update(ordered_at=timezone.now() - timedelta(days=days_ago))
+            OrderItem.objects.create(order=order, product=self.product, quantity=2, unit_price="7.00")
+            OrderItem.objects.create(order=order, product=self.product, quantity=1)  # before unit prices
+
+    def test_order_page_runs_a_fixed_number_of_queries(self):
+        self.assertConstantQueries(self.create_orders, lambda: self.client.get("/api/v1/order/?limit=100"))
+
+    def test_filters_and_keyset_pagination(self):
+        self.create_orders(3)
+        self.create_orders(2, days_ago=10)
+        self.create_orders(1, email="other@gmail.com")
+        Product.objects.filter(id=self.product.id).update(price="9.00")
+
+        pages = [self.client.get("/api/v1/order/?customer_email=james@gmail.com&limit=2").data]
+        while pages[-1]["next_cursor"]:
+            pages.append(self.client.get(
+                f"/api/v1/order/?customer_email=james@gmail.com&limit=2&cursor={pages[-1]['next_cursor']}").data)
+        orders = [order for page in pages for order in page["results"]]
+
+        self.assertEqual([len(page["results"]) for page in pages], [2, 2, 1])
+        self.assertEqual(len({order["id"] for order in orders}), 5)
+        self.assertEqual(orders[-1]["ordered_at"][:10], str((timezone.now() - timedelta(days=10)).date()))
+        self.assertEqual([item["total_price"] for item in orders[0]["items"]], ["14.00", "9.00"])
+
+        today = timezone.now().date()
+        response = self.client.get(f"/api/v1/order/?date_from={today - timedelta(days=1)}&date_to={today}")
+        self.assertEqual(len(response.data["results"]), 4)
+        self.assertEqual(self.client.get("/api/v1/order/?date_from=soon").data, {"message": "error: Invalid date_from"})
+
+    def test_detail_and_staff_only_access(self):
+        self.create_orders(1)
+        order = Order.objects.get()
+
+        response = self.client.get(f"/api/v1/order/{order.id}/")
+        self.assertEqual((response.data["id"], len(response.data["items"])), (order.id, 2))
+        self.assertEqual(self.client.get(f"/api/v1/order/{order.id + 1}/").status_code, 400)
+
+        self.client.logout()
+        self.assertEqual(self.client.get("/api/v1/order/").status_code, 403)
+
+
+class SalesRollupTest(CartTestMixin, TestCase):
+
+    def setUp(self):
+        self.product = Product.objects.create(name="Filter", description="Oil", price="5.00", quantity=100)
+
+    def place_order(self, days_ago, quantity, unit_price="5.00"):
+        order = Order.objects.create(total_amount="0.00", delivery_date="2024-01-25", delivery_time="12:25")
+        Order.objects.filter(id=order.id).update(ordered_at=timezone.now() - timedelta(days=days_ago))
+        OrderItem.objects.create(order=order, product=self.product, quantity=quantity, unit_price=unit_price)
+
+    def sales(self):
+        return list(DailyProductSales.objects.order_by("day").values_list("orders", "units", "revenue"))
+
+    def test_checkouts_are_folded_in_by_the_outbox_worker(self):
+        for quantity in (2, 3):
+            self.client.cookies.clear()
+            self.client.post("/api/v1/cart/", {"product_id": self.product.id, "quantity": quantity},
+                             content_type="application/json")
+            self.client.post("/api/v1/order/", ORDER_PAYLOAD, content_type="application/json")
+        self.assertFalse(DailyProductSales.objects.exists())
+
+        call_command("outbox_worker", "--once", stdout=StringIO())
+        self.assertEqual(self.sales(), [(2, 5, Decimal("25.00"))])
+
+    def test_rebuild_recomputes_past_days_and_absorbs_pending_events(self):
+        self.place_order(days_ago=2, quantity=1)
+        self.place_order(days_ago=2, quantity=4, unit_price=None)  # priced from the product
+        self.place_order(days_ago=1, quantity=2, unit_price="4.00")
+        DailyProductSales.objects.create(day=timezone.localdate() - timedelta(days=1), product=self.product,
+                                         orders=9, units=9, revenue="9.00")  # stale
+        day = (timezone.localdate() - timedelta(days=1)).isoformat()
+        outbox.publish(outbox.SALES_RECORDED, {"order_id": 3, "day": day, "lines": []})
+
+        call_command("rebuild_sales_rollup", "--chunk-days", "1", stdout=StringIO())
+
+        self.assertEqual(self.sales(), [(2, 5, Decimal("25.00")), (1, 2, Decimal("8.00"))])
+        self.assertFalse(OutboxEvent.objects.filter(processed_at__isnull=True).exists())
+        with self.assertRaises(CommandError):
+            call_command("rebuild_sales_rollup", "--date-to", timezone.localdate().isoformat())
+
+    def test_report_reads_the_rollup(self):
+        self.place_order(days_ago=2, quantity=1)
+        self.place_order(days_ago=1, quantity=2)
+        call_command("rebuild_sales_rollup", stdout=StringIO())
+        self.client.force_login(User.objects.create_user("manager", is_staff=True))
+
+        by_day = self.client.get("/api/v1/order/sales/").data
+        by_product = self.client.get("/api/v1/order/sales/?group=product").data
+
+        self.assertEqual([row["units"] for row in by_day["results"]], [1, 2])
+        self.assertEqual(by_day["totals"], {"orders": 2, "units": 3, "revenue": "15.00"})
+        self.assertEqual(by_product["results"], [{"product_id": self.product.id, "product_name": "Filter",
+                                                  "orders": 2, "units": 3, "revenue": "15.00"}])
+
+        self.client.logout()
+        self.assertEqual(self.client.get("/api/v1/order/sales/").status_code, 403)
@@ -1,8 +1,14 @@
+from django.conf import settings
 from django.urls import re_path
 
-from core_apps.order.views import CartView, OrderView
+from core_apps.order.async_views import AsyncCartView
+from core_apps.order.views import CartBulkView, CartView, OrderView, SalesReportView
+
+cart_view = AsyncCartView.as_view() if settings.ASYNC_VIEWS else CartView.as_view()
 
 urlpatterns = [
-    re_path(r'^cart/?(?P<product_id>[\d]+)?/$', CartView.as_view(), name='product'),
-    re_path(r'^order/$', OrderView.as_view(), name='order'),
+    re_path(r'^cart/?(?P<product_id>[\d]+)?/$', cart_view, name='product'),
+    re_path(r'^cart/bulk/$', CartBulkView.as_view(), name='cart-bulk'),
+    re_path(r'^order/sales/$', SalesReportView.as_view(), name='sales-report'),
+    re_path(r'^order/?(?P<order_id>[\d]+)?/$', OrderView.as_view(), name='order'),
 ]
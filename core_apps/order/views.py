@@ -1,38 +1,76 @@
+import logging
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
 import environ
 from django.db import transaction
-from django.db.models import F
+from django.db.models import F, Prefetch, Q, Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from rest_framework import views, status
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 
+from core_apps._config.cache_config.product_cache import get_product_cache
+from core_apps._config.db_config.routers import replica_reads
 from core_apps._config.exception_config.exception_handler import CustomException
+from core_apps._config.idempotency_config.idempotency import idempotent
+from core_apps._config.metrics_config.instrumentation import profile_section
+from core_apps._config.pagination_config.cursor_pagination import decode_cursor, paginate_keyset
 from core_apps._config.payload_config.payload_validator import validate_payload
+from core_apps._config.session_config.cart_session import CART_SESSION_KEY, retrieve_cart_key
 from core_apps.car_parts.models import Product
-from core_apps.order.models import Cart, CartItem, Order, OrderItem
-from core_apps.order.serializers import CartItemSerializer
+from core_apps.order import outbox, reservations
+from core_apps.order.cart_storage import get_cart_storage
+from core_apps.order.models import DailyProductSales, Order, OrderItem
+from core_apps.order.serializers import CartItemSerializer, OrderSerializer
 
 env = environ.Env(
     DEBUG=(bool, False)
 )
 
+logger = logging.getLogger(__name__)
+
+DEFAULT_ORDER_LIMIT = 20
+MAX_ORDER_LIMIT = 100
+
+DEFAULT_REPORT_DAYS = 30
+MAX_REPORT_PRODUCTS = 1000
+
+
+def parse_query_date(request, name):
+    value = request.GET.get(name)
+    if not value:
+        return None
+
+    try:
+        parsed = parse_date(value)
+    except ValueError:  # well formed but out of range
+        parsed = None
+    if parsed is None:
+        raise CustomException(f"Invalid {name}")  # raise exception if the date can not be parsed
+    return parsed
+
 
 class CartView(views.APIView):
+    throttle_scope = "cart"
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.cart = None
         self.product_id = None
         self.session_id = None
         self.data = None
 
         self.request_data = None
 
+    @idempotent  # replay the response of a retried request
     @transaction.atomic  # to rollback if any error occurs
     def post(self, request, ):
 
         try:
             self.request_data = request.data  # set request data
             self.validate_payload()  # define a function to validate payload
-            self.retrieve_session()
+            self.retrieve_session(create=True)  # define a function to retrieve or create session
 
             self.create_cart()  # define a function to save data
 
@@ -45,16 +83,17 @@ class CartView(views.APIView):
             return Response(error_response, status=status.HTTP_400_BAD_REQUEST)  # return error response
 
         except Exception as ex:
+            logger.exception("Unexpected error in %s %s", request.method, request.path)  # log the traceback
             transaction.set_rollback(True)
             error_response = {"message": "error: " + str(ex)}
             return Response(error_response, status=status.HTTP_400_BAD_REQUEST)
 
+    @replica_reads  # reads may be served by a read replica
     def get(self, request):
 
         try:
             self.retrieve_session()  # define a function to retrieve session and set session id
-            self.retrieve_cart()  # define a function to retrieve data
-            self.retrieve_cart_items()
+            self.retrieve_cart_items()  # define a function to retrieve data
 
             return Response(self.data, status=status.HTTP_200_OK)  # return response
 
@@ -63,24 +102,28 @@ class CartView(views.APIView):
             return Response(error_response, status=status.HTTP_400_BAD_REQUEST)  # return error response
 
         except Exception as ex:
+            logger.exception("Unexpected error in %s %s", request.method, request.path)  # log the traceback
             error_response = {"message": "error: " + str(ex)}
             return Response(error_response, status=status.HTTP_400_BAD_REQUEST)
 
+    @transaction.atomic  # to rollback if any error occurs
     def delete(self, request, product_id=None):
         try:
             self.product_id = product_id  # set product id
             self.retrieve_session()  # define a function to retrieve session and set session id
-            self.retrieve_cart()  # define a function to retrieve data
             self.delete_product()  # define a function to delete data
 
             response = {"status": 200, "message": "Successfully Deleted"}
             return Response(response, status=status.HTTP_200_OK)  # return response
 
         except CustomException as error_message:
+            transaction.set_rollback(True)  # rollback if any error occurs
             error_response = {"message": "error: " + str(error_message)}  # define error response
             return Response(error_response, status=status.HTTP_400_BAD_REQUEST)  # return error response
 
         except Exception as ex:
+            logger.exception("Unexpected error in %s %s", request.method, request.path)  # log the traceback
+            transaction.set_rollback(True)
             error_response = {"message": "error: " + str(ex)}
             return Response(error_response, status=status.HTTP_400_BAD_REQUEST)
 
@@ -90,54 +133,154 @@ class CartView(views.APIView):
         if not is_valid:
             raise CustomException(message)  # raise exception if payload is not valid")
 
-    def retrieve_cart(self):
-        try:
-            self.cart = Cart.objects.get(session_key=self.session_id)  # get Cart object
-        except Cart.DoesNotExist:
+    def retrieve_cart_items(self):
+        cart_items = get_cart_storage().get_lines(self.session_id)  # get cart lines with their products
+        if cart_items is None:
             raise CustomException("Cart does not exist")  # raise exception if cart does not exist
 
-    def retrieve_cart_items(self):
-        cart_items = CartItem.objects.filter(cart_id=self.cart.id)
-        serializer = CartItemSerializer(cart_items, many=True)
-        self.data = serializer.data
+        with profile_section("serializer"):
+            serializer = CartItemSerializer(cart_items, many=True)
+            self.data = serializer.data
 
     def create_cart(self):
-        cart, created = Cart.objects.get_or_create(
-            session_key=self.session_id
-        )  # get or create Cart object
-
-        cart_item, created = CartItem.objects.get_or_create(
-            cart_id=cart.id,
-            product_id=self.request_data['product_id'],
-            defaults={'quantity': self.request_data['quantity']}
-        )  # get or create CartItem object
-
-        if not created:  # if cart item already exists
-            cart_item.quantity = self.request_data['quantity']  # update quantity
-            cart_item.save()  # save cart item
-
-    def retrieve_session(self):
-        session_key = self.request.session.session_key  # get session key
-        if not session_key:  # if session key is None
-            self.request.session.create()  # create session
-            session_key = self.request.session.session_key  # get session key
-        self.session_id = session_key  # set session id
+        try:
+            product_id = int(self.request_data['product_id'])
+            quantity = int(self.request_data['quantity'])
+        except (TypeError, ValueError):
+            raise CustomException("product_id and quantity must be integers")
+        if quantity < 1:
+            raise CustomException("quantity must be a positive integer")
+
+        if not Product.objects.filter(id=product_id, is_delete=False).exists():
+            raise CustomException("Product does not exist")  # raise exception if product does not exist
+
+        reservations.reserve(self.session_id, {product_id: quantity})  # hold the stock for this cart
+        get_cart_storage().set_items(self.session_id, {product_id: quantity})  # add or update cart item
+
+    def retrieve_session(self, create=False):
+        self.session_id = retrieve_cart_key(self.request.session, create=create)  # set session id
+        if not self.session_id:  # read-only requests do not create a session
+            raise CustomException("Cart does not exist")  # raise exception if there is no cart
 
     def delete_product(self):
-        CartItem.objects.get(cart_id=self.cart.id, product_id=self.product_id).delete()  # delete cart item
+        if not get_cart_storage().remove_item(self.session_id, int(self.product_id)):  # delete cart item
+            raise CustomException("Cart item does not exist")  # raise exception if cart item does not exist
+
+        reservations.release(self.session_id, [int(self.product_id)])  # give the held stock back
+
+
+class CartBulkView(CartView):
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.items = {}
+        self.results = []
+
+    @idempotent  # replay the response of a retried request
+    @transaction.atomic  # to rollback if any error occurs
+    def post(self, request, ):
+
+        try:
+            self.request_data = request.data  # set request data
+            self.validate_items()  # define a function to validate every cart item
+            if self.items:  # a session is only created when there is something to save
+                self.retrieve_session(create=True)  # define a function to retrieve or create session
+                self.create_cart_items()  # define a function to save all cart items
+
+            if not self.items:  # every item was rejected, nothing was saved
+                transaction.set_rollback(True)
+                error_response = {"status": 490, "message": "error: No item could be added", "items": self.results}
+                return Response(error_response, status=status.HTTP_400_BAD_REQUEST)  # return error response
+
+            response = {"status": 200, "message": "Successfully created", "items": self.results}
+            return Response(response, status=status.HTTP_201_CREATED)  # return response
+
+        except CustomException as error_message:
+            transaction.set_rollback(True)  # rollback if any error occurs
+            error_response = {"status": 490, "message": "error: " + str(error_message)}  # define error response
+            return Response(error_response, status=status.HTTP_400_BAD_REQUEST)  # return error response
+
+        except Exception as ex:
+            logger.exception("Unexpected error in %s %s", request.method, request.path)  # log the traceback
+            transaction.set_rollback(True)
+            error_response = {"message": "error: " + str(ex)}
+            return Response(error_response, status=status.HTTP_400_BAD_REQUEST)
+
+    def validate_items(self):
+        is_valid, message = validate_payload(["items"], self.request_data)  # validate payload
+        if not is_valid:
+            raise CustomException(message)  # raise exception if payload is not valid
+        if not isinstance(self.request_data["items"], list) or not self.request_data["items"]:
+            raise CustomException("items must be a non empty list")
+
+        for item in self.request_data["items"]:  # validate the shape of every item
+            item = item if isinstance(item, dict) else {}
+            result = {"product_id": item.get("product_id"), "quantity": item.get("quantity"), "status": "ok"}
+            message = self.validate_item(item)
+            if message:
+                result.update(status="error", message=message)
+            self.results.append(result)
+
+        product_ids = {result["product_id"] for result in self.results if result["status"] == "ok"}
+        existing_ids = set(Product.objects.filter(id__in=product_ids, is_delete=False).values_list(
+            "id", flat=True))  # validate every product id in one query
+
+        for result in self.results:
+            if result["status"] != "ok":
+                continue
+            if result["product_id"] not in existing_ids:
+                result.update(status="error", message="Product does not exist")
+                continue
+            self.items[result["product_id"]] = result["quantity"]  # a later line for the same product wins
+
+    def validate_item(self, item):
+        is_valid, message = validate_payload(["product_id", "quantity"], item)  # validate payload
+        if not is_valid:
+            return message
+        if not isinstance(item["product_id"], int) or not isinstance(item["quantity"], int) or item["quantity"] < 1:
+            return "product_id and quantity must be positive integers"
+        return None
+
+    def create_cart_items(self):
+        rejected = reservations.reserve_available(self.session_id, self.items)  # hold the stock the cart can get
+        for result in self.results:
+            if result["status"] == "ok" and result["product_id"] in rejected:
+                result.update(status="error", message="Product quantity is not enough")
+        self.items = {product_id: quantity for product_id, quantity in self.items.items() if product_id not in rejected}
+
+        if self.items:
+            get_cart_storage().set_items(self.session_id, self.items)  # add or update every cart item
+        elif self.request.session.session_key is None:  # the session was only created for this request
+            del self.request.session[CART_SESSION_KEY]  # an empty session is not saved, no cookie for nothing
 
 
 class OrderView(views.APIView):
+    throttle_scope = "order"
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.cart_items = []
-        self.cart = None
+        self.products = {}
+        self.quantities = {}
+        self.held = {}
         self.session_id = None
         self.data = None
+        self.order_id = None
+        self.orders = None
+        self.customer_email = None
+        self.date_from = None
+        self.date_to = None
+        self.limit = None
+        self.cursor = None
 
         self.request_data = None
 
+    def get_permissions(self):
+        if self.request.method in ("GET", "HEAD"):
+            return [IsAdminUser()]  # order history exposes customer details, staff only
+        return super().get_permissions()
+
+    @idempotent  # replay the response of a retried request
     @transaction.atomic  # to rollback if any error occurs
     def post(self, request, ):
 
@@ -145,7 +288,6 @@ class OrderView(views.APIView):
             self.request_data = request.data  # set request data
             self.validate_payload()  # define a function to validate payload
             self.retrieve_session()  # define a function to retrieve session and set session id
-            self.retrieve_cart()  # define a function to retrieve data
             self.retrieve_cart_items()  # define a function to retrieve data
             self.create_order()  # define a function to create order
 
@@ -158,10 +300,34 @@ class OrderView(views.APIView):
             return Response(error_response, status=status.HTTP_400_BAD_REQUEST)  # return error response
 
         except Exception as ex:
+            logger.exception("Unexpected error in %s %s", request.method, request.path)  # log the traceback
             transaction.set_rollback(True)
             error_response = {"message": "error: " + str(ex)}
             return Response(error_response, status=status.HTTP_400_BAD_REQUEST)
 
+    @replica_reads  # reads may be served by a read replica
+    def get(self, request, order_id=None):
+
+        try:
+            self.order_id = order_id  # set order id
+            self.populate_variables()  # define a function to populate variables
+
+            if self.order_id:
+                self.get_details()
+            else:
+                self.get_list()
+
+            return Response(self.data, status=status.HTTP_200_OK)  # return response
+
+        except CustomException as error_message:
+            error_response = {"message": "error: " + str(error_message)}  # define error response
+            return Response(error_response, status=status.HTTP_400_BAD_REQUEST)  # return error response
+
+        except Exception as ex:
+            logger.exception("Unexpected error in %s %s", request.method, request.path)  # log the traceback
+            error_response = {"message": "error: " + str(ex)}
+            return Response(error_response, status=status.HTTP_400_BAD_REQUEST)
+
     def validate_payload(self):
         is_valid, message = validate_payload(
             ["customer_name", "customer_email", "customer_phone", "delivery_date", "delivery_time"],
@@ -170,52 +336,230 @@ class OrderView(views.APIView):
         if not is_valid:
             raise CustomException(message)  # raise exception if payload is not valid")
 
-    def retrieve_cart(self):
-        try:
-            self.cart = Cart.objects.get(session_key=self.session_id)  # get Cart object
-        except Cart.DoesNotExist:
+    def retrieve_cart_items(self):
+        items = get_cart_storage().get_items(self.session_id)  # cart rows are only materialised as order rows
+        if items is None:
             raise CustomException("Cart does not exist")  # raise exception if cart does not exist
 
-    def retrieve_cart_items(self):
-        cart_items = CartItem.objects.filter(cart_id=self.cart.id)
-        serializer = CartItemSerializer(cart_items, many=True)
-        self.cart_items = serializer.data
+        self.cart_items = [{"product_id": product_id, "quantity": quantity} for product_id, quantity in items.items()]
+
+    def retrieve_products(self):
+        product_ids = {cart_item["product_id"] for cart_item in self.cart_items}
+        self.products = Product.objects.in_bulk(product_ids)  # no row locks, the stock update is conditional
+        self.held = reservations.held_quantities(self.session_id)  # stock this cart already holds
+
+    def validate_stock(self):
+        self.quantities = {}
+        for cart_item in self.cart_items:  # merge quantities of the same product
+            product_id = cart_item["product_id"]
+            self.quantities[product_id] = self.quantities.get(product_id, 0) + cart_item["quantity"]
+
+        for product_id, quantity in self.quantities.items():  # check if product quantity is enough
+            product = self.products.get(product_id)
+            if product is None:
+                raise CustomException("Product does not exist")
+            if product.quantity - product.reserved + self.held.get(product_id, 0) < quantity:
+                raise CustomException(f"{product.name} quantity is not enough")
+
+    def decrement_stock(self):
+        with profile_section("stock"):
+            reservations.consume(self.session_id, self.quantities, self.held)  # conditional, retried on conflicts
+        get_product_cache().invalidate(self.quantities)  # cached payloads carry the old quantity
 
     def create_order(self):
+        if not self.cart_items:
+            raise CustomException("Cart is empty")
+
+        self.retrieve_products()  # define a function to retrieve cart products and reservations
+        self.validate_stock()  # define a function to validate stock
+
+        total_price = sum(
+            (self.products[product_id].price * quantity for product_id, quantity in self.quantities.items()),
+            Decimal("0.00")
+        )  # calculate total price
+
         order = Order.objects.create(
             customer_name=self.request_data['customer_name'],
             customer_email=self.request_data['customer_email'],
             customer_phone=self.request_data['customer_phone'],
             delivery_date=self.request_data['delivery_date'],
             delivery_time=self.request_data['delivery_time'],
+            total_amount=total_price,
         )
 
-        total_price = 0.0
-        for cart_item in self.cart_items:  # loop through cart items
-            if not Product.objects.filter(id=cart_item['product_id'], quantity__gte=cart_item[
-                "quantity"]).exists():  # check if product quantity is enough
-                product_name = cart_item["product_name"]
-                raise CustomException(f"{product_name} quantity is not enough")
-
-            OrderItem.objects.create(
-                order_id=order.id,
-                product_id=cart_item['product_id'],
-                quantity=cart_item['quantity']
-            )  # create order item
-            total_price = total_price + float(cart_item['total_price'])  # calculate total price
-
-            Product.objects.filter(id=cart_item['product_id']).update(
-                quantity=F('quantity') - cart_item['quantity']
-            )  # update product quantity
-
-        order.total_amount = total_price  # set total price
-        order.save()  # save order
-
-        self.cart.delete()  # delete cart
-
-    def retrieve_session(self):
-        session_key = self.request.session.session_key  # get session key
-        if not session_key:  # if session key is None
-            self.request.session.create()  # create session
-            session_key = self.request.session.session_key  # get session key
-        self.session_id = session_key  # set session id
+        OrderItem.objects.bulk_create([
+            OrderItem(order_id=order.id, product_id=product_id, quantity=quantity,
+                      unit_price=self.products[product_id].price)
+            for product_id, quantity in self.quantities.items()
+        ])  # create order items
+
+        self.decrement_stock()  # define a function to update product quantity
+
+        get_cart_storage().clear(self.session_id)  # delete cart
+
+        self.publish_order(order)  # emails and stock alerts are sent by the outbox worker
+
+    def publish_order(self, order):
+        lines = [
+            {"product_id": product_id, "quantity": quantity, "price": str(self.products[product_id].price)}
+            for product_id, quantity in self.quantities.items()
+        ]
+        outbox.publish_many([
+            (outbox.ORDER_CREATED, {
+                "order_id": order.id,
+                "customer_name": order.customer_name,
+                "customer_email": order.customer_email,
+                "total_amount": str(order.total_amount),
+                "delivery_date": str(order.delivery_date),
+                "delivery_time": str(order.delivery_time),
+                "lines": lines,
+            }),
+            (outbox.SALES_RECORDED, {
+                "order_id": order.id,
+                "day": timezone.localdate(order.ordered_at).isoformat(),  # same day as the rollup rebuild
+                "lines": lines,
+            }),
+        ])  # one insert for both events
+
+    def retrieve_session(self, create=False):
+        self.session_id = retrieve_cart_key(self.request.session, create=create)  # set session id
+        if not self.session_id:  # read-only requests do not create a session
+            raise CustomException("Cart does not exist")  # raise exception if there is no cart
+
+    def populate_variables(self):
+        self.customer_email = self.request.GET.get('customer_email') or None  # set customer filter
+        self.date_from = parse_query_date(self.request, 'date_from')  # set first ordering day
+        self.date_to = parse_query_date(self.request, 'date_to')  # set last ordering day, included
+        self.limit = int(self.request.GET.get('limit') or DEFAULT_ORDER_LIMIT)  # set limit
+        self.cursor = self.request.GET.get('cursor')  # set cursor, missing or empty for the first page
+
+    def retrieve_orders(self):
+        self.orders = Order.objects.prefetch_related(
+            Prefetch('order_items', queryset=OrderItem.objects.select_related('product').order_by('id'))
+        )  # one query for the orders, one for all their lines and products
+
+    def get_details(self):
+        self.retrieve_orders()  # define a function to retrieve orders
+        order = self.orders.filter(id=self.order_id).first()
+        if order is None:
+            raise CustomException("Order does not exist")  # raise exception if order does not exist
+
+        self.data = OrderSerializer(order).data  # serialize order
+
+    def filter_orders(self):
+        if self.customer_email:
+            self.orders = self.orders.filter(customer_email=self.customer_email)
+        if self.date_from:  # day bounds keep the ordered_at index usable
+            self.orders = self.orders.filter(
+                ordered_at__gte=timezone.make_aware(datetime.combine(self.date_from, time.min)))
+        if self.date_to:
+            self.orders = self.orders.filter(
+                ordered_at__lt=timezone.make_aware(datetime.combine(self.date_to + timedelta(days=1), time.min)))
+
+    def handle_cursor_pagination(self):
+        if not 1 <= self.limit <= MAX_ORDER_LIMIT:
+            raise CustomException("Invalid limit")  # raise exception if limit is invalid
+
+        self.orders = self.orders.order_by('-ordered_at', '-id')  # newest first, matches the indexes
+        if self.cursor:  # if cursor is not empty continue after the last seen order
+            ordered_at, last_id = decode_cursor(self.cursor, 2)
+            ordered_at = parse_datetime(ordered_at) if isinstance(ordered_at, str) else None
+            if ordered_at is None or not isinstance(last_id, int):
+                raise CustomException("Invalid cursor")  # raise exception if cursor is invalid
+
+            self.orders = self.orders.filter(Q(ordered_at__lt=ordered_at) | Q(ordered_at=ordered_at, id__lt=last_id))
+
+        orders, next_cursor = paginate_keyset(self.orders, self.limit,
+                                              key=lambda order: [order.ordered_at.isoformat(), order.id])
+        self.data = {
+            "results": OrderSerializer(orders, many=True).data,
+            "next_cursor": next_cursor,
+        }  # set data
+
+    def get_list(self):
+        self.retrieve_orders()  # define a function to retrieve orders
+        self.filter_orders()  # define a function to apply the query filters
+        self.handle_cursor_pagination()  # define a function to handle cursor pagination
+
+
+class SalesReportView(views.APIView):
+    """
+    Daily revenue and units from the DailyProductSales rollup, never from the order tables.
+
+    ?date_from and ?date_to (included) default to the last 30 days. ?group=day returns one row per day,
+    ?group=product one row per product, best selling first. ?product_id restricts the report to one product.
+    """
+
+    permission_classes = [IsAdminUser]  # sales figures are for staff only
+    throttle_scope = "report"
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.sales = None
+        self.date_from = None
+        self.date_to = None
+        self.product_id = None
+        self.group = None
+        self.limit = None
+        self.data = None
+
+    @replica_reads  # reads may be served by a read replica
+    def get(self, request):
+
+        try:
+            self.populate_variables()  # define a function to populate variables
+            self.retrieve_sales()  # define a function to retrieve rollup rows
+            self.build_report()  # define a function to aggregate the report
+
+            return Response(self.data, status=status.HTTP_200_OK)  # return response
+
+        except CustomException as error_message:
+            error_response = {"message": "error: " + str(error_message)}  # define error response
+            return Response(error_response, status=status.HTTP_400_BAD_REQUEST)  # return error response
+
+        except Exception as ex:
+            logger.exception("Unexpected error in %s %s", request.method, request.path)  # log the traceback
+            error_response = {"message": "error: " + str(ex)}
+            return Response(error_response, status=status.HTTP_400_BAD_REQUEST)
+
+    def populate_variables(self):
+        self.date_to = parse_query_date(self.request, 'date_to') or timezone.localdate()  # set last day
+        self.date_from = parse_query_date(self.request, 'date_from') or self.date_to - timedelta(
+            days=DEFAULT_REPORT_DAYS - 1)  # set first day
+        if self.date_from > self.date_to:
+            raise CustomException("date_from is after date_to")  # raise exception if the range is empty
+
+        self.product_id = int(self.request.GET.get('product_id')) if self.request.GET.get('product_id') else None
+        self.group = self.request.GET.get('group') or 'day'  # set grouping
+        if self.group not in ('day', 'product'):
+            raise CustomException("Invalid group")  # raise exception if grouping is unknown
+
+        self.limit = int(self.request.GET.get('limit') or MAX_REPORT_PRODUCTS)  # set limit
+        if not 1 <= self.limit <= MAX_REPORT_PRODUCTS:
+            raise CustomException("Invalid limit")  # raise exception if limit is invalid
+
+    def retrieve_sales(self):
+        self.sales = DailyProductSales.objects.filter(day__gte=self.date_from, day__lte=self.date_to)  # day index
+        if self.product_id:
+            self.sales = self.sales.filter(product_id=self.product_id)
+
+    def build_report(self):
+        sums = {"orders": Sum("orders"), "units": Sum("units"), "revenue": Sum("revenue")}
+        if self.group == 'day':
+            rows = self.sales.values('day').annotate(**sums).order_by('day')
+        else:
+            rows = self.sales.values('product_id', product_name=F('product__name')).annotate(**sums).order_by(
+                '-revenue', 'product_id')[:self.limit]
+
+        self.data = {
+            "date_from": self.date_from,
+            "date_to": self.date_to,
+            "totals": self.format_sums(self.sales.aggregate(**sums)),
+            "results": [self.format_sums(row) for row in rows],
+        }  # set data
+
+    def format_sums(self, row):
+        row["orders"] = row["orders"] or 0
+        row["units"] = row["units"] or 0
+        row["revenue"] = "{:.2f}".format(row["revenue"] or Decimal("0.00"))  # money as a string, like prices
+        return row